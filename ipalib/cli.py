@@ -1287,13 +1287,40 @@ cli_plugins = (
 )
 
 
+# Commands which report the loaded plugins
+introspection_commands = (
+    'plugins',
+)
+
+
+def get_plugin_commands(argv):
+    """
+    Return names of the plugin commands needed to run the CLI with ``argv``,
+    or None if all commands are needed.
+
+    Plain ``ipa`` and ``ipa help`` only need the built-in commands, help
+    topics, the built-in commands other than help and the commands which
+    report the loaded plugins need all commands.
+    """
+    if argv and from_cli(argv[0]) == 'help':
+        argv = [arg for arg in argv[1:] if not arg.startswith('-')]
+    if not argv:
+        return ()
+    name = from_cli(argv[0])
+    if name in (klass.__name__ for klass in cli_plugins):
+        return None
+    if name in introspection_commands:
+        return None
+    return (name,)
+
+
 def run(api):
     error = None
     try:
         (options, argv) = api.bootstrap_with_global_options(context='cli')
         for klass in cli_plugins:
             api.register(klass)
-        api.load_plugins()
+        api.load_plugins(get_plugin_commands(argv))
         api.finalize()
         if not 'config_loaded' in api.env:
             raise NotConfiguredError()
@@ -118,6 +118,32 @@ DEFAULT_CONFIG = (
 
     ('rpc_protocol', 'jsonrpc'),
 
+    # LDAP connection pool of the server (ldap2 backend), connections are
+    # kept bound between requests. Set ldap_pool_size to 0 to disable it.
+    ('ldap_pool_size', 10),
+    # Seconds after which an idle pooled connection is closed
+    ('ldap_pool_idle_timeout', 300),
+    # Seconds after which an idle pooled connection is checked before reuse
+    ('ldap_pool_check_interval', 60),
+    # Keep the LDAP schema of the server in ~/.ipa/schema, it is only
+    # downloaded again when the schema on the server changes
+    ('ldap_schema_cache', True),
+    # Seconds the server uses the cached IPA configuration entry without
+    # checking its entryUSN
+    ('config_cache_ttl', 5),
+    # Seconds the server uses its cached index of DNS zone names without
+    # checking the entryUSNs of the zones
+    ('dns_zone_cache_ttl', 5),
+
+    # Maximum number of nested methods the batch command executes
+    # concurrently when called with --parallel
+    ('batch_max_workers', 4),
+
+    # Cache responses of show and find commands in the server, see
+    # ipaserver.plugins.responsecache
+    ('response_cache', False),
+    ('response_cache_size', 1000),
+
     # Time to wait for a service to start, in seconds
     ('startup_timeout', 120),
 
@@ -133,6 +159,14 @@ DEFAULT_CONFIG = (
     ('session_auth_duration', '20 minutes'),
     # How a session expiration is computed, see SessionManager.set_session_expiration_time()
     ('session_duration_type', 'inactivity_timeout'),
+    # Number of session ccaches every server process keeps materialized
+    ('session_ccache_cache_size', 16),
+    # Seconds for which storing a session is deferred if only its
+    # timestamps changed
+    ('session_write_interval', 60),
+    # Seconds for which a server process may use its own copy of a
+    # session instead of reading it from memcached, 0 disables it
+    ('session_local_cache_ttl', 0),
 
     # Debugging:
     ('verbose', 0),
@@ -145,6 +179,14 @@ DEFAULT_CONFIG = (
     ('ca_port', 80),
     ('ca_agent_port', 443),
     ('ca_ee_port', 443),
+    # Maximum number of requests cert_request_bulk submits to the CA
+    # concurrently
+    ('ca_max_requests', 4),
+    # Keep-alive connections to the CA kept by every server process.
+    # Set ca_pool_size to 0 to disable it.
+    ('ca_pool_size', 4),
+    # Seconds after which an idle connection to the CA is closed
+    ('ca_pool_idle_timeout', 15),
     # For the following ports, None means a default specific to the installed
     # Dogtag version.
     ('ca_install_port', None),
@@ -157,6 +199,9 @@ DEFAULT_CONFIG = (
     ('interactive', True),
     ('fallback', True),
     ('delegate', False),
+    # Import only the plugin modules the invoked command needs, as listed in
+    # the plugin manifest
+    ('lazy_plugins', True),
 
     # Enable certain optional plugins:
     ('enable_ra', False),
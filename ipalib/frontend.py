@@ -411,6 +411,10 @@ class Command(HasParam):
     msg_summary = None
     msg_truncated = _('Results are truncated, try a more specific search')
 
+    # Responses of commands which only read data may be cached in the
+    # server, see ipaserver.plugins.responsecache
+    cache_response = False
+
     def __call__(self, *args, **options):
         """
         Perform validation and then execute the command.
@@ -752,7 +756,11 @@ class Command(HasParam):
                 self.verify_client_version(options['version'])
             else:
                 options['version'] = API_VERSION
-            result = self.execute(*args, **options)
+            if 'response_cache' in self.Backend:
+                result = self.Backend.response_cache.execute(
+                    self, *args, **options)
+            else:
+                result = self.execute(*args, **options)
             if not version_provided:
                 messages.add_message(
                     API_VERSION, result,
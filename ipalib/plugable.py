@@ -626,18 +626,22 @@ class API(DictProxy):
         self.bootstrap(parser, **overrides)
         return (options, args)
 
-    def load_plugins(self):
+    def load_plugins(self, commands=None):
         """
         Load plugins from all standard locations.
 
         `API.bootstrap` will automatically be called if it hasn't been
         already.
+
+        If ``commands`` is not None, only the ``ipalib`` plugin modules
+        needed to run the named commands are imported, see
+        `API.get_manifest_modules`.
         """
         self.__doing('load_plugins')
         self.__do_if_not_done('bootstrap')
         if self.env.mode in ('dummy', 'unit_test'):
             return
-        self.import_plugins('ipalib')
+        self.import_plugins('ipalib', commands)
         if self.env.context in ('server', 'lite'):
             self.import_plugins('ipaserver')
         if self.env.context in ('installer', 'updates'):
@@ -645,10 +649,53 @@ class API(DictProxy):
         if self.env.context in ('advise'):
             self.import_plugins('ipaserver/advise/plugins')
 
+    def get_manifest_modules(self, package, names, commands):
+        """
+        Return the set of plugin modules of ``package`` needed to run
+        ``commands``, or None if all plugin modules have to be imported.
+
+        The modules are looked up in the ``plugin_manifest`` module of
+        ``package``, which is generated by makeapi. All plugin modules are
+        needed when the ``lazy_plugins`` option is off, when there is no
+        manifest, when the manifest is out of date (the plugin modules in
+        ``names`` are not the ones it was generated from) or when one of
+        the commands is not listed in it.
+
+        :param package: The package containing the ``plugins`` sub-package.
+        :param names: Names of the modules in the ``plugins`` sub-package.
+        :param commands: Names of the commands to run.
+        """
+        if not self.env.lazy_plugins:
+            return None
+        name = '%s.plugin_manifest' % package
+        try:
+            __import__(name)
+        except ImportError:
+            self.log.debug('no plugin manifest %s', name)
+            return None
+        manifest = sys.modules[name]
+        if sorted(names) != sorted(manifest.modules):
+            self.log.debug('plugin manifest %s is out of date', name)
+            return None
+        required = set(manifest.common)
+        for command in commands:
+            try:
+                (module, class_name) = manifest.commands[command]
+            except KeyError:
+                self.log.debug(
+                    'command %s is not in plugin manifest %s', command, name)
+                return None
+            required.add(module)
+            required.update(manifest.requires.get(module, ()))
+        return required
+
     # FIXME: This method has no unit test
-    def import_plugins(self, package):
+    def import_plugins(self, package, commands=None):
         """
         Import modules in ``plugins`` sub-package of ``package``.
+
+        If ``commands`` is not None, import only the modules needed to run
+        the named commands, if the plugin manifest of ``package`` allows it.
         """
         package = package.replace(os.path.sep, '.')
         subpackage = '%s.plugins' % package
@@ -676,8 +723,21 @@ class API(DictProxy):
             raise errors.PluginsPackageError(
                 name=subpackage, file=plugins.__file__
             )
-        self.log.debug('importing all plugin modules in %r...', plugins_dir)
-        for (name, pyfile) in util.find_modules_in_dir(plugins_dir):
+        modules = list(util.find_modules_in_dir(plugins_dir))
+        required = None
+        if commands is not None:
+            required = self.get_manifest_modules(
+                package, [name for (name, pyfile) in modules], commands)
+        if required is None:
+            self.log.debug(
+                'importing all plugin modules in %r...', plugins_dir)
+        else:
+            self.log.debug(
+                'importing plugin modules in %r needed by %s...',
+                plugins_dir, ', '.join(commands) or 'no command')
+            modules = [(name, pyfile) for (name, pyfile) in modules
+                       if '%s.%s' % (subpackage, name) in required]
+        for (name, pyfile) in modules:
             fullname = '%s.%s' % (subpackage, name)
             self.log.debug('importing plugin module %r', pyfile)
             try:
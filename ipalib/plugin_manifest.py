@@ -0,0 +1,430 @@
+# Generated by makeapi, do not edit.
+
+"""
+Plugin modules needed to run each command of ``ipalib.plugins``.
+
+See `ipalib.plugable.API.get_manifest_modules`.
+"""
+
+modules = (
+    'aci',
+    'automember',
+    'automount',
+    'baseldap',
+    'batch',
+    'cert',
+    'config',
+    'delegation',
+    'dns',
+    'group',
+    'hbacrule',
+    'hbacsvc',
+    'hbacsvcgroup',
+    'hbactest',
+    'host',
+    'hostgroup',
+    'idrange',
+    'internal',
+    'kerberos',
+    'krbtpolicy',
+    'migration',
+    'misc',
+    'netgroup',
+    'otptoken',
+    'passwd',
+    'permission',
+    'ping',
+    'pkinit',
+    'privilege',
+    'pwpolicy',
+    'radiusproxy',
+    'realmdomains',
+    'role',
+    'rpcclient',
+    'selfservice',
+    'selinuxusermap',
+    'service',
+    'sudocmd',
+    'sudocmdgroup',
+    'sudorule',
+    'trust',
+    'user',
+    'virtual',
+)
+
+common = (
+    'ipalib.plugins.kerberos',
+    'ipalib.plugins.rpcclient',
+)
+
+commands = {
+    'aci_add': ('ipalib.plugins.aci', 'aci_add'),
+    'aci_del': ('ipalib.plugins.aci', 'aci_del'),
+    'aci_find': ('ipalib.plugins.aci', 'aci_find'),
+    'aci_mod': ('ipalib.plugins.aci', 'aci_mod'),
+    'aci_rename': ('ipalib.plugins.aci', 'aci_rename'),
+    'aci_show': ('ipalib.plugins.aci', 'aci_show'),
+    'adtrust_is_enabled': ('ipalib.plugins.trust', 'adtrust_is_enabled'),
+    'automember_add': ('ipalib.plugins.automember', 'automember_add'),
+    'automember_add_condition': ('ipalib.plugins.automember', 'automember_add_condition'),
+    'automember_default_group_remove': ('ipalib.plugins.automember', 'automember_default_group_remove'),
+    'automember_default_group_set': ('ipalib.plugins.automember', 'automember_default_group_set'),
+    'automember_default_group_show': ('ipalib.plugins.automember', 'automember_default_group_show'),
+    'automember_del': ('ipalib.plugins.automember', 'automember_del'),
+    'automember_find': ('ipalib.plugins.automember', 'automember_find'),
+    'automember_mod': ('ipalib.plugins.automember', 'automember_mod'),
+    'automember_rebuild': ('ipalib.plugins.automember', 'automember_rebuild'),
+    'automember_remove_condition': ('ipalib.plugins.automember', 'automember_remove_condition'),
+    'automember_show': ('ipalib.plugins.automember', 'automember_show'),
+    'automountkey_add': ('ipalib.plugins.automount', 'automountkey_add'),
+    'automountkey_del': ('ipalib.plugins.automount', 'automountkey_del'),
+    'automountkey_find': ('ipalib.plugins.automount', 'automountkey_find'),
+    'automountkey_mod': ('ipalib.plugins.automount', 'automountkey_mod'),
+    'automountkey_show': ('ipalib.plugins.automount', 'automountkey_show'),
+    'automountlocation_add': ('ipalib.plugins.automount', 'automountlocation_add'),
+    'automountlocation_del': ('ipalib.plugins.automount', 'automountlocation_del'),
+    'automountlocation_find': ('ipalib.plugins.automount', 'automountlocation_find'),
+    'automountlocation_import': ('ipalib.plugins.automount', 'automountlocation_import'),
+    'automountlocation_show': ('ipalib.plugins.automount', 'automountlocation_show'),
+    'automountlocation_tofiles': ('ipalib.plugins.automount', 'automountlocation_tofiles'),
+    'automountmap_add': ('ipalib.plugins.automount', 'automountmap_add'),
+    'automountmap_add_indirect': ('ipalib.plugins.automount', 'automountmap_add_indirect'),
+    'automountmap_del': ('ipalib.plugins.automount', 'automountmap_del'),
+    'automountmap_find': ('ipalib.plugins.automount', 'automountmap_find'),
+    'automountmap_mod': ('ipalib.plugins.automount', 'automountmap_mod'),
+    'automountmap_show': ('ipalib.plugins.automount', 'automountmap_show'),
+    'batch': ('ipalib.plugins.batch', 'batch'),
+    'cert_find': ('ipalib.plugins.cert', 'cert_find'),
+    'cert_remove_hold': ('ipalib.plugins.cert', 'cert_remove_hold'),
+    'cert_request': ('ipalib.plugins.cert', 'cert_request'),
+    'cert_request_bulk': ('ipalib.plugins.cert', 'cert_request_bulk'),
+    'cert_revoke': ('ipalib.plugins.cert', 'cert_revoke'),
+    'cert_show': ('ipalib.plugins.cert', 'cert_show'),
+    'cert_status': ('ipalib.plugins.cert', 'cert_status'),
+    'compat_is_enabled': ('ipalib.plugins.trust', 'compat_is_enabled'),
+    'config_mod': ('ipalib.plugins.config', 'config_mod'),
+    'config_show': ('ipalib.plugins.config', 'config_show'),
+    'cosentry_add': ('ipalib.plugins.pwpolicy', 'cosentry_add'),
+    'cosentry_del': ('ipalib.plugins.pwpolicy', 'cosentry_del'),
+    'cosentry_find': ('ipalib.plugins.pwpolicy', 'cosentry_find'),
+    'cosentry_mod': ('ipalib.plugins.pwpolicy', 'cosentry_mod'),
+    'cosentry_show': ('ipalib.plugins.pwpolicy', 'cosentry_show'),
+    'delegation_add': ('ipalib.plugins.delegation', 'delegation_add'),
+    'delegation_del': ('ipalib.plugins.delegation', 'delegation_del'),
+    'delegation_find': ('ipalib.plugins.delegation', 'delegation_find'),
+    'delegation_mod': ('ipalib.plugins.delegation', 'delegation_mod'),
+    'delegation_show': ('ipalib.plugins.delegation', 'delegation_show'),
+    'dns_is_enabled': ('ipalib.plugins.dns', 'dns_is_enabled'),
+    'dns_resolve': ('ipalib.plugins.dns', 'dns_resolve'),
+    'dnsconfig_mod': ('ipalib.plugins.dns', 'dnsconfig_mod'),
+    'dnsconfig_show': ('ipalib.plugins.dns', 'dnsconfig_show'),
+    'dnsrecord_add': ('ipalib.plugins.dns', 'dnsrecord_add'),
+    'dnsrecord_del': ('ipalib.plugins.dns', 'dnsrecord_del'),
+    'dnsrecord_delentry': ('ipalib.plugins.dns', 'dnsrecord_delentry'),
+    'dnsrecord_find': ('ipalib.plugins.dns', 'dnsrecord_find'),
+    'dnsrecord_mod': ('ipalib.plugins.dns', 'dnsrecord_mod'),
+    'dnsrecord_show': ('ipalib.plugins.dns', 'dnsrecord_show'),
+    'dnszone_add': ('ipalib.plugins.dns', 'dnszone_add'),
+    'dnszone_add_permission': ('ipalib.plugins.dns', 'dnszone_add_permission'),
+    'dnszone_del': ('ipalib.plugins.dns', 'dnszone_del'),
+    'dnszone_disable': ('ipalib.plugins.dns', 'dnszone_disable'),
+    'dnszone_enable': ('ipalib.plugins.dns', 'dnszone_enable'),
+    'dnszone_export': ('ipalib.plugins.dns', 'dnszone_export'),
+    'dnszone_find': ('ipalib.plugins.dns', 'dnszone_find'),
+    'dnszone_import': ('ipalib.plugins.dns', 'dnszone_import'),
+    'dnszone_mod': ('ipalib.plugins.dns', 'dnszone_mod'),
+    'dnszone_remove_permission': ('ipalib.plugins.dns', 'dnszone_remove_permission'),
+    'dnszone_show': ('ipalib.plugins.dns', 'dnszone_show'),
+    'env': ('ipalib.plugins.misc', 'env'),
+    'group_add': ('ipalib.plugins.group', 'group_add'),
+    'group_add_member': ('ipalib.plugins.group', 'group_add_member'),
+    'group_del': ('ipalib.plugins.group', 'group_del'),
+    'group_detach': ('ipalib.plugins.group', 'group_detach'),
+    'group_find': ('ipalib.plugins.group', 'group_find'),
+    'group_mod': ('ipalib.plugins.group', 'group_mod'),
+    'group_remove_member': ('ipalib.plugins.group', 'group_remove_member'),
+    'group_show': ('ipalib.plugins.group', 'group_show'),
+    'hbacrule_add': ('ipalib.plugins.hbacrule', 'hbacrule_add'),
+    'hbacrule_add_host': ('ipalib.plugins.hbacrule', 'hbacrule_add_host'),
+    'hbacrule_add_service': ('ipalib.plugins.hbacrule', 'hbacrule_add_service'),
+    'hbacrule_add_sourcehost': ('ipalib.plugins.hbacrule', 'hbacrule_add_sourcehost'),
+    'hbacrule_add_user': ('ipalib.plugins.hbacrule', 'hbacrule_add_user'),
+    'hbacrule_del': ('ipalib.plugins.hbacrule', 'hbacrule_del'),
+    'hbacrule_disable': ('ipalib.plugins.hbacrule', 'hbacrule_disable'),
+    'hbacrule_enable': ('ipalib.plugins.hbacrule', 'hbacrule_enable'),
+    'hbacrule_find': ('ipalib.plugins.hbacrule', 'hbacrule_find'),
+    'hbacrule_mod': ('ipalib.plugins.hbacrule', 'hbacrule_mod'),
+    'hbacrule_remove_host': ('ipalib.plugins.hbacrule', 'hbacrule_remove_host'),
+    'hbacrule_remove_service': ('ipalib.plugins.hbacrule', 'hbacrule_remove_service'),
+    'hbacrule_remove_sourcehost': ('ipalib.plugins.hbacrule', 'hbacrule_remove_sourcehost'),
+    'hbacrule_remove_user': ('ipalib.plugins.hbacrule', 'hbacrule_remove_user'),
+    'hbacrule_show': ('ipalib.plugins.hbacrule', 'hbacrule_show'),
+    'hbacsvc_add': ('ipalib.plugins.hbacsvc', 'hbacsvc_add'),
+    'hbacsvc_del': ('ipalib.plugins.hbacsvc', 'hbacsvc_del'),
+    'hbacsvc_find': ('ipalib.plugins.hbacsvc', 'hbacsvc_find'),
+    'hbacsvc_mod': ('ipalib.plugins.hbacsvc', 'hbacsvc_mod'),
+    'hbacsvc_show': ('ipalib.plugins.hbacsvc', 'hbacsvc_show'),
+    'hbacsvcgroup_add': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_add'),
+    'hbacsvcgroup_add_member': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_add_member'),
+    'hbacsvcgroup_del': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_del'),
+    'hbacsvcgroup_find': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_find'),
+    'hbacsvcgroup_mod': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_mod'),
+    'hbacsvcgroup_remove_member': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_remove_member'),
+    'hbacsvcgroup_show': ('ipalib.plugins.hbacsvcgroup', 'hbacsvcgroup_show'),
+    'hbactest': ('ipalib.plugins.hbactest', 'hbactest'),
+    'hbactest_matrix': ('ipalib.plugins.hbactest', 'hbactest_matrix'),
+    'host_add': ('ipalib.plugins.host', 'host_add'),
+    'host_add_managedby': ('ipalib.plugins.host', 'host_add_managedby'),
+    'host_del': ('ipalib.plugins.host', 'host_del'),
+    'host_disable': ('ipalib.plugins.host', 'host_disable'),
+    'host_find': ('ipalib.plugins.host', 'host_find'),
+    'host_mod': ('ipalib.plugins.host', 'host_mod'),
+    'host_remove_managedby': ('ipalib.plugins.host', 'host_remove_managedby'),
+    'host_show': ('ipalib.plugins.host', 'host_show'),
+    'hostgroup_add': ('ipalib.plugins.hostgroup', 'hostgroup_add'),
+    'hostgroup_add_member': ('ipalib.plugins.hostgroup', 'hostgroup_add_member'),
+    'hostgroup_del': ('ipalib.plugins.hostgroup', 'hostgroup_del'),
+    'hostgroup_find': ('ipalib.plugins.hostgroup', 'hostgroup_find'),
+    'hostgroup_mod': ('ipalib.plugins.hostgroup', 'hostgroup_mod'),
+    'hostgroup_remove_member': ('ipalib.plugins.hostgroup', 'hostgroup_remove_member'),
+    'hostgroup_show': ('ipalib.plugins.hostgroup', 'hostgroup_show'),
+    'i18n_messages': ('ipalib.plugins.internal', 'i18n_messages'),
+    'idrange_add': ('ipalib.plugins.idrange', 'idrange_add'),
+    'idrange_del': ('ipalib.plugins.idrange', 'idrange_del'),
+    'idrange_find': ('ipalib.plugins.idrange', 'idrange_find'),
+    'idrange_mod': ('ipalib.plugins.idrange', 'idrange_mod'),
+    'idrange_show': ('ipalib.plugins.idrange', 'idrange_show'),
+    'json_metadata': ('ipalib.plugins.internal', 'json_metadata'),
+    'krbtpolicy_mod': ('ipalib.plugins.krbtpolicy', 'krbtpolicy_mod'),
+    'krbtpolicy_reset': ('ipalib.plugins.krbtpolicy', 'krbtpolicy_reset'),
+    'krbtpolicy_show': ('ipalib.plugins.krbtpolicy', 'krbtpolicy_show'),
+    'migrate_ds': ('ipalib.plugins.migration', 'migrate_ds'),
+    'netgroup_add': ('ipalib.plugins.netgroup', 'netgroup_add'),
+    'netgroup_add_member': ('ipalib.plugins.netgroup', 'netgroup_add_member'),
+    'netgroup_del': ('ipalib.plugins.netgroup', 'netgroup_del'),
+    'netgroup_find': ('ipalib.plugins.netgroup', 'netgroup_find'),
+    'netgroup_mod': ('ipalib.plugins.netgroup', 'netgroup_mod'),
+    'netgroup_remove_member': ('ipalib.plugins.netgroup', 'netgroup_remove_member'),
+    'netgroup_show': ('ipalib.plugins.netgroup', 'netgroup_show'),
+    'otptoken_add': ('ipalib.plugins.otptoken', 'otptoken_add'),
+    'otptoken_del': ('ipalib.plugins.otptoken', 'otptoken_del'),
+    'otptoken_find': ('ipalib.plugins.otptoken', 'otptoken_find'),
+    'otptoken_mod': ('ipalib.plugins.otptoken', 'otptoken_mod'),
+    'otptoken_show': ('ipalib.plugins.otptoken', 'otptoken_show'),
+    'passwd': ('ipalib.plugins.passwd', 'passwd'),
+    'permission_add': ('ipalib.plugins.permission', 'permission_add'),
+    'permission_add_member': ('ipalib.plugins.permission', 'permission_add_member'),
+    'permission_add_noaci': ('ipalib.plugins.permission', 'permission_add_noaci'),
+    'permission_del': ('ipalib.plugins.permission', 'permission_del'),
+    'permission_find': ('ipalib.plugins.permission', 'permission_find'),
+    'permission_mod': ('ipalib.plugins.permission', 'permission_mod'),
+    'permission_remove_member': ('ipalib.plugins.permission', 'permission_remove_member'),
+    'permission_show': ('ipalib.plugins.permission', 'permission_show'),
+    'ping': ('ipalib.plugins.ping', 'ping'),
+    'pkinit_anonymous': ('ipalib.plugins.pkinit', 'pkinit_anonymous'),
+    'plugins': ('ipalib.plugins.misc', 'plugins'),
+    'privilege_add': ('ipalib.plugins.privilege', 'privilege_add'),
+    'privilege_add_member': ('ipalib.plugins.privilege', 'privilege_add_member'),
+    'privilege_add_permission': ('ipalib.plugins.privilege', 'privilege_add_permission'),
+    'privilege_del': ('ipalib.plugins.privilege', 'privilege_del'),
+    'privilege_find': ('ipalib.plugins.privilege', 'privilege_find'),
+    'privilege_mod': ('ipalib.plugins.privilege', 'privilege_mod'),
+    'privilege_remove_member': ('ipalib.plugins.privilege', 'privilege_remove_member'),
+    'privilege_remove_permission': ('ipalib.plugins.privilege', 'privilege_remove_permission'),
+    'privilege_show': ('ipalib.plugins.privilege', 'privilege_show'),
+    'pwpolicy_add': ('ipalib.plugins.pwpolicy', 'pwpolicy_add'),
+    'pwpolicy_del': ('ipalib.plugins.pwpolicy', 'pwpolicy_del'),
+    'pwpolicy_find': ('ipalib.plugins.pwpolicy', 'pwpolicy_find'),
+    'pwpolicy_mod': ('ipalib.plugins.pwpolicy', 'pwpolicy_mod'),
+    'pwpolicy_show': ('ipalib.plugins.pwpolicy', 'pwpolicy_show'),
+    'radiusproxy_add': ('ipalib.plugins.radiusproxy', 'radiusproxy_add'),
+    'radiusproxy_del': ('ipalib.plugins.radiusproxy', 'radiusproxy_del'),
+    'radiusproxy_find': ('ipalib.plugins.radiusproxy', 'radiusproxy_find'),
+    'radiusproxy_mod': ('ipalib.plugins.radiusproxy', 'radiusproxy_mod'),
+    'radiusproxy_show': ('ipalib.plugins.radiusproxy', 'radiusproxy_show'),
+    'realmdomains_mod': ('ipalib.plugins.realmdomains', 'realmdomains_mod'),
+    'realmdomains_show': ('ipalib.plugins.realmdomains', 'realmdomains_show'),
+    'role_add': ('ipalib.plugins.role', 'role_add'),
+    'role_add_member': ('ipalib.plugins.role', 'role_add_member'),
+    'role_add_privilege': ('ipalib.plugins.role', 'role_add_privilege'),
+    'role_del': ('ipalib.plugins.role', 'role_del'),
+    'role_find': ('ipalib.plugins.role', 'role_find'),
+    'role_mod': ('ipalib.plugins.role', 'role_mod'),
+    'role_remove_member': ('ipalib.plugins.role', 'role_remove_member'),
+    'role_remove_privilege': ('ipalib.plugins.role', 'role_remove_privilege'),
+    'role_show': ('ipalib.plugins.role', 'role_show'),
+    'selfservice_add': ('ipalib.plugins.selfservice', 'selfservice_add'),
+    'selfservice_del': ('ipalib.plugins.selfservice', 'selfservice_del'),
+    'selfservice_find': ('ipalib.plugins.selfservice', 'selfservice_find'),
+    'selfservice_mod': ('ipalib.plugins.selfservice', 'selfservice_mod'),
+    'selfservice_show': ('ipalib.plugins.selfservice', 'selfservice_show'),
+    'selinuxusermap_add': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_add'),
+    'selinuxusermap_add_host': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_add_host'),
+    'selinuxusermap_add_user': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_add_user'),
+    'selinuxusermap_del': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_del'),
+    'selinuxusermap_disable': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_disable'),
+    'selinuxusermap_enable': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_enable'),
+    'selinuxusermap_find': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_find'),
+    'selinuxusermap_mod': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_mod'),
+    'selinuxusermap_remove_host': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_remove_host'),
+    'selinuxusermap_remove_user': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_remove_user'),
+    'selinuxusermap_show': ('ipalib.plugins.selinuxusermap', 'selinuxusermap_show'),
+    'service_add': ('ipalib.plugins.service', 'service_add'),
+    'service_add_host': ('ipalib.plugins.service', 'service_add_host'),
+    'service_del': ('ipalib.plugins.service', 'service_del'),
+    'service_disable': ('ipalib.plugins.service', 'service_disable'),
+    'service_find': ('ipalib.plugins.service', 'service_find'),
+    'service_mod': ('ipalib.plugins.service', 'service_mod'),
+    'service_remove_host': ('ipalib.plugins.service', 'service_remove_host'),
+    'service_show': ('ipalib.plugins.service', 'service_show'),
+    'sidgen_was_run': ('ipalib.plugins.trust', 'sidgen_was_run'),
+    'sudocmd_add': ('ipalib.plugins.sudocmd', 'sudocmd_add'),
+    'sudocmd_del': ('ipalib.plugins.sudocmd', 'sudocmd_del'),
+    'sudocmd_find': ('ipalib.plugins.sudocmd', 'sudocmd_find'),
+    'sudocmd_mod': ('ipalib.plugins.sudocmd', 'sudocmd_mod'),
+    'sudocmd_show': ('ipalib.plugins.sudocmd', 'sudocmd_show'),
+    'sudocmdgroup_add': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_add'),
+    'sudocmdgroup_add_member': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_add_member'),
+    'sudocmdgroup_del': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_del'),
+    'sudocmdgroup_find': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_find'),
+    'sudocmdgroup_mod': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_mod'),
+    'sudocmdgroup_remove_member': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_remove_member'),
+    'sudocmdgroup_show': ('ipalib.plugins.sudocmdgroup', 'sudocmdgroup_show'),
+    'sudorule_add': ('ipalib.plugins.sudorule', 'sudorule_add'),
+    'sudorule_add_allow_command': ('ipalib.plugins.sudorule', 'sudorule_add_allow_command'),
+    'sudorule_add_deny_command': ('ipalib.plugins.sudorule', 'sudorule_add_deny_command'),
+    'sudorule_add_host': ('ipalib.plugins.sudorule', 'sudorule_add_host'),
+    'sudorule_add_option': ('ipalib.plugins.sudorule', 'sudorule_add_option'),
+    'sudorule_add_runasgroup': ('ipalib.plugins.sudorule', 'sudorule_add_runasgroup'),
+    'sudorule_add_runasuser': ('ipalib.plugins.sudorule', 'sudorule_add_runasuser'),
+    'sudorule_add_user': ('ipalib.plugins.sudorule', 'sudorule_add_user'),
+    'sudorule_del': ('ipalib.plugins.sudorule', 'sudorule_del'),
+    'sudorule_disable': ('ipalib.plugins.sudorule', 'sudorule_disable'),
+    'sudorule_enable': ('ipalib.plugins.sudorule', 'sudorule_enable'),
+    'sudorule_find': ('ipalib.plugins.sudorule', 'sudorule_find'),
+    'sudorule_mod': ('ipalib.plugins.sudorule', 'sudorule_mod'),
+    'sudorule_remove_allow_command': ('ipalib.plugins.sudorule', 'sudorule_remove_allow_command'),
+    'sudorule_remove_deny_command': ('ipalib.plugins.sudorule', 'sudorule_remove_deny_command'),
+    'sudorule_remove_host': ('ipalib.plugins.sudorule', 'sudorule_remove_host'),
+    'sudorule_remove_option': ('ipalib.plugins.sudorule', 'sudorule_remove_option'),
+    'sudorule_remove_runasgroup': ('ipalib.plugins.sudorule', 'sudorule_remove_runasgroup'),
+    'sudorule_remove_runasuser': ('ipalib.plugins.sudorule', 'sudorule_remove_runasuser'),
+    'sudorule_remove_user': ('ipalib.plugins.sudorule', 'sudorule_remove_user'),
+    'sudorule_show': ('ipalib.plugins.sudorule', 'sudorule_show'),
+    'trust_add': ('ipalib.plugins.trust', 'trust_add'),
+    'trust_del': ('ipalib.plugins.trust', 'trust_del'),
+    'trust_fetch_domains': ('ipalib.plugins.trust', 'trust_fetch_domains'),
+    'trust_find': ('ipalib.plugins.trust', 'trust_find'),
+    'trust_mod': ('ipalib.plugins.trust', 'trust_mod'),
+    'trust_resolve': ('ipalib.plugins.trust', 'trust_resolve'),
+    'trust_show': ('ipalib.plugins.trust', 'trust_show'),
+    'trustconfig_mod': ('ipalib.plugins.trust', 'trustconfig_mod'),
+    'trustconfig_show': ('ipalib.plugins.trust', 'trustconfig_show'),
+    'trustdomain_add': ('ipalib.plugins.trust', 'trustdomain_add'),
+    'trustdomain_del': ('ipalib.plugins.trust', 'trustdomain_del'),
+    'trustdomain_disable': ('ipalib.plugins.trust', 'trustdomain_disable'),
+    'trustdomain_enable': ('ipalib.plugins.trust', 'trustdomain_enable'),
+    'trustdomain_find': ('ipalib.plugins.trust', 'trustdomain_find'),
+    'trustdomain_mod': ('ipalib.plugins.trust', 'trustdomain_mod'),
+    'user_add': ('ipalib.plugins.user', 'user_add'),
+    'user_del': ('ipalib.plugins.user', 'user_del'),
+    'user_disable': ('ipalib.plugins.user', 'user_disable'),
+    'user_enable': ('ipalib.plugins.user', 'user_enable'),
+    'user_find': ('ipalib.plugins.user', 'user_find'),
+    'user_mod': ('ipalib.plugins.user', 'user_mod'),
+    'user_show': ('ipalib.plugins.user', 'user_show'),
+    'user_status': ('ipalib.plugins.user', 'user_status'),
+    'user_unlock': ('ipalib.plugins.user', 'user_unlock'),
+}
+
+requires = {
+    'ipalib.plugins.group': (
+        'ipalib.plugins.hbacrule',
+        'ipalib.plugins.netgroup',
+        'ipalib.plugins.role',
+        'ipalib.plugins.sudorule',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.hbacrule': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.hbacsvc',
+        'ipalib.plugins.hbacsvcgroup',
+        'ipalib.plugins.host',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.hbacsvc': (
+        'ipalib.plugins.hbacsvcgroup',
+    ),
+    'ipalib.plugins.hbacsvcgroup': (
+        'ipalib.plugins.hbacsvc',
+    ),
+    'ipalib.plugins.host': (
+        'ipalib.plugins.hbacrule',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.netgroup',
+        'ipalib.plugins.role',
+        'ipalib.plugins.sudorule',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.hostgroup': (
+        'ipalib.plugins.hbacrule',
+        'ipalib.plugins.host',
+        'ipalib.plugins.netgroup',
+        'ipalib.plugins.sudorule',
+    ),
+    'ipalib.plugins.idrange': (
+        'ipalib.plugins.trust',
+    ),
+    'ipalib.plugins.netgroup': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.host',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.permission': (
+        'ipalib.plugins.privilege',
+        'ipalib.plugins.role',
+    ),
+    'ipalib.plugins.privilege': (
+        'ipalib.plugins.permission',
+        'ipalib.plugins.role',
+    ),
+    'ipalib.plugins.role': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.host',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.privilege',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.selinuxusermap': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.host',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.service': (
+        'ipalib.plugins.host',
+    ),
+    'ipalib.plugins.sudocmd': (
+        'ipalib.plugins.sudocmdgroup',
+    ),
+    'ipalib.plugins.sudocmdgroup': (
+        'ipalib.plugins.sudocmd',
+    ),
+    'ipalib.plugins.sudorule': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.host',
+        'ipalib.plugins.hostgroup',
+        'ipalib.plugins.sudocmd',
+        'ipalib.plugins.sudocmdgroup',
+        'ipalib.plugins.user',
+    ),
+    'ipalib.plugins.user': (
+        'ipalib.plugins.group',
+        'ipalib.plugins.hbacrule',
+        'ipalib.plugins.netgroup',
+        'ipalib.plugins.role',
+        'ipalib.plugins.sudorule',
+    ),
+}
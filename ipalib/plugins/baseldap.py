@@ -27,6 +27,7 @@ import base64
 
 from ipalib import api, crud, errors
 from ipalib import Method, Object, Command
+from ipalib.plugable import Plugin
 from ipalib import Flag, Int, Str
 from ipalib.cli import to_cli
 from ipalib import output
@@ -471,6 +472,37 @@ class LDAPObject(Object):
     object_not_found_msg = _('%(pkey)s: %(oname)s not found')
     already_exists_msg = _('%(oname)s with name "%(pkey)s" already exists')
 
+    # Create stubs for attributes that are set in _on_finalize()
+    member_containers = Plugin.finalize_attr('member_containers')
+
+    def _on_finalize(self):
+        super(LDAPObject, self)._on_finalize()
+        self.member_containers = self._make_member_containers()
+
+    def _make_member_containers(self):
+        """
+        Build the index used by convert_attribute_members to find the
+        object of a member DN.
+
+        Return a dict mapping member attributes to (lengths, containers).
+        containers maps the container DN of every member object, as a
+        tuple of lower-case RDN strings, to a list of (attribute name,
+        object) pairs. lengths are the different lengths of the container
+        DNs.
+        """
+        index = {}
+        for (attr, ldap_obj_names) in self.attribute_members.iteritems():
+            containers = {}
+            for ldap_obj_name in ldap_obj_names:
+                ldap_obj = self.api.Object[ldap_obj_name]
+                container_dn = DN(ldap_obj.container_dn, api.env.basedn)
+                key = tuple(str(rdn).lower() for rdn in container_dn.rdns)
+                containers.setdefault(key, []).append(
+                    ('%s_%s' % (attr, ldap_obj.name), ldap_obj))
+            lengths = sorted(set(len(key) for key in containers))
+            index[attr] = (lengths, containers)
+        return index
+
     def get_dn(self, *keys, **kwargs):
         if self.parent_object:
             parent_dn = self.api.Object[self.parent_object].get_dn(*keys[:-1])
@@ -498,6 +530,25 @@ class LDAPObject(Object):
         entry = self.backend.get_entry(dn, [''])
         return entry.dn
 
+    def get_primary_keys_from_dns(self, dns):
+        """
+        Return the primary keys of the entries with the DNs dns.
+
+        Unless the primary key has to be read from the entry, it is taken
+        from the first RDN without looking it up in the whole DN.
+        """
+        if self.rdn_attribute or self.primary_key is None:
+            return [self.get_primary_key_from_dn(dn) for dn in dns]
+        pkey_name = self.primary_key.name
+        pkeys = []
+        for dn in dns:
+            rdn = dn.rdns[0] if len(dn) else None
+            if rdn is not None and rdn.attr == pkey_name:
+                pkeys.append(rdn.value)
+            else:
+                pkeys.append(self.get_primary_key_from_dn(dn))
+        return pkeys
+
     def get_primary_key_from_dn(self, dn):
         assert isinstance(dn, DN)
         try:
@@ -541,15 +592,22 @@ class LDAPObject(Object):
         if options.get('raw', False):
             return
         for attr in self.attribute_members:
+            (lengths, containers) = self.member_containers[attr]
+            # {new attribute: (object, [member DN, ...]), ...}
+            classified = {}
             for member in entry_attrs.setdefault(attr, []):
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                    if member.endswith(container_dn):
-                        new_attr = '%s_%s' % (attr, ldap_obj.name)
-                        entry_attrs.setdefault(new_attr, []).append(
-                            ldap_obj.get_primary_key_from_dn(member)
-                        )
+                rdns = [str(rdn).lower() for rdn in member.rdns]
+                for length in lengths:
+                    if length > len(rdns):
+                        break
+                    for (new_attr, ldap_obj) in containers.get(
+                            tuple(rdns[-length:]), ()):
+                        classified.setdefault(
+                            new_attr, (ldap_obj, []))[1].append(member)
+            for (new_attr, (ldap_obj, members)) in classified.iteritems():
+                entry_attrs.setdefault(new_attr, []).extend(
+                    ldap_obj.get_primary_keys_from_dns(members)
+                )
             del entry_attrs[attr]
 
     def get_password_attributes(self, ldap, dn, entry_attrs):
@@ -1177,6 +1235,7 @@ class LDAPRetrieve(LDAPQuery):
     """
     has_output = output.standard_entry
     has_output_params = global_output_params
+    cache_response = True
 
     takes_options = (
         Flag('rights',
@@ -1509,6 +1568,38 @@ class LDAPModMember(LDAPQuery):
                         failed[attr][ldap_obj_name].append((name, unicode(e)))
         return (dns, failed)
 
+    def _update_members(self, update_func, dn, member_dns, failed, **kwargs):
+        """
+        Call update_func (ldap2.add_entries_to_group or
+        ldap2.remove_entries_from_group) once per member attribute with all
+        members in member_dns. Members which could not be updated are added
+        to failed. Return the number of updated members.
+        """
+        completed = 0
+        for (attr, objs) in member_dns.iteritems():
+            m_dns = []
+            m_obj_names = {}
+            for (ldap_obj_name, dns) in objs.iteritems():
+                for m_dn in dns:
+                    assert isinstance(m_dn, DN)
+                    if not m_dn:
+                        continue
+                    m_dns.append(m_dn)
+                    m_obj_names[m_dn] = ldap_obj_name
+            if not m_dns:
+                continue
+
+            update_failed = update_func(m_dns, dn, attr, **kwargs)
+            for (m_dn, e) in update_failed:
+                ldap_obj_name = m_obj_names[m_dn]
+                ldap_obj = self.api.Object[ldap_obj_name]
+                failed[attr][ldap_obj_name].append((
+                    ldap_obj.get_primary_key_from_dn(m_dn),
+                    unicode(e),)
+                )
+            completed += len(m_dns) - len(update_failed)
+        return completed
+
 
 class LDAPAddMember(LDAPModMember):
     """
@@ -1544,23 +1635,9 @@ class LDAPAddMember(LDAPModMember):
             dn = callback(self, ldap, dn, member_dns, failed, *keys, **options)
             assert isinstance(dn, DN)
 
-        completed = 0
-        for (attr, objs) in member_dns.iteritems():
-            for ldap_obj_name in objs:
-                for m_dn in member_dns[attr][ldap_obj_name]:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.add_entry_to_group(m_dn, dn, attr, allow_same=self.allow_same)
-                    except errors.PublicError, e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+        completed = self._update_members(
+            ldap.add_entries_to_group, dn, member_dns, failed,
+            allow_same=self.allow_same)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1644,23 +1721,8 @@ class LDAPRemoveMember(LDAPModMember):
             dn = callback(self, ldap, dn, member_dns, failed, *keys, **options)
             assert isinstance(dn, DN)
 
-        completed = 0
-        for (attr, objs) in member_dns.iteritems():
-            for ldap_obj_name, m_dns in objs.iteritems():
-                for m_dn in m_dns:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.remove_entry_from_group(m_dn, dn, attr)
-                    except errors.PublicError, e:
-                        ldap_obj = self.api.Object[ldap_obj_name]
-                        failed[attr][ldap_obj_name].append((
-                            ldap_obj.get_primary_key_from_dn(m_dn),
-                            unicode(e),)
-                        )
-                    else:
-                        completed += 1
+        completed = self._update_members(
+            ldap.remove_entries_from_group, dn, member_dns, failed)
 
         if options.get('all', False):
             attrs_list = ['*'] + self.obj.default_attributes
@@ -1732,6 +1794,7 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
     # as a key attribute
     # Set the following attribute to False to turn sorting off
     sort_result_entries = True
+    cache_response = True
 
     takes_options = (
         Int('timelimit?',
@@ -1879,6 +1942,15 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 self, ldap, filter, attrs_list, base_dn, scope, *args, **options)
             assert isinstance(base_dn, DN)
 
+        if self._can_stream_entries():
+            (entries, truncated) = self._stream_entries(
+                ldap, filter, attrs_list, base_dn, scope, *args, **options)
+            return dict(
+                result=entries,
+                count=len(entries),
+                truncated=truncated,
+            )
+
         try:
             (entries, truncated) = self._exc_wrapper(args, options, ldap.find_entries)(
                 filter, attrs_list, base_dn, scope,
@@ -1893,17 +1965,10 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
 
         if self.sort_result_entries:
             if self.obj.primary_key:
-                def sort_key(x):
-                    return x[1][self.obj.primary_key.name][0].lower()
-                entries.sort(key=sort_key)
-
-        if not options.get('raw', False):
-            for e in entries:
-                self.obj.convert_attribute_members(e[1], *args, **options)
+                entries.sort(key=self._sort_key)
 
         for (i, e) in enumerate(entries):
-            entries[i] = entry_to_dict(e, **options)
-            entries[i]['dn'] = e.dn
+            entries[i] = self._entry_to_output(e, *args, **options)
 
         return dict(
             result=entries,
@@ -1911,6 +1976,61 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             truncated=truncated,
         )
 
+    def _sort_key(self, entry):
+        return entry[self.obj.primary_key.name][0].lower()
+
+    def _entry_to_output(self, entry, *args, **options):
+        if not options.get('raw', False):
+            self.obj.convert_attribute_members(entry, *args, **options)
+        result = entry_to_dict(entry, **options)
+        result['dn'] = entry.dn
+        return result
+
+    def _can_stream_entries(self):
+        """
+        Entries can be converted to their output form as they arrive if no
+        post or exception callback needs to see the whole result.
+        """
+        for callback_type in ('post', 'exc'):
+            callbacks = list(self.get_callbacks(callback_type))
+            default = getattr(LDAPSearch, '%s_callback' % callback_type)
+            if (len(callbacks) != 1 or
+                    getattr(callbacks[0], 'im_func', None) is not
+                    default.im_func):
+                return False
+        return True
+
+    def _stream_entries(self, ldap, filter, attrs_list, base_dn, scope,
+                        *args, **options):
+        """
+        Search entries and convert each one right away, so that only one
+        representation of the result is kept in memory.
+        """
+        sort = self.sort_result_entries and self.obj.primary_key
+        entries = []
+        truncated = False
+        try:
+            # Only errors raised while iterating mean the search was
+            # truncated
+            result = ldap.iter_entries(
+                filter, attrs_list, base_dn, scope,
+                time_limit=options.get('timelimit', None),
+                size_limit=options.get('sizelimit', None))
+        except errors.NotFound:
+            return ([], False)
+        try:
+            for e in result:
+                key = self._sort_key(e) if sort else None
+                entries.append((key, self._entry_to_output(e, *args, **options)))
+        except errors.LimitsExceeded:
+            truncated = True
+        except errors.NotFound:
+            pass
+
+        if sort:
+            entries.sort(key=lambda x: x[0])
+        return ([e for (key, e) in entries], truncated)
+
     def pre_callback(self, ldap, filters, attrs_list, base_dn, scope, *args, **options):
         assert isinstance(base_dn, DN)
         return (filters, base_dn, scope)
@@ -45,13 +45,18 @@ And then a nested response for each IPA command method sent in the request
 
 """
 
+import os
+import threading
+import Queue
+
 from ipalib import api, errors
 from ipalib import Command
-from ipalib.parameters import Str, Any
+from ipalib.parameters import Str, Any, Flag
 from ipalib.output import Output
 from ipalib import output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context, Connection
+from ipalib.plugins.baseldap import LDAPRetrieve, LDAPSearch
 from ipapython.version import API_VERSION
 
 class batch(Command):
@@ -63,6 +68,13 @@ class batch(Command):
         ),
     )
 
+    takes_options = (
+        Flag('parallel',
+            doc=_('Execute read-only methods concurrently'),
+            default=False,
+        ),
+    )
+
     take_options = (
         Str('version',
             cli_name='version',
@@ -80,48 +92,141 @@ class batch(Command):
     )
 
     def execute(self, *args, **options):
-        results = []
-        for arg in args[0]:
-            params = dict()
-            name = None
-            try:
-                if 'method' not in arg:
-                    raise errors.RequirementError(name='method')
-                if 'params' not in arg:
-                    raise errors.RequirementError(name='params')
-                name = arg['method']
-                if name not in self.Command:
-                    raise errors.CommandError(name=name)
-                a, kw = arg['params']
-                newkw = dict((str(k), v) for k, v in kw.iteritems())
-                params = api.Command[name].args_options_2_params(*a, **newkw)
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+        methods = args[0] or []
+        if (options.get('parallel') and self.env.batch_max_workers > 1 and
+                self.env.in_server and os.environ.get('KRB5CCNAME')):
+            results = self._execute_parallel(methods, options)
+        else:
+            results = [self._execute_method(arg, options) for arg in methods]
+        return dict(count=len(results) , results=results)
+
+    def _execute_method(self, arg, options):
+        params = dict()
+        name = None
+        try:
+            if 'method' not in arg:
+                raise errors.RequirementError(name='method')
+            if 'params' not in arg:
+                raise errors.RequirementError(name='params')
+            name = arg['method']
+            if name not in self.Command:
+                raise errors.CommandError(name=name)
+            a, kw = arg['params']
+            newkw = dict((str(k), v) for k, v in kw.iteritems())
+            params = api.Command[name].args_options_2_params(*a, **newkw)
+            newkw.setdefault('version', options['version'])
+
+            result = api.Command[name](*a, **newkw)
+            self.info(
+                '%s: batch: %s(%s): SUCCESS', context.principal, name, ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error']=None
+        except Exception, e:
+            if isinstance(e, errors.RequirementError) or \
+                isinstance(e, errors.CommandError):
                 self.info(
-                    '%s: batch: %s(%s): SUCCESS', context.principal, name, ', '.join(api.Command[name]._repr_iter(**params))
+                    '%s: batch: %s', context.principal, e.__class__.__name__
                 )
-                result['error']=None
-            except Exception, e:
-                if isinstance(e, errors.RequirementError) or \
-                    isinstance(e, errors.CommandError):
-                    self.info(
-                        '%s: batch: %s', context.principal, e.__class__.__name__
-                    )
-                else:
-                    self.info(
-                        '%s: batch: %s(%s): %s', context.principal, name, ', '.join(api.Command[name]._repr_iter(**params)),  e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
+            else:
+                self.info(
+                    '%s: batch: %s(%s): %s', context.principal, name, ', '.join(api.Command[name]._repr_iter(**params)),  e.__class__.__name__
                 )
-            results.append(result)
-        return dict(count=len(results) , results=results)
+            result = self._error_result(e)
+        return result
+
+    def _error_result(self, e):
+        if isinstance(e, errors.PublicError):
+            reported_error = e
+        else:
+            reported_error = errors.InternalError()
+        return dict(
+            error=reported_error.strerror,
+            error_code=reported_error.errno,
+            error_name=unicode(type(reported_error).__name__),
+        )
+
+    def _is_read_only(self, arg):
+        """
+        Return True if the nested method only reads data and can therefore
+        run concurrently with other read-only methods.
+        """
+        try:
+            name = arg['method']
+        except (KeyError, TypeError):
+            return False
+        if name not in self.Command:
+            return False
+        return isinstance(self.Command[name], (LDAPRetrieve, LDAPSearch))
+
+    def _execute_parallel(self, methods, options):
+        """
+        Execute consecutive read-only methods concurrently.
+
+        Any other method is executed alone once all methods before it have
+        finished, so it sees their effects and the methods after it see its
+        effects as if the batch was executed sequentially.
+        """
+        results = [None] * len(methods)
+        read_only = []
+        for i, arg in enumerate(methods):
+            if self._is_read_only(arg):
+                read_only.append(i)
+                continue
+            self._execute_concurrently(methods, read_only, results, options)
+            read_only = []
+            results[i] = self._execute_method(arg, options)
+        self._execute_concurrently(methods, read_only, results, options)
+        return results
+
+    def _execute_concurrently(self, methods, indexes, results, options):
+        """
+        Execute methods[i] for every i in indexes on a pool of worker
+        threads and store the result in results[i].
+
+        Every worker has its own request context, initialized from the
+        context of the batch, and its own LDAP connection.
+        """
+        if len(indexes) <= 1:
+            for i in indexes:
+                results[i] = self._execute_method(methods[i], options)
+            return
+
+        parent_context = dict(
+            (key, value) for key, value in context.__dict__.iteritems()
+            if not isinstance(value, Connection))
+        ccache = os.environ.get('KRB5CCNAME')
+        queue = Queue.Queue()
+        for i in indexes:
+            queue.put(i)
+
+        def worker():
+            context.__dict__.update(parent_context)
+            try:
+                try:
+                    self.Backend.ldap2.connect(ccache=ccache)
+                except Exception, e:
+                    self.error('batch: unable to connect worker: %s', e)
+                    connect_error = e
+                else:
+                    connect_error = None
+                while True:
+                    try:
+                        i = queue.get_nowait()
+                    except Queue.Empty:
+                        break
+                    if connect_error is not None:
+                        results[i] = self._error_result(connect_error)
+                    else:
+                        results[i] = self._execute_method(methods[i], options)
+            finally:
+                destroy_context()
+
+        workers = [threading.Thread(target=worker)
+                   for w in xrange(min(len(indexes),
+                                       self.env.batch_max_workers))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
 
 api.register(batch)
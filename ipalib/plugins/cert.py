@@ -25,20 +25,26 @@ if api.env.enable_ra is not True:
     raise SkipPluginModule(reason='env.enable_ra is not True')
 import os
 import time
+import threading
+import Queue
+import ldap as _ldap
 from ipalib import Command, Str, Int, Bytes, Flag, File
+from ipalib.parameters import Any
 from ipalib import errors
 from ipalib import pkcs10
 from ipalib import x509
 from ipalib import util
 from ipalib import ngettext
 from ipalib.plugins.virtual import *
-from ipalib.plugins.service import split_principal
+from ipalib.plugins.service import split_principal, normalize_principal
 import base64
 import traceback
 from ipalib.text import _
 from ipalib.request import context
 from ipalib import output
+from ipalib.output import Output
 from ipalib.plugins.service import validate_principal
+from ipapython.dn import DN
 import nss.nss as nss
 from nss.error import NSPRError
 
@@ -236,6 +242,18 @@ def get_host_from_principal(principal):
 
     return hostname
 
+def add_certificate_details(result):
+    """
+    Add the issuer, validity and fingerprints of result['certificate'] to
+    the result of a certificate request.
+    """
+    cert = x509.load_certificate(result['certificate'])
+    result['issuer'] = unicode(cert.issuer)
+    result['valid_not_before'] = unicode(cert.valid_not_before_str)
+    result['valid_not_after'] = unicode(cert.valid_not_after_str)
+    result['md5_fingerprint'] = unicode(nss.data_to_hex(nss.md5_digest(cert.der_data), 64)[0])
+    result['sha1_fingerprint'] = unicode(nss.data_to_hex(nss.sha1_digest(cert.der_data), 64)[0])
+
 class cert_request(VirtualCommand):
     __doc__ = _('Submit a certificate signing request.')
 
@@ -414,12 +432,7 @@ class cert_request(VirtualCommand):
         # Request the certificate
         result = self.Backend.ra.request_certificate(
             csr, request_type=request_type)
-        cert = x509.load_certificate(result['certificate'])
-        result['issuer'] = unicode(cert.issuer)
-        result['valid_not_before'] = unicode(cert.valid_not_before_str)
-        result['valid_not_after'] = unicode(cert.valid_not_after_str)
-        result['md5_fingerprint'] = unicode(nss.data_to_hex(nss.md5_digest(cert.der_data), 64)[0])
-        result['sha1_fingerprint'] = unicode(nss.data_to_hex(nss.sha1_digest(cert.der_data), 64)[0])
+        add_certificate_details(result)
 
         # Success? Then add it to the service entry.
         if 'certificate' in result:
@@ -438,6 +451,391 @@ class cert_request(VirtualCommand):
 api.register(cert_request)
 
 
+class cert_request_bulk(VirtualCommand):
+    __doc__ = _('Submit several certificate signing requests.')
+
+    NO_CLI = True
+
+    takes_args = (
+        Any('requests*',
+            doc=_('Certificate requests, dictionaries with the principal '
+                  'and the csr of every request'),
+        ),
+    )
+    operation="request certificate"
+
+    takes_options = (
+        Str('request_type',
+            default=u'pkcs10',
+            autofill=True,
+        ),
+        Flag('add',
+            doc=_("automatically add the principals which don't exist"),
+            default=False,
+            autofill=True
+        ),
+    )
+
+    has_output = (
+        Output('count', int, doc=''),
+        Output('results', (list, tuple), doc=''),
+    )
+
+    # Maximum number of values looked up by a single LDAP search
+    lookup_chunk_size = 100
+
+    def execute(self, *args, **options):
+        """
+        The requests go through the same checks as in cert_request, but
+        the service, host and subject alt name entries of all requests are
+        looked up with a few searches, the requests are submitted to the
+        CA concurrently and the certificates are stored with asynchronous
+        modifications. A request which fails does not stop the others,
+        its error is reported in its result.
+        """
+        requests = args[0] or []
+
+        bind_principal = getattr(context, 'principal')
+        # Can this user request certs?
+        if not bind_principal.startswith('host/'):
+            self.check_access()
+
+        items = [self._prepare(request) for request in requests]
+        self._reject_duplicates(items)
+        self._lookup_principals(items, options['add'])
+        self._check_subject_alt_names(items, bind_principal)
+        self._check_revocation(items, bind_principal)
+        self._request_certificates(items, options['request_type'])
+        self._store_certificates(items)
+
+        results = [self._item_result(item) for item in items]
+        return dict(count=len(results), results=results)
+
+    def _prepare(self, request):
+        """
+        Validate a request, return the dict describing it in the next steps.
+        """
+        item = dict(principal=None, error=None)
+        try:
+            if not isinstance(request, dict):
+                raise errors.ValidationError(name='requests',
+                    error=_('must be a dictionary'))
+            for name in ('principal', 'csr'):
+                if not request.get(name):
+                    raise errors.RequirementError(name=name)
+            item['principal'] = unicode(request['principal'])
+            validate_principal(None, item['principal'])
+            principal = normalize_principal(item['principal'])
+            csr = normalize_csr(request['csr'])
+            validate_csr(None, csr)
+
+            # Ensure that the hostname in the CSR matches the principal
+            subject_host = get_csr_hostname(csr)
+            if not subject_host:
+                raise errors.ValidationError(name='csr',
+                    error=_("No hostname was found in subject of request."))
+
+            (servicename, hostname, realm) = split_principal(principal)
+            if subject_host.lower() != hostname.lower():
+                raise errors.ACIError(
+                    info=_("hostname in subject of request '%(subject_host)s' "
+                        "does not match principal hostname '%(hostname)s'") % dict(
+                            subject_host=subject_host, hostname=hostname))
+
+            subjectaltname = pkcs10.get_subjectaltname(
+                pkcs10.load_certificate_request(csr))
+            item.update(
+                csr=csr,
+                normalized_principal=principal,
+                hostname=hostname,
+                is_host=principal.startswith('host/'),
+                subjectaltname=[unicode(name) for name in subjectaltname or []],
+            )
+        except errors.PublicError, e:
+            item['error'] = e
+        return item
+
+    def _reject_duplicates(self, items):
+        """
+        Reject every request for a principal already requested earlier in
+        the same call.
+
+        The requests are processed concurrently, two requests for the same
+        principal would revoke the same certificate and only one of the new
+        certificates would be stored.
+        """
+        seen = set()
+        for item in items:
+            if item['error'] is not None:
+                continue
+            principal = item['normalized_principal'].lower()
+            if principal in seen:
+                item['error'] = errors.ValidationError(name='requests',
+                    error=_("duplicate request for principal '%s'") %
+                        item['principal'])
+            seen.add(principal)
+
+    def _find_entries(self, attr, values, container, attrs_list, rights=False):
+        """
+        Look up the entries in container having one of values in attr.
+
+        The values are split into chunks of lookup_chunk_size values, one
+        search is run per chunk and all searches run concurrently. If rights
+        is True, the entries come with the effective rights of the bound
+        user on attrs_list.
+
+        Return a dict mapping every lower-cased value found to its entry.
+        """
+        if not values:
+            return {}
+        ldap = self.api.Backend.ldap2
+        base_dn = DN(container, self.api.env.basedn)
+        serverctrls = None
+        if rights:
+            serverctrls = [ldap.get_effective_rights_control()]
+
+        values = sorted(set(values))
+        found = {}
+        with ldap.multiplexer() as mux:
+            ops = []
+            for i in xrange(0, len(values), self.lookup_chunk_size):
+                filter = ldap.make_filter_from_attr(
+                    attr, values[i:i + self.lookup_chunk_size],
+                    rules=ldap.MATCH_ANY)
+                ops.append(mux.search(filter, attrs_list, base_dn,
+                                      serverctrls=serverctrls))
+            for op in ops:
+                for entry in mux.wait(op):
+                    for value in entry.get(attr, []):
+                        found[value.lower()] = entry
+        return found
+
+    def _lookup_principals(self, items, add):
+        """
+        Find the service or host entry of every request and check that the
+        bound user can write its certificate.
+        """
+        attrs_list = ['krbprincipalname', 'fqdn', 'usercertificate',
+                      'managedby']
+        pending = [item for item in items if item['error'] is None]
+        services = self._find_entries(
+            'krbprincipalname',
+            [item['normalized_principal'] for item in pending
+             if not item['is_host']],
+            self.api.env.container_service, attrs_list, rights=True)
+        hosts = self._find_entries(
+            'fqdn',
+            [item['hostname'] for item in pending if item['is_host']],
+            self.api.env.container_host, attrs_list, rights=True)
+
+        for item in pending:
+            try:
+                if item['is_host']:
+                    entry = hosts.get(item['hostname'].lower())
+                else:
+                    entry = services.get(item['normalized_principal'].lower())
+                if entry is None:
+                    entry = self._add_principal(item, add, attrs_list)
+
+                # The service entry exists, can we write it?
+                rights = {}
+                for value in entry.get('attributelevelrights', []):
+                    for right in value.split(', '):
+                        (attr, right) = right.split(':')
+                        rights[attr.strip().lower()] = right
+                if 'w' not in rights.get('usercertificate', ''):
+                    raise errors.ACIError(info=_("Insufficient 'write' "
+                        "privilege to the 'userCertificate' attribute of "
+                        "entry '%s'.") % entry.dn)
+
+                item['dn'] = entry.dn
+                item['managedby'] = entry.get('managedby', [])
+                item['old_certificate'] = entry.get('usercertificate', [None])[0]
+            except errors.PublicError, e:
+                item['error'] = e
+
+    def _add_principal(self, item, add, attrs_list):
+        """
+        Add the service of a request which doesn't exist yet.
+        """
+        if item['is_host'] or not add:
+            raise errors.NotFound(reason=_("The service principal for "
+                "this request doesn't exist."))
+        try:
+            service = api.Command['service_add'](
+                item['normalized_principal'], force=True)['result']
+        except errors.ACIError:
+            raise errors.ACIError(info=_('You need to be a member of '
+                'the serviceadmin role to add services'))
+        return self.api.Backend.ldap2.get_effective_rights(
+            service['dn'], attrs_list)
+
+    def _check_subject_alt_names(self, items, bind_principal):
+        """
+        Check that every subject alt name of every request is a known host
+        which a host may only use if it manages the service.
+        """
+        pending = [item for item in items if item['error'] is None]
+        hosts = self._find_entries(
+            'fqdn',
+            [name for item in pending for name in item['subjectaltname']],
+            self.api.env.container_host, ['fqdn'])
+
+        for item in pending:
+            for name in item['subjectaltname']:
+                host = hosts.get(name.lower())
+                if host is None:
+                    # We don't want to issue any certificates referencing
+                    # machines we don't know about. Nothing is stored in this
+                    # host record related to this certificate.
+                    item['error'] = errors.NotFound(reason=_('no host record '
+                        'for subject alt name %s in certificate request') % name)
+                    break
+                if bind_principal.startswith('host/'):
+                    if host.dn not in item['managedby']:
+                        item['error'] = errors.ACIError(info=_(
+                            "Insufficient privilege to create a certificate "
+                            "with subject alt name '%s'.") % name)
+                        break
+
+    def _check_revocation(self, items, bind_principal):
+        """
+        Check that the previous certificate of every request may be revoked.
+
+        Without the 'revoke certificate' permission a host may only revoke
+        certificates issued to itself, like in cert_revoke.
+        """
+        pending = [item for item in items
+                   if item['error'] is None and item['old_certificate']]
+        if not pending:
+            return
+        try:
+            self.check_access('revoke certificate')
+        except errors.ACIError, acierr:
+            pass
+        else:
+            acierr = None
+
+        for item in pending:
+            cert = x509.load_certificate(item['old_certificate'],
+                                         datatype=x509.DER)
+            item['old_serial_number'] = unicode(cert.serial_number)
+            if acierr is None:
+                continue
+            if not bind_principal.startswith('host/'):
+                item['error'] = acierr
+            elif (cert.subject.common_name !=    #pylint: disable=E1101
+                    get_host_from_principal(bind_principal)):
+                item['error'] = acierr
+
+    def _request_certificate(self, item, request_type):
+        """
+        Revoke the previous certificate of a request and request the new
+        one.
+        """
+        ra = self.Backend.ra
+        serial_number = item.get('old_serial_number')
+        if serial_number is not None:
+            # First we retrieve the certificate to see if it is already
+            # revoked, if not then we revoke it.
+            try:
+                result = ra.get_certificate(serial_number)
+                if 'revocation_reason' not in result:
+                    try:
+                        ra.revoke_certificate(serial_number,
+                                              revocation_reason=4)
+                    except errors.NotImplementedError:
+                        # some CA's might not implement revoke
+                        pass
+            except errors.NotImplementedError:
+                # some CA's might not implement get
+                pass
+            # the revoked certificate is removed from the entry even if
+            # the new one can't be issued
+            item['store'] = True
+
+        result = ra.request_certificate(item['csr'], request_type=request_type)
+        if 'certificate' in result:
+            add_certificate_details(result)
+            item['store'] = True
+        item['result'] = result
+
+    def _request_certificates(self, items, request_type):
+        """
+        Submit the requests to the CA, at most ca_max_requests at a time.
+        """
+        queue = Queue.Queue()
+        for item in items:
+            if item['error'] is None:
+                queue.put(item)
+
+        def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    self._request_certificate(item, request_type)
+                except Exception, e:
+                    item['error'] = e
+
+        workers = [threading.Thread(target=worker)
+                   for w in xrange(min(queue.qsize(),
+                                       max(self.env.ca_max_requests, 1)))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    def _store_certificates(self, items):
+        """
+        Replace the certificate of every entry whose certificate was
+        revoked or issued, all modifications are sent at once.
+        """
+        ldap = self.api.Backend.ldap2
+        with ldap.multiplexer() as mux:
+            for item in items:
+                if not item.get('store'):
+                    continue
+                values = []
+                certificate = item.get('result', {}).get('certificate')
+                if certificate and item['error'] is None:
+                    values = [x509.normalize_certificate(certificate)]
+                mux.modify(item['dn'],
+                           [(_ldap.MOD_REPLACE, 'usercertificate', values)],
+                           tag=item)
+            for op in mux.iter_completed():
+                if op.error is not None and op.tag['error'] is None:
+                    op.tag['error'] = op.error
+
+    def _item_result(self, item):
+        """
+        Return the result reported for a request.
+        """
+        result = dict(principal=item['principal'], result=None, error=None)
+        e = item['error']
+        if e is None:
+            result['result'] = item['result']
+            self.info('%s: cert_request_bulk: %s: SUCCESS',
+                      context.principal, item['principal'])
+            return result
+
+        self.info('%s: cert_request_bulk: %s: %s', context.principal,
+                  item['principal'], e.__class__.__name__)
+        if not isinstance(e, errors.PublicError):
+            self.error('cert_request_bulk: %s: %s', item['principal'], e)
+            e = errors.InternalError()
+        result.update(
+            error=e.strerror,
+            error_code=e.errno,
+            error_name=unicode(type(e).__name__),
+        )
+        return result
+
+api.register(cert_request_bulk)
+
+
 class cert_status(VirtualCommand):
     __doc__ = _('Check the status of a certificate signing request.')
 
@@ -699,6 +1097,17 @@ class cert_find(Command):
             minvalue=0,
             default=100,
         ),
+        Int('start?',
+            doc=_('Index of the first matching certificate returned'),
+            flags=['no_option'],
+            minvalue=0,
+            autofill=False,
+        ),
+        Flag('stream?',
+            doc=_('Print the certificates as they are received'),
+            exclude='webui',
+            autofill=False,
+        ),
     )
 
     has_output = output.standard_list_of_entries
@@ -718,12 +1127,59 @@ class cert_find(Command):
         '%(count)d certificate matched', '%(count)d certificates matched', 0
     )
 
+    # Number of certificates requested by one call when streaming
+    stream_page_size = 1000
+
     def execute(self, **options):
-        ret = dict(
-            result=self.Backend.ra.find(options)
-        )
-        ret['count'] = len(ret['result'])
-        ret['truncated'] = False
-        return ret
+        result = []
+        truncated = False
+        try:
+            for cert in self.Backend.ra.iter_find(options):
+                result.append(cert)
+        except errors.LimitsExceeded:
+            truncated = True
+        return dict(result=result, count=len(result), truncated=truncated)
+
+    def forward(self, *keys, **options):
+        if not options.pop('stream', False):
+            return super(cert_find, self).forward(*keys, **options)
+
+        # Request the certificates page by page and print every page
+        # before the next one is requested
+        textui = self.Backend.textui
+        order = [p.name for p in self.output_params()]
+        if options.get('all', False):
+            order.insert(0, 'dn')
+            print_all = True
+        else:
+            print_all = False
+        if options.get('raw', False):
+            labels = None
+        else:
+            labels = dict((p.name, unicode(p.label)) for p in self.output_params())
+        flags = dict((p.name, p.flags) for p in self.output_params())
+
+        sizelimit = options.get('sizelimit', 100)
+        start = options.get('start', 0)
+        count = 0
+        truncated = False
+        while True:
+            size = min(self.stream_page_size, sizelimit - count)
+            options['start'] = start
+            options['sizelimit'] = size
+            result = super(cert_find, self).forward(*keys, **options)
+            if count and result['result']:
+                textui.print_plain('')
+            textui.print_entries(result['result'], order, labels, flags,
+                                 print_all)
+            count += result['count']
+            start += result['count']
+            if not result['truncated']:
+                break
+            if count >= sizelimit:
+                truncated = True
+                break
+
+        return dict(result=[], count=count, truncated=truncated)
 
 api.register(cert_find)
@@ -316,6 +316,11 @@ class config_mod(LDAPUpdate):
 
         return dn
 
+    def post_callback(self, ldap, dn, entry_attrs, *keys, **options):
+        assert isinstance(dn, DN)
+        ldap.invalidate_ipa_config()
+        return dn
+
 api.register(config_mod)
 
 
@@ -23,6 +23,8 @@ from __future__ import absolute_import
 import netaddr
 import time
 import re
+import threading
+from collections import OrderedDict
 import dns.name
 
 from ipalib.request import context
@@ -35,8 +37,11 @@ from ipalib import _, ngettext
 from ipalib.util import (validate_zonemgr, normalize_zonemgr, normalize_zone,
         validate_hostname, validate_dns_label, validate_domain_name,
         get_dns_forward_zone_update_policy, get_dns_reverse_zone_update_policy,
-        get_reverse_zone_default, zone_is_reverse, REVERSE_DNS_ZONES)
+        get_reverse_zone_default, zone_is_reverse, REVERSE_DNS_ZONES,
+        check_writable_file)
 from ipapython.ipautil import valid_ip, CheckedIPAddress, is_host_resolvable
+from ipapython.dnszonefile import (read_zone_file, format_record,
+    canonical_record_data)
 
 __doc__ = _("""
 Domain Name System (DNS)
@@ -94,6 +99,12 @@ EXAMPLES:
    ipa dnszone-add --name-from-ip=80.142.15.0/24 \\
                    --name-server=ns.example.com.
 
+ Import the records of a zone file (RFC 1035) to an existing zone:
+   ipa dnszone-import example.com --file=example.com.zone
+
+ Export the records of a zone to a zone file:
+   ipa dnszone-export example.com --out=example.com.zone
+
  Add second nameserver for example.com:
    ipa dnsrecord-add example.com @ --ns-rec=nameserver2.example.com
 
@@ -454,18 +465,149 @@ def add_forward_record(zone, name, str_address):
     except errors.EmptyModlist:
         pass # the entry already exists and matches
 
+def _zone_labels(name):
+    """
+    Return the labels of a domain name, without the root label.
+    """
+    return name.rstrip(u'.').lower().split(u'.')
+
+class DNSZoneIndex(object):
+    """
+    Suffix trie of DNS zone names.
+
+    Every node is a dict mapping a label to the node of the name one label
+    longer, the trie is walked starting with the top level label. A node
+    of a zone maps None to the zone name.
+    """
+
+    def __init__(self, zones):
+        self._root = {}
+        for zone in zones:
+            node = self._root
+            for label in reversed(_zone_labels(zone)):
+                node = node.setdefault(label, {})
+            node[None] = zone
+
+    def find(self, name):
+        """
+        Return (zone, relative name) for the longest zone name which is
+        name or a parent of it, None if there is no such zone.
+        """
+        labels = _zone_labels(name)
+        node = self._root
+        found = None
+        for depth in xrange(1, len(labels) + 1):
+            node = node.get(labels[-depth])
+            if node is None:
+                break
+            if None in node:
+                found = (node[None], u'.'.join(labels[:-depth]))
+        return found
+
+class DNSZoneCache(object):
+    """
+    Per-process cache of DNS zone indexes.
+
+    A cached index is used without asking the server for ttl seconds after
+    it was built or last validated. Once it is older, only the entryUSNs of
+    the zones are read and the index is built again if a zone was added or
+    deleted. dnszone_add and dnszone_del drop the cache right away.
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def get(self, key):
+        """
+        Return (index, usn, fresh) for the cached index, None if there is
+        none. fresh is False if the index must be validated first.
+        """
+        with self._lock:
+            cached = self._indexes.get(key)
+        if cached is None:
+            return None
+        (index, usn, timestamp) = cached
+        return (index, usn, time.time() - timestamp < self.ttl)
+
+    def store(self, key, index, usn):
+        with self._lock:
+            self._indexes[key] = (index, usn, time.time())
+
+    def touch(self, key):
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is not None:
+                self._indexes[key] = (cached[0], cached[1], time.time())
+
+    def invalidate(self):
+        with self._lock:
+            self._indexes.clear()
+
+zone_cache = DNSZoneCache(ttl=api.env.dns_zone_cache_ttl)
+
+def _find_zones(attrs_list):
+    """
+    Return the zone entries visible to the bound user and a flag telling
+    whether the search was truncated.
+    """
+    ldap = api.Backend.ldap2
+    try:
+        return ldap.find_entries(
+            '(objectclass=idnszone)', attrs_list,
+            DN(api.env.container_dns, api.env.basedn),
+            scope=ldap.SCOPE_ONELEVEL, size_limit=0, paged_search=True)
+    except errors.NotFound:
+        return ([], False)
+
+def _get_zones_usn(entries, truncated):
+    """
+    Return the entryUSNs of the zones as a tuple of (DN, entryUSN) pairs,
+    None if they are not all known.
+    """
+    if truncated:
+        return None
+    usn = []
+    for entry in entries:
+        if 'entryusn' not in entry:
+            return None
+        usn.append((str(entry.dn), entry.raw['entryusn'][0]))
+    return tuple(sorted(usn))
+
+def get_zone_index():
+    """
+    Return a DNSZoneIndex of the zones visible to the bound user.
+
+    The index is shared by all requests of the same principal in this
+    process, see DNSZoneCache.
+    """
+    key = (api.env.ldap_uri, getattr(context, 'principal', None))
+    cached = zone_cache.get(key)
+    if cached is not None:
+        (index, usn, fresh) = cached
+        if fresh:
+            return index
+        if usn is not None and _get_zones_usn(*_find_zones(['entryusn'])) == usn:
+            zone_cache.touch(key)
+            return index
+
+    (entries, truncated) = _find_zones(['idnsname', 'entryusn'])
+    index = DNSZoneIndex(entry['idnsname'][0] for entry in entries)
+    zone_cache.store(key, index, _get_zones_usn(entries, truncated))
+    return index
+
 def get_reverse_zone(ipaddr, prefixlen=None):
     ip = netaddr.IPAddress(str(ipaddr))
     revdns = unicode(ip.reverse_dns)
 
     if prefixlen is None:
-        revzone = u''
-
-        result = api.Command['dnszone_find']()['result']
-        for zone in result:
-            zonename = zone['idnsname'][0]
-            if revdns.endswith(zonename) and len(zonename) > len(revzone):
-                revzone = zonename
+        found = get_zone_index().find(revdns)
+        if found is None:
+            raise errors.NotFound(
+                reason=_('DNS reverse zone for IP address %(addr)s not found') % dict(addr=ipaddr)
+            )
+        return found
     else:
         if ip.version == 4:
             pos = 4 - prefixlen / 8
@@ -1852,6 +1994,8 @@ class dnszone_add(LDAPCreate):
                                dns_record,
                                nameserver_ip_address)
 
+        zone_cache.invalidate()
+
         # Add entry to realmdomains
         # except for our own domain, forwarded zones and reverse zones
         zone = keys[0]
@@ -1875,6 +2019,8 @@ class dnszone_del(LDAPDelete):
     msg_summary = _('Deleted DNS zone "%(value)s"')
 
     def post_callback(self, ldap, dn, *keys, **options):
+        zone_cache.invalidate()
+
         try:
             api.Command['permission_del'](self.obj.permission_name(keys[-1]),
                     force=True)
@@ -2078,6 +2224,407 @@ class dnszone_remove_permission(LDAPQuery):
 
 api.register(dnszone_remove_permission)
 
+class dnszone_import(LDAPQuery):
+    __doc__ = _('Import DNS resource records from a zone file.')
+
+    takes_options = LDAPQuery.takes_options + (
+        Str('file?',
+            label=_('Zone file'),
+            doc=_('Zone file (RFC 1035) to import the records from'),
+            exclude='webui',
+        ),
+        Any('records*',
+            doc=_('Records to import, dictionaries with the name, ttl, '
+                  'type and data of every record'),
+            flags=['no_option'],
+        ),
+        Flag('force',
+             label=_('Force'),
+             doc=_('force NS record creation even if its hostname is not in DNS'),
+        ),
+    )
+
+    has_output = (
+        output.summary,
+        output.Output('count', int, _('Number of records imported')),
+        output.Output('failed', (list, tuple),
+                      _('Records which could not be imported')),
+        output.value,
+    )
+    has_output_params = (
+        Str('name',
+            label=_('Record name'),
+        ),
+        Str('record',
+            label=_('Record'),
+        ),
+        Str('error',
+            label=_('Error'),
+        ),
+    )
+    msg_summary = _('Imported %(count)d DNS resource records to zone "%(value)s"')
+
+    # Number of records sent to the server in a single call
+    batch_size = 1000
+
+    def forward(self, *keys, **options):
+        """
+        Read the zone file and send its records to the server in batches
+        of batch_size records, so neither the client nor the server holds
+        the whole zone file. The zone file is checked before any record is
+        imported.
+        """
+        filename = options.pop('file', None)
+        if filename is None:
+            return super(dnszone_import, self).forward(*keys, **options)
+
+        zone = keys[-1]
+        try:
+            with open(filename) as f:
+                for record in read_zone_file(f, zone, filename):
+                    pass
+        except (IOError, ValueError), e:
+            raise errors.ValidationError(name='file', error=unicode(e))
+
+        result = dict(count=0, failed=[], value=zone)
+        def send(records):
+            ret = super(dnszone_import, self).forward(
+                *keys, records=records, **options)
+            result['count'] += ret['count']
+            result['failed'].extend(ret['failed'])
+
+        records = []
+        with open(filename) as f:
+            for (name, ttl, rdtype, data) in read_zone_file(f, zone, filename):
+                record = dict(name=name, type=rdtype, data=data)
+                if ttl is not None:
+                    record['ttl'] = ttl
+                records.append(record)
+                if len(records) >= self.batch_size:
+                    send(records)
+                    records = []
+        if records or not result['count']:
+            send(records)
+        return result
+
+    def _ttl_error(self, ttl, dnsttl):
+        return errors.ValidationError(name='ttl',
+            error=_('TTL %(ttl)d differs from TTL %(dnsttl)d of the other '
+                    'records of the name') % dict(ttl=ttl, dnsttl=dnsttl))
+
+    def _group_records(self, zone, records, failed, force=False):
+        """
+        Validate the records like dnsrecord_add and group them by name.
+
+        All records of a name share a single TTL, a record with a TTL
+        different from the TTL of the name is not imported.
+
+        Return an ordered dict mapping every name to (ttl, entry_attrs).
+        """
+        dnsrecord = self.api.Object.dnsrecord
+        groups = OrderedDict()
+        for record in records:
+            try:
+                name = unicode(record['name'])
+                rdtype = unicode(record['type']).upper()
+                data = unicode(record['data'])
+                ttl = record.get('ttl')
+            except (KeyError, TypeError, AttributeError):
+                failed.append(dict(name=u'', record=unicode(record),
+                    error=unicode(_('every record must be a dictionary '
+                                    'with name, type and data'))))
+                continue
+            if rdtype == u'SOA':
+                # The SOA record is managed by IPA
+                continue
+            attr = '%srecord' % rdtype.lower()
+            try:
+                name = dnsrecord.params['idnsname'](name)
+                if rdtype not in _record_types:
+                    raise errors.ValidationError(name='records',
+                        error=_('unsupported DNS RR type "%s"') % rdtype)
+                values = dnsrecord.params[attr]((data,))
+                if ttl is not None:
+                    ttl = dnsrecord.params['dnsttl'](ttl)
+            except errors.PublicError, e:
+                failed.append(dict(name=name, record=u'%s %s' % (rdtype, data),
+                                   error=e.strerror))
+                continue
+            if dnsrecord.is_pkey_zone_record(zone, name):
+                name = _dns_zone_record
+            (group_ttl, entry_attrs) = groups.get(name, (None, {}))
+            if ttl is not None:
+                if group_ttl is None:
+                    group_ttl = ttl
+                elif ttl != group_ttl:
+                    failed.append(dict(name=name,
+                        record=u'%s %s' % (rdtype, data),
+                        error=self._ttl_error(ttl, group_ttl).strerror))
+                    continue
+            groups[name] = (group_ttl, entry_attrs)
+            group_values = entry_attrs.setdefault(attr, [])
+            group_values.extend(v for v in values if v not in group_values)
+
+        for (name, (ttl, entry_attrs)) in groups.items():
+            try:
+                dnsrecord.check_record_type_collisions(
+                    (zone, name), None, entry_attrs)
+                dnsrecord.run_precallback_validators(
+                    dnsrecord.get_dn(zone, name), entry_attrs, zone, name,
+                    force=force)
+            except errors.PublicError, e:
+                self._fail(failed, name, entry_attrs, e)
+                del groups[name]
+        return groups
+
+    def _fail(self, failed, name, entry_attrs, e):
+        for (attr, values) in entry_attrs.iteritems():
+            rdtype = self.api.Object.dnsrecord.attr_to_cli(attr)
+            for value in values:
+                failed.append(dict(name=name, record=u'%s %s' % (rdtype, value),
+                                   error=e.strerror))
+
+    def _merge_records(self, ldap, zone, name, ttl, entry_attrs):
+        """
+        Add the records to the existing entry of name.
+        """
+        dnsrecord = self.api.Object.dnsrecord
+        dn = dnsrecord.get_dn(zone, name)
+        old_entry = ldap.get_entry(dn, ['dnsttl'] + _record_attributes)
+        dnsrecord.check_record_type_collisions(
+            (zone, name), old_entry, entry_attrs)
+        update = {}
+        if ttl is not None:
+            if not old_entry.get('dnsttl'):
+                update['dnsttl'] = [ttl]
+            elif int(old_entry['dnsttl'][0]) != ttl:
+                raise self._ttl_error(ttl, int(old_entry['dnsttl'][0]))
+        for (attr, values) in entry_attrs.iteritems():
+            # The names in the data of existing records may be absolute
+            # where the imported ones are relative, or vice versa
+            rdtype = dnsrecord.attr_to_cli(attr)
+            old_values = list(old_entry.get(attr, []))
+            known = set(canonical_record_data(rdtype, v, zone)
+                        for v in old_values)
+            new_values = []
+            for value in values:
+                key = canonical_record_data(rdtype, value, zone)
+                if key not in known:
+                    known.add(key)
+                    new_values.append(value)
+            if new_values:
+                update[attr] = old_values + new_values
+        if update:
+            ldap.update_entry(dn, update)
+
+    def execute(self, *keys, **options):
+        """
+        The records of every name are added as a single entry, all entries
+        are added at once. The records of a name which already exists are
+        added to its entry.
+        """
+        ldap = self.obj.backend
+        zone = keys[-1]
+        dn = self.obj.get_dn(*keys, **options)
+        try:
+            ldap.get_entry(dn, ['objectclass'])
+        except errors.NotFound:
+            self.obj.handle_not_found(*keys)
+
+        failed = []
+        groups = self._group_records(
+            zone, options.get('records') or (), failed,
+            force=options.get('force', False))
+
+        dnsrecord = self.api.Object.dnsrecord
+        existing = []
+        with ldap.multiplexer() as mux:
+            for (name, (ttl, entry_attrs)) in groups.iteritems():
+                if name == _dns_zone_record:
+                    existing.append(name)
+                    continue
+                entry = ldap.make_entry(
+                    dnsrecord.get_dn(zone, name), entry_attrs,
+                    objectclass=dnsrecord.object_class, idnsname=[name])
+                if ttl is not None:
+                    entry['dnsttl'] = [ttl]
+                mux.add(entry, tag=name)
+            for op in mux.iter_completed():
+                if isinstance(op.error, errors.DuplicateEntry):
+                    existing.append(op.tag)
+                elif op.error is not None:
+                    self._fail(failed, op.tag, groups[op.tag][1], op.error)
+                    del groups[op.tag]
+
+        for name in existing:
+            (ttl, entry_attrs) = groups[name]
+            try:
+                self._merge_records(ldap, zone, name, ttl, entry_attrs)
+            except errors.PublicError, e:
+                self._fail(failed, name, entry_attrs, e)
+                del groups[name]
+
+        count = sum(len(values) for (ttl, entry_attrs) in groups.itervalues()
+                    for values in entry_attrs.itervalues())
+        return dict(count=count, failed=failed, value=zone)
+
+api.register(dnszone_import)
+
+class dnszone_export(LDAPQuery):
+    __doc__ = _('Export the DNS resource records of a zone to a zone file.')
+
+    takes_options = LDAPQuery.takes_options + (
+        Str('out?',
+            label=_('Output filename'),
+            doc=_('File to store the zone file in'),
+            exclude='webui',
+        ),
+        Int('start?',
+            doc=_('Index of the first record name exported'),
+            flags=['no_option'],
+            minvalue=0,
+            autofill=False,
+        ),
+        Int('sizelimit?',
+            doc=_('Maximum number of record names exported'),
+            flags=['no_option'],
+            minvalue=1,
+            autofill=False,
+        ),
+    )
+
+    has_output = (
+        output.summary,
+        output.Output('result', unicode, _('Zone file')),
+        output.Output('count', int, _('Number of record names exported')),
+        output.Output('truncated', bool,
+                      _('True if not all record names were exported')),
+        output.value,
+    )
+
+    _soa_attributes = ('idnssoamname', 'idnssoarname', 'idnssoaserial',
+                       'idnssoarefresh', 'idnssoaretry', 'idnssoaexpire',
+                       'idnssoaminimum')
+
+    # Maximum number of record names exported by one call
+    page_size = 1000
+
+    def _format_entry(self, name, entry):
+        ttl = entry.get('dnsttl', [None])[0]
+        for attr in _record_attributes:
+            rdtype = self.api.Object.dnsrecord.attr_to_cli(attr)
+            for value in entry.get(attr, []):
+                yield format_record(name, ttl, rdtype, value)
+
+    def _find_names(self, ldap, dn, start, size):
+        """
+        Return the record names of the zone from index start on, at most
+        size of them, and whether there are more names.
+        """
+        names = []
+        entries = ldap.iter_entries(
+            '(objectclass=idnsrecord)', ['idnsname'], dn,
+            scope=ldap.SCOPE_ONELEVEL, paged_search=True)
+        try:
+            for (i, entry) in enumerate(entries):
+                if i >= start + size:
+                    return (names, True)
+                if i >= start:
+                    names.append(entry['idnsname'][0])
+        except errors.NotFound:
+            pass
+        finally:
+            # abandon the search if the page ends before it does
+            entries.close()
+        return (names, False)
+
+    def execute(self, *keys, **options):
+        """
+        The zone file is exported page by page, one call returns the
+        records of at most page_size names starting with the name at index
+        start. The names are found with a search for the names only, the
+        records of the page with a second search.
+        """
+        ldap = self.obj.backend
+        zone = keys[-1]
+        dn = self.obj.get_dn(*keys, **options)
+        attrs_list = ['idnsname', 'dnsttl'] + _record_attributes
+        start = options.get('start') or 0
+        size = min(options.get('sizelimit') or self.page_size, self.page_size)
+        try:
+            zone_entry = ldap.get_entry(
+                dn, attrs_list + list(self._soa_attributes))
+        except errors.NotFound:
+            self.obj.handle_not_found(*keys)
+
+        lines = []
+        if not start:
+            lines.append(u'$ORIGIN %s' % normalize_zone(zone))
+            soa = u' '.join(unicode(zone_entry.get(attr, [u''])[0])
+                            for attr in self._soa_attributes)
+            lines.append(format_record(
+                _dns_zone_record, zone_entry.get('dnsttl', [None])[0],
+                u'SOA', soa))
+            lines.extend(self._format_entry(_dns_zone_record, zone_entry))
+
+        (names, truncated) = self._find_names(ldap, dn, start, size)
+        if names:
+            filter = ldap.make_filter_from_attr('idnsname', names,
+                                                rules=ldap.MATCH_ANY)
+            entries = {}
+            try:
+                for entry in ldap.iter_entries(
+                        filter, attrs_list, dn, scope=ldap.SCOPE_ONELEVEL,
+                        paged_search=True):
+                    entries[entry['idnsname'][0].lower()] = entry
+            except errors.NotFound:
+                pass
+            for name in names:
+                entry = entries.get(name.lower())
+                if entry is not None:
+                    lines.extend(self._format_entry(name, entry))
+
+        lines.append(u'')
+        return dict(result=u'\n'.join(lines), count=len(names),
+                    truncated=truncated, value=zone)
+
+    def forward(self, *keys, **options):
+        """
+        Request the zone file page by page. With --out every page is
+        appended to the file as it is received, otherwise the pages are
+        joined.
+        """
+        out = options.get('out')
+        if out is not None:
+            check_writable_file(out)
+            f = open(out, 'w')
+        pages = []
+        count = 0
+        try:
+            while True:
+                options['start'] = count
+                options['sizelimit'] = self.page_size
+                result = super(dnszone_export, self).forward(*keys, **options)
+                if out is not None:
+                    f.write(result['result'].encode('utf-8'))
+                else:
+                    pages.append(result['result'])
+                count += result['count']
+                if not result['truncated'] or not result['count']:
+                    break
+        finally:
+            if out is not None:
+                f.close()
+
+        result.update(result=u''.join(pages), count=count, truncated=False)
+        return result
+
+    def output_for_cli(self, textui, output, *keys, **options):
+        if not options.get('out'):
+            textui.print_plain(output['result'].rstrip(u'\n'))
+
+api.register(dnszone_export)
+
 class dnsrecord(LDAPObject):
     """
     DNS record.
@@ -17,8 +17,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import threading
+from collections import OrderedDict
+
 from ipalib import api, errors, output, util
 from ipalib import Command, Str, Flag, Int, DeprecatedParam
+from ipalib.request import context
 from types import NoneType
 from ipalib.cli import to_cli
 from ipalib import _, ngettext
@@ -135,6 +139,22 @@ EXAMPLES:
       Not matched rules: new-rule
       Matched rules: allow_all
 
+ hbactest-matrix takes lists of users, hosts and services and tests every
+ combination of them in one call, with the same options for the rules to
+ test. The rules are fetched and every user, host and service is looked up
+ only once.
+
+    8. Test two users against two services on a host:
+    $ ipa hbactest-matrix --users=a1a,b2b --hosts=bar --services=sshd,ftp \\
+          --nodetail
+    ----------------------------------
+    Access granted for 2 of 4 requests
+    ----------------------------------
+    a1a@bar (sshd): True
+    a1a@bar (ftp): False
+    b2b@bar (sshd): True
+    b2b@bar (ftp): False
+
 
 HBACTEST AND TRUSTED DOMAINS
 
@@ -237,6 +257,124 @@ def convert_to_ipa_rule(rule):
     return ipa_rule
 
 
+class HBACRuleIndex(object):
+    """
+    Snapshot of HBAC rules converted to pyhbac rules and indexed by the
+    names and groups of the users, hosts and services they apply to.
+
+    Rules which apply to all users, hosts or services, as well as incomplete
+    rules (which fail to evaluate), are candidates for every request.
+    """
+
+    elements = (
+        ('user', 'memberuser', 'user', 'group'),
+        ('host', 'memberhost', 'host', 'hostgroup'),
+        ('service', 'memberservice', 'hbacsvc', 'hbacsvcgroup'),
+    )
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.ipa_rules = [convert_to_ipa_rule(rule) for rule in rules]
+        self.positions = dict(
+            (rule['cn'][0], i) for (i, rule) in enumerate(rules))
+        self._index = {}
+        for (element, member_attr, name_obj, group_obj) in self.elements:
+            always = set()
+            keys = {}
+            for (i, rule) in enumerate(rules):
+                category = '%scategory' % element
+                names = rule.get('%s_%s' % (member_attr, name_obj), [])
+                groups = rule.get('%s_%s' % (member_attr, group_obj), [])
+                if ((category in rule and rule[category][0] == u'all') or
+                        not (names or groups)):
+                    always.add(i)
+                    continue
+                for name in names:
+                    keys.setdefault(('name', name), set()).add(i)
+                for group in groups:
+                    keys.setdefault(('group', group), set()).add(i)
+            self._index[element] = (always, keys)
+
+    def candidates(self, **elements):
+        """
+        Return the set of positions of the rules which may match a request.
+
+        elements maps 'user', 'host' and 'service' to (name, groups) of
+        the request. Elements which are not set in the request are not
+        used to rule out rules.
+        """
+        result = None
+        for (element, member_attr, name_obj, group_obj) in self.elements:
+            value = elements.get(element)
+            if value is None:
+                continue
+            (name, groups) = value
+            (always, keys) = self._index[element]
+            positions = set(always)
+            positions.update(keys.get(('name', name), ()))
+            for group in groups:
+                positions.update(keys.get(('group', group), ()))
+            if result is None:
+                result = positions
+            else:
+                result &= positions
+        if result is None:
+            return set(xrange(len(self.rules)))
+        return result
+
+
+class HBACRuleCache(object):
+    """
+    Per-process cache of HBAC rule snapshots.
+
+    A snapshot is used as long as the entryUSNs of the HBAC rules it was
+    built from did not change, which only needs a search returning the
+    entryUSN of every rule.
+    """
+
+    def __init__(self, size=16):
+        self.size = size
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()
+        self._stats = dict(hits=0, misses=0)
+
+    def get(self, key, usn):
+        """
+        Return the snapshot stored for key with the given entryUSNs, None
+        if there is none.
+        """
+        with self._lock:
+            cached = self._snapshots.pop(key, None)
+            if cached is not None:
+                self._snapshots[key] = cached
+                if cached[0] == usn:
+                    self._stats['hits'] += 1
+                    return cached[1]
+            self._stats['misses'] += 1
+        return None
+
+    def store(self, key, usn, index):
+        with self._lock:
+            self._snapshots.pop(key, None)
+            self._snapshots[key] = (usn, index)
+            while len(self._snapshots) > self.size:
+                self._snapshots.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def statistics(self):
+        """
+        Return a dict with the numbers of snapshots used from the cache
+        (hits) and built from the rules fetched from the server (misses).
+        """
+        with self._lock:
+            return dict(self._stats)
+
+rule_cache = HBACRuleCache()
+
+
 class hbactest(Command):
     __doc__ = _('Simulate use of Host-based access controls')
 
@@ -298,13 +436,55 @@ class hbactest(Command):
             return u'%s.%s' % (host, self.env.domain)
         return host
 
-    def execute(self, *args, **options):
-        # First receive all needed information:
-        # 1. HBAC rules (whether enabled or disabled)
-        # 2. Required options are (user, target host, service)
-        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
-        rules = []
+    def _get_rules_usn(self):
+        """
+        Return the entryUSNs of all HBAC rules as a tuple of (DN, entryUSN)
+        pairs, None if they are not all known.
+        """
+        ldap = self.api.Backend.ldap2
+        try:
+            (entries, truncated) = ldap.find_entries(
+                '(objectclass=ipahbacrule)', ['entryusn'],
+                DN(api.env.container_hbac, api.env.basedn),
+                size_limit=0, paged_search=True)
+        except errors.NotFound:
+            return ()
+        if truncated:
+            return None
+        usn = []
+        for entry in entries:
+            if 'entryusn' not in entry:
+                return None
+            usn.append((str(entry.dn), entry.raw['entryusn'][0]))
+        return tuple(sorted(usn))
+
+    def get_rule_index(self, sizelimit=None):
+        """
+        Return a HBACRuleIndex of the rules returned by hbacrule_find.
 
+        The snapshot is shared by all requests of the same principal and
+        sizelimit in this process until an HBAC rule changes.
+        """
+        key = (getattr(context, 'principal', None), sizelimit)
+        usn = self._get_rules_usn()
+        if usn is not None:
+            index = rule_cache.get(key, usn)
+            if index is not None:
+                return index
+        rules = self.api.Command.hbacrule_find(sizelimit=sizelimit)['result']
+        index = HBACRuleIndex(rules)
+        if usn is not None:
+            rule_cache.store(key, usn, index)
+        return index
+
+    def select_rules(self, index, options):
+        """
+        Return (rules, unresolved) for the rule selection in options.
+
+        rules is a list of (position, ipa_rule) pairs, position is the
+        position of the rule in index or None if the rule is not in it.
+        unresolved lists names in --rules which do not exist.
+        """
         # Use all enabled IPA rules by default
         all_enabled = True
         all_disabled = False
@@ -317,10 +497,6 @@ class hbactest(Command):
             all_enabled = False
             all_disabled = False
 
-        sizelimit = None
-        if 'sizelimit' in options:
-            sizelimit = int(options['sizelimit'])
-
         # Check if --disabled is specified, include all disabled IPA rules
         if options['disabled']:
             all_disabled = True
@@ -332,11 +508,16 @@ class hbactest(Command):
 
         hbacset = []
         if len(testrules) == 0:
-            hbacset = self.api.Command.hbacrule_find(sizelimit=sizelimit)['result']
+            hbacset = list(enumerate(index.rules))
         else:
             for rule in testrules:
+                if rule in index.positions:
+                    position = index.positions[rule]
+                    hbacset.append((position, index.rules[position]))
+                    continue
                 try:
-                    hbacset.append(self.api.Command.hbacrule_show(rule)['result'])
+                    hbacset.append(
+                        (None, self.api.Command.hbacrule_show(rule)['result']))
                 except:
                     pass
 
@@ -344,112 +525,140 @@ class hbactest(Command):
         # --enabled will import all enabled rules (default)
         # --disabled will import all disabled rules
         # --rules will implicitly add the rules from a rule list
-        for rule in hbacset:
-            ipa_rule = convert_to_ipa_rule(rule)
+        # Rules of the snapshot are shared, convert them again to enable them
+        rules = []
+        for (position, rule) in hbacset:
+            if position is None:
+                ipa_rule = convert_to_ipa_rule(rule)
+            else:
+                ipa_rule = index.ipa_rules[position]
+            enable = False
             if ipa_rule.name in testrules:
-                ipa_rule.enabled = True
-                rules.append(ipa_rule)
+                enable = True
                 testrules.remove(ipa_rule.name)
             elif all_enabled and ipa_rule.enabled:
                 # Option --enabled forces to include all enabled IPA rules into test
-                rules.append(ipa_rule)
+                pass
             elif all_disabled and not ipa_rule.enabled:
                 # Option --disabled forces to include all disabled IPA rules into test
+                enable = True
+            else:
+                continue
+            if enable and not ipa_rule.enabled:
+                ipa_rule = convert_to_ipa_rule(rule)
                 ipa_rule.enabled = True
-                rules.append(ipa_rule)
+            rules.append((position, ipa_rule))
 
-        # Check if there are unresolved rules left
-        if len(testrules) > 0:
-            # Error, unresolved rules are left in --rules
-            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
-                    'error': testrules, 'matched': None, 'notmatched': None,
-                    'warning' : None, 'value' : False}
+        return (rules, testrules)
 
-        # Rules are converted to pyhbac format, build request and then test it
-        request = pyhbac.HbacRequest()
+    def _get_member_groups(self, obj_name, group_container, name):
+        """
+        Return names of the groups in group_container the obj_name entry
+        name is a direct or indirect member of.
+        """
+        ldap = self.api.Backend.ldap2
+        obj = self.api.Object[obj_name]
+        try:
+            entry = ldap.get_entry(
+                obj.get_dn(obj.primary_key.normalize(name)), ['memberof'])
+        except errors.NotFound:
+            return []
+        container = DN(group_container, api.env.basedn)
+        groups = set()
+        for group_dn in entry.get('memberof', []):
+            if group_dn.endswith(container) and len(group_dn) == len(container) + 1:
+                groups.add(group_dn[0].value)
+        return sorted(groups)
+
+    def get_user(self, user):
+        """
+        Return (name, groups) of user for the HBAC request.
+        """
+        # check first if this is not a trusted domain user
+        if _dcerpc_bindings_installed:
+            is_valid_sid = ipaserver.dcerpc.is_sid_valid(user)
+        else:
+            is_valid_sid = False
+        components = util.normalize_name(user)
+        if not (is_valid_sid or 'domain' in components or 'flatname' in components):
+            # a local user
+            return (user, self._get_member_groups(
+                'user', api.env.container_group, user))
+
+        # this is a trusted domain user
+        if not _dcerpc_bindings_installed:
+            raise errors.NotFound(reason=_(
+                'Cannot perform external member validation without '
+                'Samba 4 support installed. Make sure you have installed '
+                'server-trust-ad sub-package of IPA on the server'))
+        domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
+        if not domain_validator.is_configured():
+            raise errors.NotFound(reason=_(
+                'Cannot search in trusted domains without own domain configured. '
+                'Make sure you have run ipa-adtrust-install on the IPA server first'))
+        user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(user)
+
+        # Now search for all external groups that have this user or
+        # any of its groups in its external members. Found entires
+        # memberOf links will be then used to gather all groups where
+        # this group is assigned, including the nested ones
+        filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
+                % ")(ipaExternalMember=".join(group_sids + [user_sid])
+
+        ldap = self.api.Backend.ldap2
+        group_container = DN(api.env.container_group, api.env.basedn)
+        try:
+            entries, truncated = ldap.find_entries(filter_sids, ['cn'], group_container)
+        except errors.NotFound:
+            return (user_sid, [])
+        groups = []
+        for dn, entry in entries:
+            if dn.endswith(group_container):
+                groups.append(dn[0][0].value)
+        return (user_sid, sorted(set(groups)))
+
+    def get_host(self, host):
+        """
+        Return (name, groups) of the target host for the HBAC request.
+        """
+        host = self.canonicalize(host)
+        return (host, self._get_member_groups(
+            'host', api.env.container_hostgroup, host))
 
-        if options['user'] != u'all':
-            # check first if this is not a trusted domain user
-            if _dcerpc_bindings_installed:
-                is_valid_sid = ipaserver.dcerpc.is_sid_valid(options['user'])
-            else:
-                is_valid_sid = False
-            components = util.normalize_name(options['user'])
-            if is_valid_sid or 'domain' in components or 'flatname' in components:
-                # this is a trusted domain user
-                if not _dcerpc_bindings_installed:
-                    raise errors.NotFound(reason=_(
-                        'Cannot perform external member validation without '
-                        'Samba 4 support installed. Make sure you have installed '
-                        'server-trust-ad sub-package of IPA on the server'))
-                domain_validator = ipaserver.dcerpc.DomainValidator(self.api)
-                if not domain_validator.is_configured():
-                    raise errors.NotFound(reason=_(
-                        'Cannot search in trusted domains without own domain configured. '
-                        'Make sure you have run ipa-adtrust-install on the IPA server first'))
-                user_sid, group_sids = domain_validator.get_trusted_domain_user_and_groups(options['user'])
-                request.user.name = user_sid
-
-                # Now search for all external groups that have this user or
-                # any of its groups in its external members. Found entires
-                # memberOf links will be then used to gather all groups where
-                # this group is assigned, including the nested ones
-                filter_sids = "(&(objectclass=ipaexternalgroup)(|(ipaExternalMember=%s)))" \
-                        % ")(ipaExternalMember=".join(group_sids + [user_sid])
-
-                ldap = self.api.Backend.ldap2
-                group_container = DN(api.env.container_group, api.env.basedn)
-                try:
-                    entries, truncated = ldap.find_entries(filter_sids, ['cn'], group_container)
-                except errors.NotFound:
-                    request.user.groups = []
-                else:
-                    groups = []
-                    for dn, entry in entries:
-                        if dn.endswith(group_container):
-                            groups.append(dn[0][0].value)
-                    request.user.groups = sorted(set(groups))
-            else:
-                # try searching for a local user
-                try:
-                    request.user.name = options['user']
-                    search_result = self.api.Command.user_show(request.user.name)['result']
-                    groups = search_result['memberof_group']
-                    if 'memberofindirect_group' in search_result:
-                        groups += search_result['memberofindirect_group']
-                    request.user.groups = sorted(set(groups))
-                except:
-                    pass
+    def get_service(self, service):
+        """
+        Return (name, groups) of service for the HBAC request.
+        """
+        return (service, self._get_member_groups(
+            'hbacsvc', api.env.container_hbacservicegroup, service))
 
-        if options['service'] != u'all':
-            try:
-                request.service.name = options['service']
-                service_result = self.api.Command.hbacsvc_show(request.service.name)['result']
-                if 'memberof_hbacsvcgroup' in service_result:
-                    request.service.groups = service_result['memberof_hbacsvcgroup']
-            except:
-                pass
+    def evaluate(self, index, rules, elements, nodetail):
+        """
+        Evaluate rules (see select_rules) for the request described by
+        elements (see HBACRuleIndex.candidates).
 
-        if options['targethost'] != u'all':
-            try:
-                request.targethost.name = self.canonicalize(options['targethost'])
-                tgthost_result = self.api.Command.host_show(request.targethost.name)['result']
-                groups = tgthost_result['memberof_hostgroup']
-                if 'memberofindirect_hostgroup' in tgthost_result:
-                    groups += tgthost_result['memberofindirect_hostgroup']
-                request.targethost.groups = sorted(set(groups))
-            except:
-                pass
+        Return (access_granted, matched, notmatched, error). Rules of index
+        which cannot match the request are not evaluated by pyhbac.
+        """
+        request = pyhbac.HbacRequest()
+        for (element, request_element) in (('user', request.user),
+                                           ('host', request.targethost),
+                                           ('service', request.service)):
+            if elements.get(element) is not None:
+                (request_element.name, request_element.groups) = \
+                    elements[element]
+        candidates = index.candidates(**elements)
 
         matched_rules = []
         notmatched_rules = []
         error_rules = []
-        warning_rules = []
 
-        result = {'warning':None, 'matched':None, 'notmatched':None, 'error':None}
-        if not options['nodetail']:
+        if not nodetail:
             # Validate runs rules one-by-one and reports failed ones
-            for ipa_rule in rules:
+            for (position, ipa_rule) in rules:
+                if position is not None and position not in candidates:
+                    notmatched_rules.append(ipa_rule.name)
+                    continue
                 try:
                     res = request.evaluate([ipa_rule])
                     if res == pyhbac.HBAC_EVAL_ALLOW:
@@ -466,9 +675,61 @@ class hbactest(Command):
 
             access_granted = len(matched_rules) > 0
         else:
-            res = request.evaluate(rules)
+            res = request.evaluate(
+                [ipa_rule for (position, ipa_rule) in rules
+                 if position is None or position in candidates])
             access_granted = (res == pyhbac.HBAC_EVAL_ALLOW)
 
+        return (access_granted, matched_rules, notmatched_rules, error_rules)
+
+    def get_elements(self, user, targethost, service, resolved=None):
+        """
+        Return the request elements for user, targethost and service.
+
+        resolved is a dict caching the elements already looked up.
+        """
+        if resolved is None:
+            resolved = {}
+        elements = {}
+        for (element, value, get_element) in (
+                ('user', user, self.get_user),
+                ('host', targethost, self.get_host),
+                ('service', service, self.get_service)):
+            if value == u'all':
+                continue
+            key = (element, value)
+            if key not in resolved:
+                resolved[key] = get_element(value)
+            elements[element] = resolved[key]
+        return elements
+
+    def execute(self, *args, **options):
+        # First receive all needed information:
+        # 1. HBAC rules (whether enabled or disabled)
+        # 2. Required options are (user, target host, service)
+        # 3. Options: rules to test (--rules, --enabled, --disabled), request for detail output
+        sizelimit = None
+        if 'sizelimit' in options:
+            sizelimit = int(options['sizelimit'])
+
+        index = self.get_rule_index(sizelimit)
+        (rules, testrules) = self.select_rules(index, options)
+
+        # Check if there are unresolved rules left
+        if len(testrules) > 0:
+            # Error, unresolved rules are left in --rules
+            return {'summary' : unicode(_(u'Unresolved rules in --rules')),
+                    'error': testrules, 'matched': None, 'notmatched': None,
+                    'warning' : None, 'value' : False}
+
+        # Rules are converted to pyhbac format, build request and then test it
+        elements = self.get_elements(
+            options['user'], options['targethost'], options['service'])
+        (access_granted, matched_rules, notmatched_rules, error_rules) = \
+            self.evaluate(index, rules, elements, options['nodetail'])
+        warning_rules = []
+
+        result = {'warning':None, 'matched':None, 'notmatched':None, 'error':None}
         result['summary'] = _('Access granted: %s') % (access_granted)
 
 
@@ -509,3 +770,117 @@ class hbactest(Command):
         return int(not output['value'])
 
 api.register(hbactest)
+
+
+class hbactest_matrix(hbactest):
+    __doc__ = _('Simulate use of Host-based access controls for many requests')
+
+    has_output = (
+        output.summary,
+        output.Output('result', (list, tuple), _('Results')),
+        output.Output('error', (list, tuple, NoneType), _('Non-existent or invalid rules')),
+        output.Output('value', int, _('Number of requests granted'), ['no_display']),
+    )
+
+    takes_options = (
+        Str('user+',
+            cli_name='users',
+            label=_('User names'),
+            csv=True,
+        ),
+        Str('targethost+',
+            cli_name='hosts',
+            label=_('Target hosts'),
+            csv=True,
+        ),
+        Str('service+',
+            cli_name='services',
+            label=_('Services'),
+            csv=True,
+        ),
+        Str('rules*',
+             cli_name='rules',
+             label=_('Rules to test. If not specified, --enabled is assumed'),
+             csv=True,
+        ),
+        Flag('nodetail?',
+             cli_name='nodetail',
+             label=_('Hide details which rules are matched, not matched, or invalid'),
+        ),
+        Flag('enabled?',
+             cli_name='enabled',
+             label=_('Include all enabled IPA rules into test [default]'),
+        ),
+        Flag('disabled?',
+             cli_name='disabled',
+             label=_('Include all disabled IPA rules into test'),
+        ),
+        Int('sizelimit?',
+            label=_('Size Limit'),
+            doc=_('Maximum number of rules to process when no --rules is specified'),
+            flags=['no_display'],
+            minvalue=0,
+            autofill=False,
+        ),
+    )
+
+    def execute(self, *args, **options):
+        sizelimit = None
+        if 'sizelimit' in options:
+            sizelimit = int(options['sizelimit'])
+
+        # The rules are selected and the users, hosts and services are
+        # looked up only once for all requests
+        index = self.get_rule_index(sizelimit)
+        (rules, testrules) = self.select_rules(index, options)
+        if len(testrules) > 0:
+            return dict(summary=unicode(_(u'Unresolved rules in --rules')),
+                        result=[], error=testrules, value=0)
+
+        results = []
+        resolved = {}
+        for user in options['user']:
+            for targethost in options['targethost']:
+                for service in options['service']:
+                    elements = self.get_elements(
+                        user, targethost, service, resolved)
+                    (access_granted, matched_rules, notmatched_rules,
+                        error_rules) = self.evaluate(
+                            index, rules, elements, options['nodetail'])
+                    result = dict(user=user, targethost=targethost,
+                                  service=service, value=access_granted)
+                    if not options['nodetail']:
+                        result['matched'] = matched_rules
+                        result['notmatched'] = notmatched_rules
+                        result['error'] = error_rules
+                    results.append(result)
+
+        granted = len([result for result in results if result['value']])
+        summary = _('Access granted for %(granted)d of %(count)d requests') % \
+            dict(granted=granted, count=len(results))
+        return dict(summary=unicode(summary), result=results, error=None,
+                    value=granted)
+
+    def output_for_cli(self, textui, output, *args, **options):
+        labels = dict(
+            matched=_('Matched rules'),
+            notmatched=_('Not matched rules'),
+            error=_('Non-existent or invalid rules'),
+        )
+        textui.print_summary(output['summary'])
+        if output['error']:
+            textui.print_attribute(
+                unicode(labels['error']), output['error'], '%s: %s', 1, True)
+        for result in output['result']:
+            textui.print_plain('%s@%s (%s): %s' % (
+                result['user'], result['targethost'], result['service'],
+                result['value']))
+            for key in ('matched', 'notmatched', 'error'):
+                if result.get(key):
+                    textui.print_attribute(
+                        unicode(labels[key]), result[key], '%s: %s', 2, True)
+
+        # Propagate integer value for result, 0 if all requests were granted
+        return int(output['value'] < len(output['result']))
+
+api.register(hbactest_matrix)
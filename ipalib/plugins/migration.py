@@ -18,6 +18,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import os
+import hashlib
+import collections
+
+import ldap as _ldap
 
 from ipalib import api, errors, output
 from ipalib import Command, Password, Str, Flag, StrEnum, DNParam, File
@@ -32,6 +37,7 @@ from ipalib import _
 from ipapython.dn import DN
 from ipapython.ipautil import write_tmp_file
 import datetime
+import json
 
 __doc__ = _("""
 Migration to IPA
@@ -50,6 +56,11 @@ The default group container is ou=Groups.
 
 Users and groups that already exist on the IPA server are skipped.
 
+The progress of the migration is recorded in the migration directory of
+~/.ipa of the user the IPA server runs as. If a migration is interrupted,
+running it again with the same LDAP URI, containers, object classes and
+schema skips the users and groups it already migrated.
+
 Two LDAP schemas define how group members are stored: RFC2307 and
 RFC2307bis. RFC2307bis uses member and uniquemember to specify group
 members, RFC2307 uses memberUid. The default schema is RFC2307bis.
@@ -138,6 +149,12 @@ _supported_schemas = (u'RFC2307bis', u'RFC2307')
 
 _compat_dn = DN(('cn', 'Schema Compatibility'), ('cn', 'plugins'), ('cn', 'config'))
 
+# Number of migrated users added to the default group at once
+_def_group_batch_size = 100
+
+# Directory of the checkpoints of interrupted migrations
+MIGRATION_STATE_DIR = '/var/lib/ipa/migration'
+
 def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs):
     assert isinstance(dn, DN)
     attr_blacklist = ['krbprincipalkey','memberofindirect','memberindirect']
@@ -266,7 +283,10 @@ def _pre_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx, **kwargs
 def _post_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx):
     assert isinstance(dn, DN)
 
-    _update_default_group(ldap, pkey, config, ctx, False)
+    new_members = ctx.setdefault('def_group_new_members', [])
+    new_members.append(dn)
+    if len(new_members) >= _def_group_batch_size:
+        _flush_default_group(ldap, ctx)
 
     if 'description' in entry_attrs and NO_UPG_MAGIC in entry_attrs['description']:
         entry_attrs['description'].remove(NO_UPG_MAGIC)
@@ -276,40 +296,72 @@ def _post_migrate_user(ldap, pkey, dn, entry_attrs, failed, config, ctx):
         except (errors.EmptyModlist, errors.NotFound):
             pass
 
-def _update_default_group(ldap, pkey, config, ctx, force):
-    migrate_cnt = ctx['migrate_cnt']
-    group_dn = ctx['def_group_dn']
-
-    # Purposely let this fire when migrate_cnt == 0 so on re-running migration
-    # it can catch any users migrated but not added to the default group.
-    if force or migrate_cnt % 100 == 0:
-        s = datetime.datetime.now()
-        searchfilter = "(&(objectclass=posixAccount)(!(memberof=%s)))" % group_dn
-        try:
-            (result, truncated) = ldap.find_entries(searchfilter,
-                [''], api.env.container_user, scope=ldap.SCOPE_SUBTREE,
-                time_limit = -1)
-        except errors.NotFound:
-            return
-        new_members = []
-        (group_dn, group_entry_attrs) = ldap.get_entry(group_dn, ['member'])
-        for m in result:
-            if m[0] not in group_entry_attrs.get('member', []):
-                new_members.append(m[0])
-        if len(new_members) > 0:
-            members = group_entry_attrs.get('member', [])
-            members.extend(new_members)
-            group_entry_attrs['member'] = members
+def _add_default_group_members(ldap, group_dn, members):
+    """
+    Add members to the default group with a single MOD_ADD. If some of
+    them are members already, add them one by one.
 
+    Return the number of users added.
+    """
+    s = datetime.datetime.now()
+    not_added = []
+    try:
+        with ldap.error_handler():
+            ldap.conn.modify_s(group_dn, [(_ldap.MOD_ADD, 'member', members)])
+    except errors.DatabaseError:
+        for member in members:
             try:
-                ldap.update_entry(group_dn, group_entry_attrs)
-            except errors.EmptyModlist:
-                pass
+                with ldap.error_handler():
+                    ldap.conn.modify_s(
+                        group_dn, [(_ldap.MOD_ADD, 'member', [member])])
+            except errors.DatabaseError, e:
+                api.log.debug('%s: not added to group %s: %s' %
+                              (member, group_dn, e))
+                not_added.append(member)
+    if not_added:
+        api.log.warn('%d users were not added to group %s, most likely '
+                     'they are members already: %s' %
+                     (len(not_added), group_dn,
+                      ', '.join(str(member) for member in not_added)))
+    added = len(members) - len(not_added)
+    d = datetime.datetime.now() - s
+    api.log.debug('Adding %d users to group duration %s' % (added, d))
+    return added
+
+def _flush_default_group(ldap, ctx):
+    """
+    Add the users migrated since the last flush to the default group.
+    """
+    new_members = ctx.get('def_group_new_members')
+    if new_members:
+        ctx['def_group_new_members'] = []
+        _add_default_group_members(ldap, ctx['def_group_dn'], new_members)
+
+def _update_default_group(ldap, ctx):
+    """
+    Add all users which are not members of the default group to it.
+
+    This catches users migrated by previous runs of the migration which
+    were not added to the default group. It searches all users, so it is
+    run once at the end of the migration.
+    """
+    _flush_default_group(ldap, ctx)
 
-        e = datetime.datetime.now()
-        d = e - s
-        mode = " (forced)" if force else ""
-        api.log.debug('Adding %d users to group%s duration %s' % (len(new_members), mode, d))
+    group_dn = ctx['def_group_dn']
+    s = datetime.datetime.now()
+    searchfilter = "(&(objectclass=posixAccount)(!(memberof=%s)))" % group_dn
+    # the group is modified once the search is complete, no other operation
+    # may be sent on the connection while the search is outstanding
+    new_members = [entry.dn for entry in ldap.iter_entries(searchfilter, [''],
+            DN(api.env.container_user, api.env.basedn),
+            scope=ldap.SCOPE_SUBTREE, time_limit=-1, size_limit=-1,
+            paged_search=True)]
+    for i in xrange(0, len(new_members), _def_group_batch_size):
+        _add_default_group_members(ldap, group_dn,
+                                   new_members[i:i + _def_group_batch_size])
+
+    d = datetime.datetime.now() - s
+    api.log.debug('Default group reconciliation (forced) duration %s' % d)
 
 # GROUP MIGRATION CALLBACKS AND VARS
 
@@ -423,6 +475,97 @@ def _group_exc_callback(ldap, dn, entry_attrs, exc, options):
 
     raise exc
 
+# MIGRATION CHECKPOINTS
+
+class MigrationCheckpoint(object):
+    """
+    Record of the objects migrated from a DS.
+
+    Every migrated object is appended to the checkpoint file as a JSON list
+    [OBJECT_NAME, PKEY]; [OBJECT_NAME] marks all objects of the type as
+    migrated. The file is removed when the migration is complete, so it
+    only exists for interrupted migrations. If the file can't be written,
+    a warning is logged and the migration goes on without a checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.migrated = {} # {'OBJ': set(['PKEY1', 'PKEY2', ...]), ...}
+        self.completed = set()
+        self._file = None
+
+    def open(self):
+        """
+        Load the objects recorded so far and open the file for appending.
+        """
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # incomplete last line of an interrupted migration
+                        continue
+                    if len(record) == 2:
+                        self.migrated.setdefault(record[0], set()).add(record[1])
+                    else:
+                        self.completed.add(record[0])
+        except IOError:
+            pass
+
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, 0700)
+        self._file = open(self.path, 'a')
+
+    def _write_error(self, e):
+        api.log.warning('Unable to write migration checkpoint %s, the '
+                        'migration can not be resumed: %s', self.path, e)
+        f = self._file
+        self._file = None
+        try:
+            f.close()
+        except IOError:
+            pass
+
+    def _write(self, record):
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record) + '\n')
+        except IOError, e:
+            self._write_error(e)
+
+    def record(self, ldap_obj_name, pkey):
+        self._write([ldap_obj_name, pkey])
+
+    def complete(self, ldap_obj_name):
+        self.completed.add(ldap_obj_name)
+        self._write([ldap_obj_name])
+        self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+        except IOError, e:
+            self._write_error(e)
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except IOError, e:
+                self._write_error(e)
+            self._file = None
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
 # DS MIGRATION PLUGIN
 
 def construct_filter(template, oc_list):
@@ -481,6 +624,9 @@ class migrate_ds(Command):
     }
     migrate_order = ('user', 'group')
 
+    # Number of add operations sent to IPA before their results are read
+    max_outstanding_adds = 32
+
     takes_args = (
         Str('ldapuri', validate_ldapuri,
             cli_name='ldap_uri',
@@ -685,166 +831,238 @@ can use their Kerberos accounts.''')
             search_bases[ldap_obj_name] = search_base
         return search_bases
 
-    def migrate(self, ldap, config, ds_ldap, ds_base_dn, options):
+    def _get_checkpoint(self, ds_ldap, search_bases, options):
+        """
+        Return the checkpoint of a migration from the same source.
+        """
+        key = [ds_ldap.ldap_uri, options.get('schema')]
+        for ldap_obj_name in self.migrate_order:
+            key.append(str(search_bases[ldap_obj_name]))
+            key.extend(options[to_cli(
+                self.migrate_objects[ldap_obj_name]['oc_option'])])
+        name = hashlib.sha1(repr(key)).hexdigest()
+        return MigrationCheckpoint(
+            os.path.join(MIGRATION_STATE_DIR, name))
+
+    def migrate(self, ldap, config, ds_ldap, lookup_ldap, ds_base_dn, options):
         """
         Migrate objects from DS to LDAP.
+
+        The objects of each type are streamed from a paged search of
+        ds_ldap, prepared by the pre_callback and added asynchronously with
+        at most max_outstanding_adds add operations in flight. The
+        pre_callback looks up other DS entries using lookup_ldap, a second
+        connection to the DS, as no other operation may be interleaved with
+        the search. Migrated objects are recorded in a
+        `MigrationCheckpoint`, a migration which was interrupted skips them
+        when it is run again.
         """
         assert isinstance(ds_base_dn, DN)
         migrated = {} # {'OBJ': ['PKEY1', 'PKEY2', ...], ...}
         failed = {} # {'OBJ': {'PKEY1': 'Failed 'cos blabla', ...}, ...}
         search_bases = self._get_search_bases(options, ds_base_dn, self.migrate_order)
         migration_start = datetime.datetime.now()
-        for ldap_obj_name in self.migrate_order:
-            ldap_obj = self.api.Object[ldap_obj_name]
 
-            template = self.migrate_objects[ldap_obj_name]['filter_template']
-            oc_list = options[to_cli(self.migrate_objects[ldap_obj_name]['oc_option'])]
-            search_filter = construct_filter(template, oc_list)
+        checkpoint = self._get_checkpoint(ds_ldap, search_bases, options)
+        if checkpoint is not None:
+            try:
+                checkpoint.open()
+            except (IOError, OSError), e:
+                self.log.warning('Unable to store migration checkpoint %s, '
+                                 'the migration can not be resumed: %s',
+                                 checkpoint.path, e)
+                checkpoint = None
+            else:
+                if checkpoint.migrated:
+                    self.log.info('Resuming migration from checkpoint %s',
+                                  checkpoint.path)
 
-            exclude = options['exclude_%ss' % to_cli(ldap_obj_name)]
-            context = dict(ds_ldap = ds_ldap)
+        context = {}
+        try:
+            for ldap_obj_name in self.migrate_order:
+                ldap_obj = self.api.Object[ldap_obj_name]
 
-            migrated[ldap_obj_name] = []
-            failed[ldap_obj_name] = {}
+                template = self.migrate_objects[ldap_obj_name]['filter_template']
+                oc_list = options[to_cli(self.migrate_objects[ldap_obj_name]['oc_option'])]
+                search_filter = construct_filter(template, oc_list)
 
-            try:
-                entries, truncated = ds_ldap.find_entries(
-                    search_filter, ['*'], search_bases[ldap_obj_name],
-                    ds_ldap.SCOPE_ONELEVEL,
-                    time_limit=0, size_limit=-1,
-                    search_refs=True    # migrated DS may contain search references
-                )
-            except errors.NotFound:
-                if not options.get('continue',False):
-                    raise errors.NotFound(
-                        reason=_('%(container)s LDAP search did not return any result '
-                                 '(search base: %(search_base)s, '
-                                 'objectclass: %(objectclass)s)')
-                                 % {'container': ldap_obj_name,
-                                    'search_base': search_bases[ldap_obj_name],
-                                    'objectclass': ', '.join(oc_list)}
-                    )
-                else:
-                    truncated = False
-                    entries = []
-            if truncated:
-                self.log.error(
-                    '%s: %s' % (
-                        ldap_obj.name, self.truncated_err_msg
-                    )
-                )
+                exclude = options['exclude_%ss' % to_cli(ldap_obj_name)]
+                context = dict(ds_ldap = lookup_ldap)
 
-            blacklists = {}
-            for blacklist in ('oc_blacklist', 'attr_blacklist'):
-                blacklist_option = self.migrate_objects[ldap_obj_name][blacklist+'_option']
-                if blacklist_option is not None:
-                    blacklists[blacklist] = options.get(blacklist_option, tuple())
-                else:
-                    blacklists[blacklist] = tuple()
+                migrated[ldap_obj_name] = []
+                failed[ldap_obj_name] = {}
 
-            # get default primary group for new users
-            if 'def_group_dn' not in context:
-                def_group = config.get('ipadefaultprimarygroup')
-                context['def_group_dn'] = api.Object.group.get_dn(def_group)
-                try:
-                    (g_dn, g_attrs) = ldap.get_entry(context['def_group_dn'], ['gidnumber', 'cn'])
-                except errors.NotFound:
-                    error_msg = _('Default group for new users not found')
-                    raise errors.NotFound(reason=error_msg)
-                if 'gidnumber' in g_attrs:
-                    context['def_group_gid'] = g_attrs['gidnumber'][0]
-
-            context['has_upg'] = ldap.has_upg()
-
-            valid_gids = []
-            invalid_gids = []
-            migrate_cnt = 0
-            context['migrate_cnt'] = 0
-            for (dn, entry_attrs) in entries:
-                context['migrate_cnt'] = migrate_cnt
-                s = datetime.datetime.now()
-                if dn is None:  # LDAP search reference
-                    failed[ldap_obj_name][entry_attrs[0]] = unicode(_ref_err_msg)
-                    continue
+                blacklists = {}
+                for blacklist in ('oc_blacklist', 'attr_blacklist'):
+                    blacklist_option = self.migrate_objects[ldap_obj_name][blacklist+'_option']
+                    if blacklist_option is not None:
+                        blacklists[blacklist] = options.get(blacklist_option, tuple())
+                    else:
+                        blacklists[blacklist] = tuple()
 
-                try:
-                    dn = DN(dn)
-                except ValueError:
-                    failed[ldap_obj_name][dn] = unicode(_dn_err_msg)
-                    continue
+                # get default primary group for new users
+                if 'def_group_dn' not in context:
+                    def_group = config.get('ipadefaultprimarygroup')
+                    context['def_group_dn'] = api.Object.group.get_dn(def_group)
+                    try:
+                        (g_dn, g_attrs) = ldap.get_entry(context['def_group_dn'], ['gidnumber', 'cn'])
+                    except errors.NotFound:
+                        error_msg = _('Default group for new users not found')
+                        raise errors.NotFound(reason=error_msg)
+                    if 'gidnumber' in g_attrs:
+                        context['def_group_gid'] = g_attrs['gidnumber'][0]
+
+                done = set()
+                if checkpoint is not None:
+                    done = checkpoint.migrated.get(ldap_obj_name, done)
+                    migrated[ldap_obj_name].extend(sorted(done))
+                    if ldap_obj_name in checkpoint.completed:
+                        continue
 
-                ava = dn[0][0]
-                if ava.attr == ldap_obj.primary_key.name:
-                    # In case if pkey attribute is in the migrated object DN
-                    # and the original LDAP is multivalued, make sure that
-                    # we pick the correct value (the unique one stored in DN)
-                    pkey = ava.value.lower()
-                else:
-                    pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
+                context['has_upg'] = ldap.has_upg()
 
-                if pkey in exclude:
-                    continue
+                valid_gids = []
+                invalid_gids = []
 
-                dn = ldap_obj.get_dn(pkey)
-                assert isinstance(dn, DN)
-                entry_attrs['objectclass'] = list(
-                    set(
-                        config.get(
-                            ldap_obj.object_class_config, ldap_obj.object_class
-                        ) + [o.lower() for o in entry_attrs['objectclass']]
-                    )
+                entries = ds_ldap.iter_entries(
+                    search_filter, ['*'], search_bases[ldap_obj_name],
+                    ds_ldap.SCOPE_ONELEVEL,
+                    time_limit=0, size_limit=-1,
+                    search_refs=True,   # migrated DS may contain search references
+                    paged_search=True
                 )
-                entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+                search = dict(found=False, truncated=False)
+                # (pkey, entry_attrs) of the entries given to
+                # iter_add_entries, its results come in the same order
+                prepared = collections.deque()
 
-                callback = self.migrate_objects[ldap_obj_name]['pre_callback']
-                if callable(callback):
+                def prepare_entries():
                     try:
-                        dn = callback(
-                            ldap, pkey, dn, entry_attrs, failed[ldap_obj_name],
-                            config, context, schema = options['schema'],
-                            search_bases = search_bases,
-                            valid_gids = valid_gids,
-                            invalid_gids = invalid_gids,
-                            **blacklists
-                        )
-                        assert isinstance(dn, DN)
-                        if not dn:
-                            continue
-                    except errors.NotFound, e:
-                        failed[ldap_obj_name][pkey] = unicode(e.reason)
-                        continue
-
-                try:
-                    ldap.add_entry(dn, entry_attrs)
-                except errors.ExecutionError, e:
-                    callback = self.migrate_objects[ldap_obj_name]['exc_callback']
-                    if callable(callback):
-                        try:
-                            callback(ldap, dn, entry_attrs, e, options)
-                        except errors.ExecutionError, e:
+                        for (dn, entry_attrs) in entries:
+                            search['found'] = True
+                            if dn is None:  # LDAP search reference
+                                failed[ldap_obj_name][entry_attrs[0]] = unicode(_ref_err_msg)
+                                continue
+
+                            try:
+                                dn = DN(dn)
+                            except ValueError:
+                                failed[ldap_obj_name][dn] = unicode(_dn_err_msg)
+                                continue
+
+                            ava = dn[0][0]
+                            if ava.attr == ldap_obj.primary_key.name:
+                                # In case if pkey attribute is in the migrated object DN
+                                # and the original LDAP is multivalued, make sure that
+                                # we pick the correct value (the unique one stored in DN)
+                                pkey = ava.value.lower()
+                            else:
+                                pkey = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                            if pkey in exclude or pkey in done:
+                                continue
+
+                            dn = ldap_obj.get_dn(pkey)
+                            assert isinstance(dn, DN)
+                            entry_attrs['objectclass'] = list(
+                                set(
+                                    config.get(
+                                        ldap_obj.object_class_config, ldap_obj.object_class
+                                    ) + [o.lower() for o in entry_attrs['objectclass']]
+                                )
+                            )
+                            entry_attrs[ldap_obj.primary_key.name][0] = entry_attrs[ldap_obj.primary_key.name][0].lower()
+
+                            callback = self.migrate_objects[ldap_obj_name]['pre_callback']
+                            if callable(callback):
+                                try:
+                                    dn = callback(
+                                        ldap, pkey, dn, entry_attrs, failed[ldap_obj_name],
+                                        config, context, schema = options['schema'],
+                                        search_bases = search_bases,
+                                        valid_gids = valid_gids,
+                                        invalid_gids = invalid_gids,
+                                        **blacklists
+                                    )
+                                    assert isinstance(dn, DN)
+                                    if not dn:
+                                        continue
+                                except errors.NotFound, e:
+                                    failed[ldap_obj_name][pkey] = unicode(e.reason)
+                                    continue
+
+                            prepared.append((pkey, entry_attrs))
+                            yield ldap.make_entry(dn, entry_attrs)
+                    except errors.LimitsExceeded:
+                        search['truncated'] = True
+
+                migrate_cnt = 0
+                results = ldap.iter_add_entries(
+                    prepare_entries(), max_outstanding=self.max_outstanding_adds)
+                for (entry, e) in results:
+                    (pkey, entry_attrs) = prepared.popleft()
+                    dn = entry.dn
+                    if e is not None:
+                        callback = self.migrate_objects[ldap_obj_name]['exc_callback']
+                        if callable(callback):
+                            try:
+                                callback(ldap, dn, entry_attrs, e, options)
+                            except errors.ExecutionError, e:
+                                failed[ldap_obj_name][pkey] = unicode(e)
+                                continue
+                        else:
                             failed[ldap_obj_name][pkey] = unicode(e)
                             continue
-                    else:
-                        failed[ldap_obj_name][pkey] = unicode(e)
-                        continue
 
-                migrated[ldap_obj_name].append(pkey)
+                    migrated[ldap_obj_name].append(pkey)
 
-                callback = self.migrate_objects[ldap_obj_name]['post_callback']
-                if callable(callback):
-                    callback(
-                        ldap, pkey, dn, entry_attrs, failed[ldap_obj_name],
-                        config, context,
+                    callback = self.migrate_objects[ldap_obj_name]['post_callback']
+                    if callable(callback):
+                        callback(
+                            ldap, pkey, dn, entry_attrs, failed[ldap_obj_name],
+                            config, context,
+                        )
+                    # Only an object the post_callback is done with is
+                    # skipped when the migration is resumed
+                    if checkpoint is not None:
+                        checkpoint.record(ldap_obj_name, pkey)
+                    total_dur = datetime.datetime.now() - migration_start
+                    migrate_cnt += 1
+                    if migrate_cnt > 0 and migrate_cnt % 100 == 0:
+                        api.log.info("%d %ss migrated. %s elapsed." % (migrate_cnt, ldap_obj_name, total_dur))
+                        if checkpoint is not None:
+                            checkpoint.flush()
+                    api.log.debug("%d %ss migrated (total %s)" % (migrate_cnt, ldap_obj_name, total_dur))
+
+                _flush_default_group(ldap, context)
+
+                if not search['found'] and not options.get('continue',False):
+                    raise errors.NotFound(
+                        reason=_('%(container)s LDAP search did not return any result '
+                                 '(search base: %(search_base)s, '
+                                 'objectclass: %(objectclass)s)')
+                                 % {'container': ldap_obj_name,
+                                    'search_base': search_bases[ldap_obj_name],
+                                    'objectclass': ', '.join(oc_list)}
                     )
-                e = datetime.datetime.now()
-                d = e - s
-                total_dur = e - migration_start
-                migrate_cnt += 1
-                if migrate_cnt > 0 and migrate_cnt % 100 == 0:
-                    api.log.info("%d %ss migrated. %s elapsed." % (migrate_cnt, ldap_obj_name, total_dur))
-                api.log.debug("%d %ss migrated, duration: %s (total %s)" % (migrate_cnt, ldap_obj_name, d, total_dur))
+                if search['truncated']:
+                    self.log.error(
+                        '%s: %s' % (
+                            ldap_obj.name, self.truncated_err_msg
+                        )
+                    )
+                elif checkpoint is not None:
+                    checkpoint.complete(ldap_obj_name)
+
+            if 'def_group_dn' in context:
+                _update_default_group(ldap, context)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
 
-        _update_default_group(ldap, pkey, config, context, True)
+        if checkpoint is not None and \
+                len(checkpoint.completed) == len(self.migrate_order):
+            checkpoint.remove()
 
         return (migrated, failed)
 
@@ -861,8 +1079,10 @@ can use their Kerberos accounts.''')
         if config.get('ipamigrationenabled', ('FALSE', ))[0] == 'FALSE':
             return dict(result={}, failed={}, enabled=False, compat=True)
 
-        # connect to DS
+        # connect to DS, the second connection is used for lookups while
+        # the entries are searched
         ds_ldap = ldap2(shared_instance=False, ldap_uri=ldapuri, base_dn='')
+        lookup_ldap = ldap2(shared_instance=False, ldap_uri=ldapuri, base_dn='')
 
         cacert = None
         if options.get('cacertfile') is not None:
@@ -871,12 +1091,14 @@ can use their Kerberos accounts.''')
             cacert = tmp_ca_cert_f.name
 
             #start TLS connection
-            ds_ldap.connect(bind_dn=options['binddn'], bind_pw=bindpw,
-                tls_cacertfile=cacert)
+            for conn in (ds_ldap, lookup_ldap):
+                conn.connect(bind_dn=options['binddn'], bind_pw=bindpw,
+                    tls_cacertfile=cacert)
 
             tmp_ca_cert_f.close()
         else:
-            ds_ldap.connect(bind_dn=options['binddn'], bind_pw=bindpw)
+            for conn in (ds_ldap, lookup_ldap):
+                conn.connect(bind_dn=options['binddn'], bind_pw=bindpw)
 
         #check whether the compat plugin is enabled
         if not options.get('compat'):
@@ -907,7 +1129,7 @@ can use their Kerberos accounts.''')
 
         # migrate!
         (migrated, failed) = self.migrate(
-            ldap, config, ds_ldap, ds_base_dn, options
+            ldap, config, ds_ldap, lookup_ldap, ds_base_dn, options
         )
 
         return dict(result=migrated, failed=failed, enabled=True, compat=True)
@@ -22,6 +22,9 @@ import errors
 import os
 import re
 import time
+import hashlib
+import collections
+import atexit
 from urllib2 import urlparse
 from text import _
 from ipapython.ipa_log_manager import *
@@ -778,6 +781,88 @@ class SessionManager(object):
         return session_id
 
 
+_missing = object()
+
+
+class SessionData(dict):
+    '''
+    Session data dict which remembers its content as it was read from
+    or written to the session cache, so that a session manager can tell
+    whether it needs to be written back.
+
+    When pickled, e.g. to be stored in memcached, it is reduced to a
+    plain dict.
+    '''
+
+    def __init__(self, *args, **kw):
+        super(SessionData, self).__init__(*args, **kw)
+        self.mark_clean()
+
+    def mark_clean(self):
+        '''
+        Remember the current content as the stored one.
+        '''
+        self.clean_data = dict(self)
+
+    def is_dirty(self, ignore=()):
+        '''
+        Return True if the content differs from the stored one in any key
+        except those listed in ignore.
+        '''
+        keys = set(self) | set(self.clean_data)
+        for key in keys.difference(ignore):
+            if self.get(key, _missing) != self.clean_data.get(key, _missing):
+                return True
+        return False
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class LocalSessionTier(object):
+    '''
+    In-process cache of session data, consulted before memcached.
+
+    Session data is served from this tier for at most ttl seconds after
+    it was read from or written to memcached, at most max_size sessions
+    are kept. A change made to a session by another process is therefore
+    seen with a delay of up to ttl seconds.
+
+    Any object implementing get(), set() and delete() can be plugged into
+    `MemcacheSessionManager` as its local tier.
+    '''
+
+    def __init__(self, ttl=5, max_size=1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sessions = collections.OrderedDict()
+
+    def get(self, session_id):
+        '''
+        Return a copy of the session data, None if it is not cached or
+        is stale.
+        '''
+        item = self.sessions.pop(session_id, None)
+        if item is None:
+            return None
+        session_data, timestamp = item
+        now = time.time()
+        expiration = session_data.get('session_expiration_timestamp')
+        if now - timestamp > self.ttl or (expiration and now > expiration):
+            return None
+        self.sessions[session_id] = item
+        return dict(session_data)
+
+    def set(self, session_id, session_data):
+        self.sessions.pop(session_id, None)
+        self.sessions[session_id] = (dict(session_data), time.time())
+        while len(self.sessions) > self.max_size:
+            self.sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        self.sessions.pop(session_id, None)
+
+
 class MemcacheSessionManager(SessionManager):
     '''
 
@@ -799,8 +884,22 @@ class MemcacheSessionManager(SessionManager):
     session_cookie_name = 'ipa_session'
     mc_server_stat_name_re = re.compile(r'(.+)\s+\((\d+)\)')
 
-    def __init__(self):
+    # Keys which change on every access of a session. If nothing else
+    # changed, the session data is written back at most every
+    # write_interval seconds.
+    timestamp_keys = ('session_access_timestamp',
+                      'session_expiration_timestamp',
+                      'session_write_timestamp')
+
+    def __init__(self, write_interval=0, local_tier=None):
         '''
+        :parameters:
+          write_interval
+            Number of seconds for which writing back a session whose
+            data only differs in its timestamps is deferred.
+          local_tier
+            Optional in-process cache of session data consulted before
+            memcached, see `LocalSessionTier`.
         :returns:
           `MemcacheSessionManager` object.
         '''
@@ -808,10 +907,20 @@ class MemcacheSessionManager(SessionManager):
         super(MemcacheSessionManager, self).__init__()
         self.servers = ['unix:%s' % self.memcached_socket_path]
         self.mc = memcache.Client(self.servers, debug=0)
+        self.write_interval = write_interval
+        self.local_tier = local_tier
+        self.deferred_writes = 0
 
         if not self.servers_running():
             self.warning("session memcached servers not running")
 
+    def configure(self, write_interval=0, local_tier=None):
+        '''
+        Set the write interval and local tier, see `__init__()`.
+        '''
+        self.write_interval = write_interval
+        self.local_tier = local_tier
+
     def get_server_statistics(self):
         '''
         Return memcached server statistics.
@@ -933,10 +1042,20 @@ class MemcacheSessionManager(SessionManager):
         :returns:
           Session data if found, None otherwise.
         '''
-        session_key = self.session_key(session_id)
-        session_data = self.mc.get(session_key)
+        session_data = None
+        if self.local_tier is not None:
+            session_data = self.local_tier.get(session_id)
+            if session_data is not None:
+                self.debug('session data for id=%s found in local tier', session_id)
+
+        if session_data is None:
+            session_key = self.session_key(session_id)
+            session_data = self.mc.get(session_key)
+            if session_data is not None and self.local_tier is not None:
+                self.local_tier.set(session_id, session_data)
 
         if session_data is not None:
+            session_data = SessionData(session_data)
             # update the access timestamp
             now = time.time()
             session_data['session_access_timestamp'] = now
@@ -1036,6 +1155,13 @@ class MemcacheSessionManager(SessionManager):
         memcached will cause a previously set expiration time for the
         item to be discarded and the item will no longer expire.
 
+        If the session data was loaded by `get_session_data()` and
+        only its timestamps changed since, the write is deferred until
+        write_interval seconds passed since the session was last
+        written. The expiration of the item in memcached may then lag
+        behind the session expiration by up to write_interval seconds,
+        it is never extended by a deferred write though.
+
         :parameters:
           session_data
             Session data dict, must contain session_id key.
@@ -1052,6 +1178,16 @@ class MemcacheSessionManager(SessionManager):
 
         session_expiration_timestamp = session_data['session_expiration_timestamp']
 
+        if self._can_defer_write(session_data, now):
+            self.deferred_writes += 1
+            self.debug('store session: session_id=%s only timestamps changed, write deferred',
+                       session_id)
+            if self.local_tier is not None:
+                self.local_tier.set(session_id, session_data)
+            return session_id
+
+        session_data['session_write_timestamp'] = now
+
         self.debug('store session: session_id=%s start_timestamp=%s access_timestamp=%s expiration_timestamp=%s',
                    session_id,
                    fmt_time(session_data['session_start_timestamp']),
@@ -1059,8 +1195,24 @@ class MemcacheSessionManager(SessionManager):
                    fmt_time(session_data['session_expiration_timestamp']))
 
         self.mc.set(session_key, session_data, time=session_expiration_timestamp)
+        if self.local_tier is not None:
+            self.local_tier.set(session_id, session_data)
+        if isinstance(session_data, SessionData):
+            session_data.mark_clean()
         return session_id
 
+    def _can_defer_write(self, session_data, now):
+        if not self.write_interval or not isinstance(session_data, SessionData):
+            return False
+        if session_data.is_dirty(ignore=self.timestamp_keys):
+            return False
+        # never let the memcached item outlive the session
+        stored_expiration = session_data.clean_data.get('session_expiration_timestamp')
+        if session_data['session_expiration_timestamp'] < stored_expiration:
+            return False
+        last_write = session_data.get('session_write_timestamp', 0)
+        return now - last_write < self.write_interval
+
     def generate_cookie(self, url_path, session_id, expiration=None, add_header=False):
         '''
         Return a session cookie containing the session id. The cookie
@@ -1205,6 +1357,8 @@ class MemcacheSessionManager(SessionManager):
 
         self.debug('delete session data from memcache, session_id=%s', session_id)
         self.mc.delete(session_key)
+        if self.local_tier is not None:
+            self.local_tier.delete(session_id)
 
 
 #-------------------------------------------------------------------------------
@@ -1278,6 +1432,133 @@ def release_ipa_ccache(ccache_name):
         raise ValueError('ccache scheme "%s" unsupported (%s)', scheme, ccache_name)
 
 
+class _MaterializedCCache(object):
+    '''
+    A ccache file written from session data.
+    '''
+
+    __slots__ = ('name', 'ccache_data')
+
+    def __init__(self, name, ccache_data):
+        self.name = name
+        self.ccache_data = ccache_data
+
+
+class SessionCCacheCache(object):
+    '''
+    Keep the ccaches of recently used sessions materialized.
+
+    bind_ipa_ccache() writes the ccache data of a session to a file in
+    every request and release_ipa_ccache() removes it again. Instead,
+    this per-process LRU keeps a ccache file for each of the max_size
+    most recently used sessions. A session's ccache file is only
+    rewritten if the ccache data in the session differs from what was
+    written last time (e.g. because another process renewed the
+    credentials), and load() tells the caller whether the ccache was
+    modified during the request, so the session data only needs to be
+    updated when it was.
+    '''
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.ccaches = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_pathname(self, session_id):
+        return os.path.join(krbccache_dir, '%s%s_%s' % (
+            krbccache_prefix, os.getpid(),
+            hashlib.sha1(session_id).hexdigest()))
+
+    def bind(self, session_id, ccache_data):
+        '''
+        Make the session's ccache the ccache of the current request.
+
+        :parameters:
+          session_id
+            The ID of the session the ccache data belongs to.
+          ccache_data
+            The ccache data stored in the session.
+        :returns:
+          The ccache name, KRB5CCNAME is set to it as well.
+        '''
+        ccache = self.ccaches.pop(session_id, None)
+        if (ccache is not None and ccache.ccache_data == ccache_data and
+                os.path.exists(ccache.name)):
+            self.hits += 1
+        else:
+            self.misses += 1
+            name = self._get_pathname(session_id)
+            root_logger.debug('storing ccache data into file "%s"', name)
+            fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            dst = os.fdopen(fd, 'w')
+            dst.write(ccache_data)
+            dst.close()
+            ccache = _MaterializedCCache(name, ccache_data)
+        self.ccaches[session_id] = ccache
+
+        ccache_name = krb5_unparse_ccache('FILE', ccache.name)
+        os.environ['KRB5CCNAME'] = ccache_name
+        return ccache_name
+
+    def load(self, session_id, ccache_name):
+        '''
+        Read the session's ccache back after the request.
+
+        :parameters:
+          session_id
+            The ID of the session the ccache belongs to.
+          ccache_name
+            The ccache name returned by bind().
+        :returns:
+          The ccache data if it was modified since bind(), None otherwise.
+        '''
+        ccache_data = load_ccache_data(ccache_name)
+        ccache = self.ccaches.get(session_id)
+        if ccache is not None and ccache.ccache_data == ccache_data:
+            return None
+        if ccache is not None:
+            ccache.ccache_data = ccache_data
+        return ccache_data
+
+    def release(self, session_id, ccache_name):
+        '''
+        Stop using the session's ccache in the current request, the
+        ccache file is kept unless it falls out of the LRU.
+        '''
+        if os.environ.get('KRB5CCNAME') == ccache_name:
+            del os.environ['KRB5CCNAME']
+
+        while len(self.ccaches) > self.max_size:
+            evicted_id, ccache = self.ccaches.popitem(last=False)
+            self._remove(ccache)
+
+    def discard(self, session_id):
+        '''
+        Remove the session's ccache, e.g. after logout or when the
+        credentials expired.
+        '''
+        ccache = self.ccaches.pop(session_id, None)
+        if ccache is not None:
+            self._remove(ccache)
+
+    def flush(self):
+        while self.ccaches:
+            session_id, ccache = self.ccaches.popitem()
+            self._remove(ccache)
+
+    def _remove(self, ccache):
+        if os.path.exists(ccache.name):
+            try:
+                os.unlink(ccache.name)
+            except Exception, e:
+                root_logger.error('unable to delete session ccache file "%s", %s', ccache.name, e)
+
+    def statistics(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    size=len(self.ccaches))
+
+
 #-------------------------------------------------------------------------------
 
 from ipalib.request import context
@@ -1306,3 +1587,5 @@ api.register(session_logout)
 
 
 session_mgr = MemcacheSessionManager()
+session_ccaches = SessionCCacheCache()
+atexit.register(session_ccaches.flush)
@@ -477,9 +477,78 @@ of the same type to the constructor. For example:
 from ldap.dn import str2dn, dn2str
 from ldap import DECODING_ERROR
 import sys
+import threading
+import collections
 
 __all__ = ['AVA', 'EditableAVA', 'RDN', 'EditableRDN', 'DN', 'EditableDN']
 
+class _LRUCache(object):
+    'thread safe mapping keeping the max_size most recently used items'
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+# DN strings parsed into tuples of immutable RDN's
+_dn_parse_cache = _LRUCache(10000)
+# Immutable RDN's by their str2dn representation, common RDN's such as
+# the components of the base DN and of the containers are shared by all
+# DN's parsed from strings
+_rdn_intern_cache = _LRUCache(2000)
+
+def _parse_dn(value):
+    '''
+    Parse a DN string, return a tuple of immutable RDN objects. Parsed
+    strings and RDN's are cached, the result must not be modified.
+    '''
+    rdns = _dn_parse_cache.get(value)
+    if rdns is not None:
+        return rdns
+
+    try:
+        dn_list = str2dn(value.encode('utf-8'))
+    except DECODING_ERROR:
+        raise ValueError("malformed RDN string = \"%s\"" % value)
+
+    rdns = []
+    for rdn_list in dn_list:
+        key = tuple(rdn_list)
+        rdn = _rdn_intern_cache.get(key)
+        if rdn is None:
+            rdn = RDN(*[(ava_tuple[0], ava_tuple[1]) for ava_tuple in rdn_list])
+            _rdn_intern_cache.set(key, rdn)
+        rdns.append(rdn)
+    rdns = tuple(rdns)
+
+    _dn_parse_cache.set(value, rdns)
+    return rdns
+
 def _adjust_indices(start, end, length):
     'helper to fixup start/end slice values'
 
@@ -653,8 +722,14 @@ class AVA(object):
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
+        #
+        # The hash value is computed only once.
 
-        return hash(str(self).lower())
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(str(self).lower())
+            return self._hash
 
     def __eq__(self, other):
         '''
@@ -883,7 +958,14 @@ class RDN(object):
         return [[(ava.attr.encode('utf-8'), ava.value.encode('utf-8'), self.flags) for ava in self.avas]]
 
     def __str__(self):
-        return dn2str(self._to_openldap())
+        # Immutable objects compute their string representation only once
+        if self.is_mutable:
+            return dn2str(self._to_openldap())
+        try:
+            return self._str
+        except AttributeError:
+            self._str = dn2str(self._to_openldap())
+            return self._str
 
     def __repr__(self):
         return "%s.%s('%s')" % (self.__module__, self.__class__.__name__, self.__str__())
@@ -942,8 +1024,14 @@ class RDN(object):
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
+        #
+        # The hash value is computed only once.
 
-        return hash(str(self).lower())
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(str(self).lower())
+            return self._hash
 
     def __eq__(self, other):
         # Try coercing string to RDN, if successful compare to coerced object
@@ -1220,29 +1308,25 @@ class DN(object):
     def __init__(self, *args, **kwds):
         self.rdns = self._rdns_from_sequence(args)
 
+    def _copy_rdn(self, rdn):
+        # Immutable RDN's are shared instead of copied
+        if type(rdn) is self.RDN_type and not rdn.is_mutable:
+            return rdn
+        return self.RDN_type(rdn)
+
     def _rdn_from_value(self, value):
         if isinstance(value, RDN):
-            return self.RDN_type(value)
+            return self._copy_rdn(value)
         elif isinstance(value, DN):
             rdns = []
             for rdn in value.rdns:
-                rdns.append(self.RDN_type(rdn))
+                rdns.append(self._copy_rdn(rdn))
             if len(rdns) == 1:
                 return rdns[0]
             else:
                 return rdns
         elif isinstance(value, basestring):
-            rdns = []
-            try:
-                dn_list = str2dn(value.encode('utf-8'))
-                for rdn_list in dn_list:
-                    avas = []
-                    for ava_tuple in rdn_list:
-                        avas.append(self.AVA_type(ava_tuple[0], ava_tuple[1]))
-                    rdn = self.RDN_type(*avas)
-                    rdns.append(rdn)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
+            rdns = [self._copy_rdn(rdn) for rdn in _parse_dn(value)]
             if len(rdns) == 1:
                 return rdns[0]
             else:
@@ -1271,7 +1355,14 @@ class DN(object):
         return [[(ava.attr.encode('utf-8'), ava.value.encode('utf-8'), self.flags) for ava in rdn] for rdn in self.rdns]
 
     def __str__(self):
-        return dn2str(self._to_openldap())
+        # Immutable objects compute their string representation only once
+        if self.is_mutable:
+            return dn2str(self._to_openldap())
+        try:
+            return self._str
+        except AttributeError:
+            self._str = dn2str(self._to_openldap())
+            return self._str
 
     def __repr__(self):
         return "%s.%s('%s')" % (self.__module__, self.__class__.__name__, self.__str__())
@@ -1304,10 +1395,19 @@ class DN(object):
         # Because attrs & values are comparison case-insensitive the
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
+        #
+        # The hash value is computed only once.
 
-        return hash(str(self).lower())
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(str(self).lower())
+            return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         # Try coercing string to DN, if successful compare to coerced object
         if isinstance(other, basestring):
             try:
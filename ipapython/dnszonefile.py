@@ -0,0 +1,162 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+DNS zone file (RFC 1035, section 5) utilities.
+"""
+
+import dns.exception
+import dns.name
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.tokenizer
+import dns.ttl
+
+__all__ = ['read_zone_file', 'format_record', 'canonical_record_data']
+
+
+def _get_ttl_or_class(token, ttl, rdclass):
+    """
+    Return (ttl, rdclass) updated with the value of token, None if token
+    is neither a TTL nor a class.
+    """
+    try:
+        return (dns.ttl.from_text(token.value), rdclass)
+    except dns.ttl.BadTTL:
+        pass
+    try:
+        return (ttl, dns.rdataclass.from_text(token.value))
+    except dns.rdataclass.UnknownRdataclass:
+        return None
+
+
+def read_zone_file(f, origin, filename='<string>'):
+    """
+    Generator yielding the records of the zone file f as they are read.
+
+    Every record is a (name, ttl, rdtype, data) tuple. name is relative to
+    origin, '@' for origin itself. ttl is None if it is set neither by the
+    record nor by $TTL. rdtype is the mnemonic of the record type and data
+    the record data with the names in it relative to origin.
+
+    Only records of class IN are supported. $ORIGIN and $TTL are supported,
+    $INCLUDE and $GENERATE are not. Raise ValueError if f can't be parsed.
+    """
+    zone_origin = dns.name.from_text(origin)
+    current_origin = zone_origin
+    default_ttl = None
+    last_name = None
+
+    tok = dns.tokenizer.Tokenizer(f, filename)
+    while True:
+        try:
+            token = tok.get(True, True)
+            if token.is_eof():
+                break
+            if token.is_eol():
+                continue
+            if token.is_comment():
+                tok.get_eol()
+                continue
+
+            if not token.is_whitespace() and token.value.startswith('$'):
+                directive = token.value.upper()
+                if directive == '$TTL':
+                    default_ttl = dns.ttl.from_text(tok.get_string())
+                elif directive == '$ORIGIN':
+                    current_origin = dns.name.from_text(tok.get_string(),
+                                                        current_origin)
+                else:
+                    raise dns.exception.SyntaxError(
+                        '%s is not supported' % token.value)
+                tok.get_eol()
+                continue
+
+            if token.is_whitespace():
+                # Records without owner name belong to the last one
+                if last_name is None:
+                    raise dns.exception.SyntaxError('missing owner name')
+                name = last_name
+            else:
+                name = dns.name.from_text(token.value, current_origin)
+                last_name = name
+            if not name.is_subdomain(zone_origin):
+                raise dns.exception.SyntaxError(
+                    '%s is not in zone %s' % (name, zone_origin))
+
+            # TTL and class may be given in any order
+            ttl = None
+            rdclass = dns.rdataclass.IN
+            token = tok.get()
+            for i in xrange(2):
+                if not token.is_identifier():
+                    raise dns.exception.SyntaxError('missing record type')
+                values = _get_ttl_or_class(token, ttl, rdclass)
+                if values is None:
+                    break
+                (ttl, rdclass) = values
+                token = tok.get()
+            if rdclass != dns.rdataclass.IN:
+                raise dns.exception.SyntaxError(
+                    'class %s is not supported' %
+                    dns.rdataclass.to_text(rdclass))
+            if not token.is_identifier():
+                raise dns.exception.SyntaxError('missing record type')
+            rdtype = dns.rdatatype.from_text(token.value)
+
+            # Parses the record data up to the end of the record
+            rdata = dns.rdata.from_text(rdclass, rdtype, tok, current_origin,
+                                        False)
+        except dns.exception.DNSException, e:
+            raise ValueError('%s:%d: %s' % (filename, tok.line_number, e))
+
+        if ttl is None:
+            ttl = default_ttl
+        if ttl is not None:
+            ttl = int(ttl)
+        yield (unicode(name.relativize(zone_origin).to_text()), ttl,
+               unicode(dns.rdatatype.to_text(rdtype)),
+               unicode(rdata.to_text(origin=zone_origin, relativize=True)))
+
+
+def format_record(name, ttl, rdtype, data):
+    """
+    Return the zone file line of a record, see read_zone_file for the
+    arguments.
+    """
+    fields = [name]
+    if ttl is not None:
+        fields.append(unicode(ttl))
+    fields.extend([u'IN', rdtype, data])
+    return u'\t'.join(fields)
+
+
+def canonical_record_data(rdtype, data, origin):
+    """
+    Return the record data with the names in it absolute, so the data of
+    equal records compare equal. Relative names are relative to origin.
+    Return data itself if it can't be parsed.
+    """
+    try:
+        rdata = dns.rdata.from_text(dns.rdataclass.IN,
+                                    dns.rdatatype.from_text(rdtype),
+                                    data.encode('utf-8'),
+                                    dns.name.from_text(origin), False)
+    except (dns.exception.DNSException, ValueError):
+        return data
+    return unicode(rdata.to_text())
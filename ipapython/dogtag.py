@@ -19,6 +19,9 @@
 
 import os
 import httplib
+import socket
+import threading
+import time
 import xml.dom.minidom
 import ConfigParser
 from urllib import urlencode
@@ -216,18 +219,166 @@ def ca_status(ca_host=None, use_proxy=True):
         raise error_from_xml(doc, _("Retrieving CA status failed: %s"))
 
 
-def https_request(host, port, url, secdir, password, nickname, **kw):
+class HTTPConnectionPool(object):
+    '''
+    Keep HTTP/1.1 connections to the CA open between requests.
+
+    Setting up an SSL connection with client certificate authentication
+    is usually more expensive than the request sent over it. Connections
+    are pooled under a key supplied by the caller (protocol, host, port
+    and the client credentials) and are only ever handed out again for
+    the very same key.
+
+    Idle connections are closed after idle_timeout seconds, which should
+    be shorter than the keep-alive timeout of the server, and at most
+    max_size idle connections are kept. A max_size of 0 disables the
+    pool.
+    '''
+
+    def __init__(self, max_size=4, idle_timeout=15):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'reconnects', 'evictions'), 0)
+
+    def configure(self, max_size=None, idle_timeout=None):
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+        if max_size is not None and max_size <= 0:
+            self.flush()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expire(self, now):
+        '''
+        Remove idle connections which timed out, must be called with the
+        lock held. Returns the connections to close.
+        '''
+        expired = []
+        for key, entries in self._idle.items():
+            alive = [(conn, last_used) for (conn, last_used) in entries
+                     if now - last_used < self.idle_timeout]
+            expired.extend(conn for (conn, last_used) in entries
+                           if (conn, last_used) not in alive)
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+        self._stats['evictions'] += len(expired)
+        return expired
+
+    def acquire(self, key):
+        '''
+        Return an idle connection for key, or None if there is none. The
+        connection should be given back to the pool with `release()`.
+        '''
+        with self._lock:
+            to_close = self._expire(time.time())
+            entries = self._idle.get(key)
+            conn = None
+            if entries:
+                # most recently used first, it's least likely to be closed
+                # by the server
+                (conn, last_used) = entries.pop()
+                if not entries:
+                    del self._idle[key]
+                self._stats['hits'] += 1
+            else:
+                self._stats['misses'] += 1
+        for stale in to_close:
+            self._close(stale)
+        return conn
+
+    def release(self, key, conn):
+        '''
+        Return a connection whose response was read completely to the
+        pool. The connection is closed if the pool is full or disabled.
+        '''
+        now = time.time()
+        with self._lock:
+            to_close = self._expire(now)
+            self._idle.setdefault(key, []).append((conn, now))
+            idle = sorted(((k, entry) for (k, entries) in self._idle.items()
+                           for entry in entries),
+                          key=lambda item: item[1][1])
+            overflow = idle[:max(len(idle) - max(self.max_size, 0), 0)]
+            for (k, entry) in overflow:
+                self._idle[k].remove(entry)
+                if not self._idle[k]:
+                    del self._idle[k]
+            if self.max_size > 0:
+                self._stats['evictions'] += len(overflow)
+            to_close.extend(entry[0] for (k, entry) in overflow)
+        for conn in to_close:
+            self._close(conn)
+
+    def reconnected(self):
+        '''
+        Count a pooled connection which was closed by the server and had
+        to be replaced.
+        '''
+        with self._lock:
+            self._stats['reconnects'] += 1
+
+    def flush(self):
+        '''
+        Close all idle connections.
+        '''
+        with self._lock:
+            to_close = [conn for entries in self._idle.itervalues()
+                        for (conn, last_used) in entries]
+            self._idle.clear()
+        for conn in to_close:
+            self._close(conn)
+
+    def statistics(self):
+        '''
+        Return a dict with pool counters and the current pool size.
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(e) for e in self._idle.itervalues())
+        return stats
+
+connection_pool = HTTPConnectionPool()
+
+# The NSS database NSS was initialized with by _nss_connection_factory()
+_nss_dbdir = None
+# Serializes NSS initialization by concurrent requests
+_nss_lock = threading.Lock()
+
+
+def _nss_connection_factory(secdir, password, nickname, reuse_nss=False):
     """
-    :param url: The path (not complete URL!) to post to.
-    :param kw:  Keyword arguments to encode into POST body.
-    :return:   (http_status, http_reason_phrase, http_headers, http_body)
-               as (integer, unicode, dict, str)
+    Return a connection factory for client authenticated HTTPS
+    connections.
 
-    Perform a client authenticated HTTPS request
+    If reuse_nss is True and NSS has already been initialized with
+    secdir, NSS is not initialized again. This keeps the SSL session
+    cache, so that new connections can resume earlier SSL sessions.
+    Concurrent requests from several threads initialize NSS only once.
     """
 
     def connection_factory(host, port):
-        conn = nsslib.NSSConnection(host, port, dbdir=secdir)
+        global _nss_dbdir
+        with _nss_lock:
+            no_init = (reuse_nss and _nss_dbdir == secdir and
+                       nss.nss_is_initialized())
+            if not no_init:
+                # NSS can't be shut down while pooled connections use it
+                connection_pool.flush()
+            conn = nsslib.NSSConnection(host, port, dbdir=secdir,
+                                        no_init=no_init)
+            _nss_dbdir = secdir
         conn.set_debuglevel(0)
         conn.connect()
         conn.sock.set_client_auth_data_callback(
@@ -235,11 +386,42 @@ def https_request(host, port, url, secdir, password, nickname, **kw):
             nickname, password, nss.get_default_certdb())
         return conn
 
+    return connection_factory
+
+
+def https_request(host, port, url, secdir, password, nickname, **kw):
+    """
+    :param url: The path (not complete URL!) to post to.
+    :param kw:  Keyword arguments to encode into POST body.
+    :return:   (http_status, http_reason_phrase, http_headers, http_body)
+               as (integer, unicode, dict, str)
+
+    Perform a client authenticated HTTPS request
+    """
+    connection_factory = _nss_connection_factory(secdir, password, nickname)
     body = urlencode(kw)
     return _httplib_request(
             'https', host, port, url, connection_factory, body)
 
 
+def pooled_https_request(host, port, url, secdir, password, nickname, **kw):
+    """
+    :param url: The path (not complete URL!) to post to.
+    :param kw:  Keyword arguments to encode into POST body.
+    :return:   (http_status, http_reason_phrase, http_headers, http_body)
+               as (integer, unicode, dict, str)
+
+    Perform a client authenticated HTTPS request over a keep-alive
+    connection from connection_pool.
+    """
+    connection_factory = _nss_connection_factory(
+        secdir, password, nickname, reuse_nss=True)
+    body = urlencode(kw)
+    return _httplib_request(
+        'https', host, port, url, connection_factory, body,
+        pool_key=('https', host, port, secdir, nickname))
+
+
 def http_request(host, port, url, **kw):
     """
     :param url: The path (not complete URL!) to post to.
@@ -254,6 +436,22 @@ def http_request(host, port, url, **kw):
         'http', host, port, url, httplib.HTTPConnection, body)
 
 
+def pooled_http_request(host, port, url, **kw):
+    """
+    :param url: The path (not complete URL!) to post to.
+    :param kw: Keyword arguments to encode into POST body.
+    :return:   (http_status, http_reason_phrase, http_headers, http_body)
+                as (integer, unicode, dict, str)
+
+    Perform an HTTP request over a keep-alive connection from
+    connection_pool.
+    """
+    body = urlencode(kw)
+    return _httplib_request(
+        'http', host, port, url, httplib.HTTPConnection, body,
+        pool_key=('http', host, port))
+
+
 def unauthenticated_https_request(host, port, url, **kw):
     """
     :param url: The path (not complete URL!) to post to.
@@ -268,12 +466,24 @@ def unauthenticated_https_request(host, port, url, **kw):
         'https', host, port, url, httplib.HTTPSConnection, body)
 
 
+def _nothing_received(e):
+    """
+    Return True if the httplib.BadStatusLine e was raised because the
+    connection was closed before any byte of the response was received.
+    """
+    return (e.line in ('', "''") or
+            e.line.startswith('No status line received'))
+
+
 def _httplib_request(
-        protocol, host, port, path, connection_factory, request_body):
+        protocol, host, port, path, connection_factory, request_body,
+        pool_key=None):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
         with the host and port arguments.
+    :param pool_key: If not None, take the connection from connection_pool
+        and keep it open for the next request with the same pool_key.
 
     Perform a HTTP(s) request.
     """
@@ -283,18 +493,55 @@ def _httplib_request(
     root_logger.debug('request %r', uri)
     root_logger.debug('request body %r', request_body)
     try:
-        conn = connection_factory(host, port)
-        conn.request('POST', uri,
-            body=request_body,
-            headers={'Content-type': 'application/x-www-form-urlencoded'},
-        )
-        res = conn.getresponse()
+        conn = None
+        if pool_key is not None:
+            conn = connection_pool.acquire(pool_key)
+        reused = conn is not None
+        if conn is None:
+            conn = connection_factory(host, port)
+
+        while True:
+            try:
+                conn.request('POST', uri,
+                    body=request_body,
+                    headers={'Content-type': 'application/x-www-form-urlencoded'},
+                )
+            except (socket.error, NSPRError), e:
+                # The request was not sent, it is safe to send it again if
+                # the server closed the idle connection
+                error = e
+            else:
+                try:
+                    res = conn.getresponse()
+                except httplib.BadStatusLine, e:
+                    # The server may have processed the request unless it
+                    # closed the connection without sending anything
+                    if not _nothing_received(e):
+                        conn.close()
+                        raise
+                    error = e
+                except Exception:
+                    conn.close()
+                    raise
+                else:
+                    break
+
+            conn.close()
+            if not reused:
+                raise error
+            root_logger.debug('pooled connection closed: %s', error)
+            connection_pool.reconnected()
+            conn = connection_factory(host, port)
+            reused = False
 
         http_status = res.status
         http_reason_phrase = unicode(res.reason, 'utf-8')
         http_headers = res.msg.dict
         http_body = res.read()
-        conn.close()
+        if pool_key is not None and not res.will_close:
+            connection_pool.release(pool_key, conn)
+        else:
+            conn.close()
     except Exception, e:
         raise NetworkError(uri=uri, error=str(e))
 
@@ -19,12 +19,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 import string
 import time
 import shutil
+import tempfile
+import hashlib
+import cPickle as pickle
 from decimal import Decimal
 from copy import deepcopy
 import contextlib
+import threading
 import collections
 
 import ldap
@@ -85,22 +90,63 @@ def value_to_utf8(val):
 class _ServerSchema(object):
     '''
     Properties of a schema retrieved from an LDAP server.
+
+    Besides the parsed schema, an index of all attribute types by their
+    lower-cased names and OIDs is kept, mapping them to a tuple
+    (syntax, single_value).
     '''
 
-    def __init__(self, server, schema):
+    def __init__(self, server, schema, version=None, attributes=None):
         self.server = server
         self.schema = schema
+        self.version = version
         self.retrieve_timestamp = time.time()
+        if attributes is None:
+            attributes = self._index_attributes(schema)
+        self.attributes = attributes
+
+    @staticmethod
+    def _index_attributes(schema):
+        attributes = {}
+        for oid in schema.listall(ldap.schema.AttributeType):
+            obj = schema.get_obj(ldap.schema.AttributeType, oid)
+            if obj is None:
+                continue
+            info = (obj.syntax, obj.single_value)
+            attributes[oid.lower()] = info
+            for name in obj.names:
+                attributes[name.lower()] = info
+        return attributes
+
+    def get_attribute(self, attr):
+        '''
+        Return (syntax, single_value) of the attribute type, None if it
+        is not in the schema.
+        '''
+        return self.attributes.get(attr.lower())
 
 
 class SchemaCache(object):
     '''
     Cache the schema's from individual LDAP servers.
+
+    If a cache directory is configured, retrieved schemas are also
+    stored on disk together with the schema version of the server
+    (modifyTimestamp and nsSchemaCSN of the schema entry). A new process
+    then only has to read the version from the server with a cheap base
+    search instead of downloading and parsing the whole schema.
     '''
 
-    def __init__(self):
+    def __init__(self, cache_dir=None):
         self.log = log_mgr.get_logger(self)
         self.servers = {}
+        self.cache_dir = cache_dir
+
+    def configure(self, cache_dir=None):
+        '''
+        Set the directory of the on-disk cache, None disables it.
+        '''
+        self.cache_dir = cache_dir
 
     def get_schema(self, url, conn, force_update=False):
         '''
@@ -111,16 +157,30 @@ class SchemaCache(object):
         existing schema for the server from the cache and reacquires
         it.
         '''
+        return self.get_server_schema(url, conn, force_update).schema
 
+    def get_server_schema(self, url, conn, force_update=False):
+        '''
+        Return the `_ServerSchema` of a specific LDAP server, see
+        get_schema.
+        '''
         if force_update:
             self.flush(url)
 
         server_schema = self.servers.get(url)
         if server_schema is None:
-            schema = self._retrieve_schema_from_server(url, conn)
-            server_schema = _ServerSchema(url, schema)
+            version = None
+            if self.cache_dir is not None:
+                version = self._retrieve_schema_version(url, conn)
+            if version is not None and not force_update:
+                server_schema = self._load(url, version)
+            if server_schema is None:
+                schema = self._retrieve_schema_from_server(url, conn)
+                server_schema = _ServerSchema(url, schema, version)
+                if version is not None:
+                    self._store(server_schema)
             self.servers[url] = server_schema
-        return server_schema.schema
+        return server_schema
 
     def flush(self, url):
         self.log.debug('flushing %s from SchemaCache', url)
@@ -129,6 +189,81 @@ class SchemaCache(object):
         except KeyError:
             pass
 
+    def _cache_path(self, url):
+        return os.path.join(self.cache_dir,
+                            '%s.schema' % hashlib.sha1(url).hexdigest())
+
+    def _retrieve_schema_version(self, url, conn):
+        """
+        Return the version of the schema on the server, None if it cannot
+        be determined.
+        """
+        for schema_dn in ('cn=schema', 'cn=subschema'):
+            try:
+                result = conn.search_s(
+                    schema_dn, ldap.SCOPE_BASE,
+                    attrlist=['modifyTimestamp', 'nsSchemaCSN'])
+            except ldap.NO_SUCH_OBJECT:
+                continue
+            except ldap.LDAPError, e:
+                self.log.debug(
+                    'unable to retrieve schema version url=%s: %s', url, e)
+                return None
+            if not result:
+                return None
+            attrs = CIDict(result[0][1])
+            version = (tuple(attrs.get('modifyTimestamp', [])),
+                       tuple(attrs.get('nsSchemaCSN', [])))
+            if version == ((), ()):
+                return None
+            return version
+        return None
+
+    def _load(self, url, version):
+        path = self._cache_path(url)
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except IOError:
+            return None
+        except Exception, e:
+            self.log.debug('unable to load cached schema %s: %s', path, e)
+            return None
+
+        if (data.get('url') != url or data.get('version') != version or
+                data.get('python-ldap') != ldap.__version__):
+            self.log.debug('cached schema %s is outdated', path)
+            return None
+
+        self.log.debug('loaded schema for url=%s from %s', url, path)
+        return _ServerSchema(url, data['schema'], version, data['attributes'])
+
+    def _store(self, server_schema):
+        path = self._cache_path(server_schema.server)
+        data = {
+            'url': server_schema.server,
+            'version': server_schema.version,
+            'python-ldap': ldap.__version__,
+            'schema': server_schema.schema,
+            'attributes': server_schema.attributes,
+        }
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_path, path)
+            except:
+                os.unlink(tmp_path)
+                raise
+        except Exception, e:
+            self.log.debug('unable to store schema to %s: %s', path, e)
+        else:
+            self.log.debug('stored schema for url=%s to %s',
+                           server_schema.server, path)
+
     def _retrieve_schema_from_server(self, url, conn):
         """
         Retrieve the LDAP schema from the provided url and determine if
@@ -180,6 +315,217 @@ class SchemaCache(object):
 schema_cache = SchemaCache()
 
 
+class _PooledConnection(object):
+    '''
+    A bound connection owned by a `LDAPConnectionPool`.
+    '''
+
+    __slots__ = ('conn', 'key', 'bind_token', 'last_used', 'last_checked')
+
+    def __init__(self, conn, key, bind_token):
+        self.conn = conn
+        self.key = key
+        self.bind_token = bind_token
+        self.last_used = time.time()
+        self.last_checked = self.last_used
+
+
+class LDAPConnectionPool(object):
+    '''
+    Keep bound LDAP connections around between requests.
+
+    Binding, especially with SASL/GSSAPI, is usually more expensive
+    than the operations done on a connection during a single request.
+    Connections are pooled under an identity key supplied by the caller
+    (e.g. LDAP URI and the principal the connection was bound as) and
+    are only ever handed out again for the very same key.
+
+    Every connection carries a bind token describing the credentials it
+    was bound with (e.g. the TGT times). If a caller asks for a
+    connection with a different token, the credentials were renewed and
+    the pooled connection is dropped so that the caller binds again.
+
+    Idle connections are closed after idle_timeout seconds, at most
+    max_size idle connections are kept, and a connection which has been
+    idle for longer than check_interval seconds is probed before it is
+    handed out.
+    '''
+
+    def __init__(self, max_size=10, idle_timeout=300, check_interval=60):
+        self.log = log_mgr.get_logger(self)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._busy = {}
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'rebinds', 'evictions', 'failed_checks'), 0)
+
+    def configure(self, max_size=None, idle_timeout=None,
+                  check_interval=None):
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            if check_interval is not None:
+                self.check_interval = check_interval
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def _expire(self, now):
+        '''
+        Remove idle connections which timed out, must be called with the
+        lock held. Returns the connections to close.
+        '''
+        expired = []
+        for key, entries in self._idle.items():
+            alive = [e for e in entries
+                     if now - e.last_used < self.idle_timeout]
+            if len(alive) != len(entries):
+                expired.extend(e for e in entries if e not in alive)
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+        self._stats['evictions'] += len(expired)
+        return expired
+
+    def _check(self, conn):
+        '''
+        Cheap health check of an idle connection (root DSE lookup).
+        '''
+        try:
+            conn.search_s(DN(), ldap.SCOPE_BASE, attrlist=['1.1'])
+        except ldap.LDAPError, e:
+            self.log.debug('pooled connection failed health check: %s', e)
+            return False
+        return True
+
+    def acquire(self, key, bind_token):
+        '''
+        Return an idle connection bound for key, or None if there is
+        none. The returned connection must be given back to the pool
+        with `release()`.
+        '''
+        now = time.time()
+        while True:
+            with self._lock:
+                to_close = self._expire(now)
+                entries = self._idle.get(key)
+                entry = None
+                if entries:
+                    # most recently used first, it's least likely to be stale
+                    entry = entries.pop()
+                    if not entries:
+                        del self._idle[key]
+                    if entry.bind_token != bind_token:
+                        self._stats['rebinds'] += 1
+                        to_close.append(entry)
+                        entry = None
+                if entry is None:
+                    self._stats['misses'] += 1
+            for stale in to_close:
+                self._close(stale.conn)
+            if entry is None:
+                return None
+
+            if now - entry.last_checked >= self.check_interval:
+                if not self._check(entry.conn):
+                    with self._lock:
+                        self._stats['failed_checks'] += 1
+                    self._close(entry.conn)
+                    continue
+                entry.last_checked = now
+
+            with self._lock:
+                self._stats['hits'] += 1
+                self._busy[id(entry.conn)] = entry
+            return entry.conn
+
+    def track(self, conn, key, bind_token):
+        '''
+        Make a newly bound connection eligible to return to the pool.
+        '''
+        if bind_token is None:
+            return
+        with self._lock:
+            self._busy[id(conn)] = _PooledConnection(conn, key, bind_token)
+
+    def discard(self, conn):
+        '''
+        Forget a connection handed out by the pool, it will not be
+        reused (e.g. because the server went away).
+        '''
+        with self._lock:
+            self._busy.pop(id(conn), None)
+
+    def release(self, conn):
+        '''
+        Return a connection to the pool.
+
+        Returns False if the connection does not belong to the pool, in
+        which case the caller is responsible for closing it.
+        '''
+        with self._lock:
+            entry = self._busy.pop(id(conn), None)
+        if entry is None:
+            return False
+
+        # Do not leak per-request state to the next user of the connection
+        try:
+            conn.set_option(ldap.OPT_SERVER_CONTROLS, [])
+        except ldap.LDAPError:
+            self._close(conn)
+            return True
+
+        now = time.time()
+        entry.last_used = now
+        with self._lock:
+            to_close = self._expire(now)
+            self._idle.setdefault(entry.key, []).append(entry)
+            idle = sorted((e for entries in self._idle.itervalues()
+                           for e in entries), key=lambda e: e.last_used)
+            overflow = idle[:max(len(idle) - max(self.max_size, 0), 0)]
+            for e in overflow:
+                self._idle[e.key].remove(e)
+                if not self._idle[e.key]:
+                    del self._idle[e.key]
+            self._stats['evictions'] += len(overflow)
+            to_close.extend(overflow)
+        for e in to_close:
+            self._close(e.conn)
+        return True
+
+    def flush(self):
+        '''
+        Close all idle connections.
+        '''
+        with self._lock:
+            to_close = [e for entries in self._idle.itervalues()
+                        for e in entries]
+            self._idle.clear()
+        for e in to_close:
+            self._close(e.conn)
+
+    def statistics(self):
+        '''
+        Return a dict with pool counters and the current pool size.
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(e) for e in self._idle.itervalues())
+            stats['busy'] = len(self._busy)
+        return stats
+
+connection_pool = LDAPConnectionPool()
+
+
 class IPASimpleLDAPObject(object):
     '''
     The purpose of this class is to provide a boundary between IPA and
@@ -275,20 +621,27 @@ class IPASimpleLDAPObject(object):
         self._no_schema = no_schema
         self._has_schema = False
         self._schema = None
+        self._server_schema = None
+        self._entry_names = {}
         self._force_schema_updates = force_schema_updates
         self._decode_attrs = decode_attrs
 
-    def _get_schema(self):
+    def _get_server_schema(self):
         if self._no_schema:
             return None
         if not self._has_schema:
             try:
-                self._schema = schema_cache.get_schema(
+                self._server_schema = schema_cache.get_server_schema(
                     self.uri, self.conn,
                     force_update=self._force_schema_updates)
+                self._schema = self._server_schema.schema
             except (errors.ExecutionError, IndexError):
                 pass
             self._has_schema = True
+        return self._server_schema
+
+    def _get_schema(self):
+        self._get_server_schema()
         return self._schema
 
     schema = property(_get_schema, None, None, 'schema associated with this LDAP server')
@@ -321,6 +674,8 @@ class IPASimpleLDAPObject(object):
 
         self._has_schema = False
         self._schema = None
+        self._server_schema = None
+        self._entry_names = {}
 
     def get_syntax(self, attr):
         # Is this a special case attribute?
@@ -328,13 +683,36 @@ class IPASimpleLDAPObject(object):
         if syntax is not None:
             return syntax
 
-        if self.schema is None:
+        return self.get_schema_syntax(attr)
+
+    def get_schema_syntax(self, attr):
+        """
+        Return the syntax of the attribute in the schema returned by the
+        server, None if it is unknown.
+        """
+        server_schema = self._get_server_schema()
+        if server_schema is None:
+            return None
+
+        info = server_schema.get_attribute(attr)
+        if info is not None:
+            return info[0]
+        else:
+            return None
+
+    def get_single_value(self, attr):
+        """
+        Check the schema to see if the attribute is single-valued.
+
+        Returns True/False, None if the attribute is unknown.
+        """
+        server_schema = self._get_server_schema()
+        if server_schema is None:
             return None
 
-        # Try to lookup the syntax in the schema returned by the server
-        obj = self.schema.get_obj(ldap.schema.AttributeType, attr)
-        if obj is not None:
-            return obj.syntax
+        info = server_schema.get_attribute(attr)
+        if info is not None:
+            return info[1]
         else:
             return None
 
@@ -437,9 +815,8 @@ class IPASimpleLDAPObject(object):
                 continue
 
             ipa_entry = LDAPEntry(self, DN(original_dn))
-
-            for attr, original_values in original_attrs.items():
-                ipa_entry.raw[attr] = original_values
+            ipa_entry._init_raw(original_attrs,
+                                self._get_entry_names(original_attrs))
 
             ipa_result.append(ipa_entry)
 
@@ -447,8 +824,35 @@ class IPASimpleLDAPObject(object):
             self.log.debug('ldap.result: %s', ipa_result)
         return ipa_result
 
+    # Maximum number of distinct attribute sets whose name tables are kept
+    _entry_names_max_size = 64
+
+    def _get_entry_names(self, attrs):
+        '''
+        Return the attribute name table of an entry with the attributes
+        attrs received from the server.
+
+        Entries returned by a search usually have the same attributes, so
+        they share one name table instead of each computing its own from
+        the schema.
+        '''
+        key = frozenset(attrs)
+        names = self._entry_names.get(key)
+        if names is None:
+            template = LDAPEntry(self, DN())
+            for attr in attrs:
+                template._add_attr_name(template._attr_name(attr))
+            names = template._names
+            if len(self._entry_names) >= self._entry_names_max_size:
+                self._entry_names.clear()
+            self._entry_names[key] = names
+        return names
+
     #---------- python-ldap emulations ----------
 
+    def abandon(self, msgid):
+        return self.conn.abandon(msgid)
+
     def add(self, dn, modlist):
         assert isinstance(dn, DN)
         dn = str(dn)
@@ -487,6 +891,11 @@ class IPASimpleLDAPObject(object):
         dn = str(dn)
         return self.conn.delete(dn)
 
+    def delete_ext(self, dn, serverctrls=None, clientctrls=None):
+        assert isinstance(dn, DN)
+        dn = str(dn)
+        return self.conn.delete_ext(dn, serverctrls, clientctrls)
+
     def delete_s(self, dn):
         assert isinstance(dn, DN)
         dn = str(dn)
@@ -495,6 +904,12 @@ class IPASimpleLDAPObject(object):
     def get_option(self, option):
         return self.conn.get_option(option)
 
+    def modify_ext(self, dn, modlist, serverctrls=None, clientctrls=None):
+        assert isinstance(dn, DN)
+        dn = str(dn)
+        modlist = [(x[0], self.encode(x[1]), self.encode(x[2])) for x in modlist]
+        return self.conn.modify_ext(dn, modlist, serverctrls, clientctrls)
+
     def modify_s(self, dn, modlist):
         assert isinstance(dn, DN)
         dn = str(dn)
@@ -532,7 +947,9 @@ class IPASimpleLDAPObject(object):
 
     def result3(self, msgid=ldap.RES_ANY, all=1, timeout=None):
         rtype, rdata, rmsgid, rctrls = self.conn.result3(msgid, all, timeout)
-        rdata = self.convert_result(rdata)
+        # Polling (timeout=0) returns None for everything if nothing arrived
+        if rtype is not None:
+            rdata = self.convert_result(rdata)
         return rtype, rdata, rmsgid, rctrls
 
     def sasl_interactive_bind_s(self, who, auth, serverctrls=None,
@@ -620,8 +1037,9 @@ class IPASimpleLDAPObject(object):
 # r[0] == r.dn
 # r[1] == r.data
 class LDAPEntry(collections.MutableMapping):
-    __slots__ = ('_conn', '_dn', '_names', '_nice', '_raw', '_sync',
-                 '_not_list', '_orig', '_raw_view', '_single_value_view')
+    __slots__ = ('_conn', '_dn', '_names', '_names_shared', '_nice', '_raw',
+                 '_sync', '_not_list', '_orig', '_raw_view',
+                 '_single_value_view')
 
     def __init__(self, _conn, _dn=None, _obj=None, **kwargs):
         """
@@ -659,6 +1077,7 @@ class LDAPEntry(collections.MutableMapping):
         self._conn = _conn
         self._dn = _dn
         self._names = CIDict()
+        self._names_shared = False
         self._nice = {}
         self._raw = {}
         self._sync = {}
@@ -683,6 +1102,27 @@ class LDAPEntry(collections.MutableMapping):
 
         self.update(_obj, **kwargs)
 
+    def _init_raw(self, attrs, names):
+        """
+        Initialize an empty entry with raw attribute values received from
+        the server.
+
+        names is the attribute name table of the entry as returned by
+        `IPASimpleLDAPObject._get_entry_names`. It is shared with other
+        entries and copied before it is modified. Values are decoded on
+        first access.
+        """
+        self._names = names
+        self._names_shared = True
+        self._raw = dict((names[attr], value)
+                         for attr, value in attrs.iteritems())
+        self._nice = dict.fromkeys(self._raw)
+
+    def _own_names(self):
+        if self._names_shared:
+            self._names = CIDict(self._names)
+            self._names_shared = False
+
     @property
     def conn(self):
         return self._conn
@@ -788,7 +1228,8 @@ class LDAPEntry(collections.MutableMapping):
                 continue
             nice.append(value)
 
-        self._sync[name] = (deepcopy(nice), deepcopy(raw))
+        # values are immutable, a shallow copy is enough
+        self._sync[name] = (list(nice), list(raw))
 
         if len(nice) > 1:
             self._not_list.discard(name)
@@ -809,6 +1250,7 @@ class LDAPEntry(collections.MutableMapping):
             oldname = self._names[name]
 
             if oldname != name:
+                self._own_names()
                 for (altname, keyname) in self._names.iteritems():
                     if keyname == oldname:
                         self._names[altname] = name
@@ -821,6 +1263,7 @@ class LDAPEntry(collections.MutableMapping):
                     self._not_list.remove(oldname)
                     self._not_list.add(name)
         else:
+            self._own_names()
             if self._conn.schema is not None:
                 attrtype = self._conn.schema.get_obj(ldap.schema.AttributeType,
                     name.encode('utf-8'))
@@ -926,6 +1369,7 @@ class LDAPEntry(collections.MutableMapping):
     def __delitem__(self, name):
         name = self._get_attr_name(name)
 
+        self._own_names()
         for (altname, keyname) in self._names.items():
             if keyname == name:
                 del self._names[altname]
@@ -936,6 +1380,7 @@ class LDAPEntry(collections.MutableMapping):
         self._not_list.discard(name)
 
     def clear(self):
+        self._own_names()
         self._names.clear()
         self._nice.clear()
         self._raw.clear()
@@ -1059,6 +1504,236 @@ class SingleValueLDAPEntryView(LDAPEntryView):
             self._entry[name] = [value]
 
 
+class LDAPOperation(object):
+    """
+    An asynchronous LDAP operation submitted through an LDAPMultiplexer.
+
+    Once done, error is the errors.PublicError the operation failed with or
+    None if it succeeded. For a search, entries is the list of entries
+    received, also when the search failed (e.g. hit a size limit).
+    tag is an arbitrary value given when the operation was submitted.
+    """
+
+    def __init__(self, kind, target, tag=None):
+        self.kind = kind
+        self.target = target
+        self.tag = tag
+        self.deadline = None
+        self.msgid = None
+        self.entries = []
+        self.error = None
+        self.done = False
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.kind, self.target)
+
+
+class LDAPMultiplexer(object):
+    """
+    Multiplexer of asynchronous LDAP operations on a single connection.
+
+    search, add, modify and delete submit an operation and return an
+    LDAPOperation right away, so several operations can be outstanding at
+    the same time. iter_completed yields the operations in the order they
+    complete, wait waits for a single one.
+
+    Every operation has its own timeout, counted from its submission. An
+    operation which does not complete in time is abandoned and fails with
+    errors.DatabaseTimeout. LDAP errors are converted to IPA errors by
+    LDAPClient.error_handler.
+
+    Used as a context manager, operations still outstanding on exit are
+    abandoned.
+    """
+
+    def __init__(self, client, timeout=None, poll_interval=0.01):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._pending = []
+        self._completed = collections.deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.abandon()
+
+    def _submit(self, op, op_timeout, func, *args, **kwargs):
+        if op_timeout is _missing:
+            op_timeout = self.timeout
+        if op_timeout is not None:
+            op.deadline = time.time() + op_timeout
+        try:
+            with self.client.error_handler():
+                op.msgid = func(*args, **kwargs)
+        except errors.PublicError, e:
+            op.error = e
+            self._complete(op)
+        else:
+            self._pending.append(op)
+        return op
+
+    def _complete(self, op):
+        op.done = True
+        self._completed.append(op)
+
+    def search(self, filter=None, attrs_list=None, base_dn=None,
+               scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
+               timeout=_missing, tag=None, serverctrls=None):
+        """
+        Submit a search, see LDAPClient.find_entries for the arguments.
+
+        Unlike find_entries, no error is set when nothing matches. timeout
+        defaults to the timeout of the multiplexer. serverctrls is a list
+        of controls sent with this search only.
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+        if time_limit is None or time_limit == 0:
+            time_limit = -1.0
+        if size_limit is None:
+            size_limit = 0
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        op = LDAPOperation('search', base_dn, tag)
+        return self._submit(
+            op, timeout, self.client.conn.search_ext, base_dn, scope, filter,
+            attrs_list, serverctrls=serverctrls, timeout=float(time_limit),
+            sizelimit=int(size_limit))
+
+    def add(self, entry, timeout=_missing, tag=None):
+        """
+        Submit adding the LDAPEntry entry.
+        """
+        # remove all [] values (python-ldap hates 'em)
+        attrs = dict((k, v) for k, v in entry.raw.iteritems() if v)
+        op = LDAPOperation('add', entry.dn, tag)
+        return self._submit(
+            op, timeout, self.client.conn.add_ext, entry.dn, attrs.items())
+
+    def modify(self, dn, modlist, timeout=_missing, tag=None):
+        """
+        Submit modifying the entry dn with a python-ldap modlist.
+        """
+        assert isinstance(dn, DN)
+        op = LDAPOperation('modify', dn, tag)
+        return self._submit(
+            op, timeout, self.client.conn.modify_ext, dn, modlist)
+
+    def delete(self, dn, timeout=_missing, tag=None):
+        """
+        Submit deleting the entry dn.
+        """
+        assert isinstance(dn, DN)
+        op = LDAPOperation('delete', dn, tag)
+        return self._submit(
+            op, timeout, self.client.conn.delete_ext, dn)
+
+    def _receive(self, op, timeout):
+        """
+        Process the messages received for op, waiting up to timeout
+        seconds for the first one. Return True if op completed.
+        """
+        try:
+            with self.client.error_handler():
+                while True:
+                    try:
+                        (res_type, res_list, res_id, res_ctrls) = \
+                            self.client.conn.result3(op.msgid, 0, timeout)
+                    except ldap.TIMEOUT:
+                        return False
+                    if res_type is None:
+                        return False
+                    timeout = 0
+                    if res_type == ldap.RES_SEARCH_ENTRY:
+                        op.entries.extend(res_list)
+                    elif res_type != ldap.RES_SEARCH_REFERENCE:
+                        break
+        except errors.PublicError, e:
+            op.error = e
+        self._pending.remove(op)
+        self._complete(op)
+        return True
+
+    def _expire(self, op):
+        try:
+            self.client.conn.abandon(op.msgid)
+        except ldap.LDAPError, e:
+            self.client.log.warning("Error abandoning operation: %s", e)
+        op.error = errors.DatabaseTimeout()
+        self._pending.remove(op)
+        self._complete(op)
+
+    def _poll(self):
+        """
+        Process the messages received for all outstanding operations and
+        expire the operations which timed out. If none completed, wait
+        up to poll_interval seconds for the oldest one.
+        """
+        progress = False
+        for op in list(self._pending):
+            if self._receive(op, 0):
+                progress = True
+            elif op.deadline is not None and time.time() >= op.deadline:
+                self._expire(op)
+                progress = True
+        if progress or not self._pending:
+            return
+
+        op = self._pending[0]
+        timeout = self.poll_interval
+        if op.deadline is not None:
+            timeout = max(min(timeout, op.deadline - time.time()), 0.000001)
+        self._receive(op, timeout)
+
+    def iter_completed(self):
+        """
+        Generator yielding operations as they complete, until no operation
+        is outstanding.
+        """
+        while self._completed or self._pending:
+            while self._completed:
+                yield self._completed.popleft()
+            if self._pending:
+                self._poll()
+
+    def wait(self, op):
+        """
+        Wait for op to complete. Return the entries found for a search,
+        None for other operations, or raise the error op failed with.
+
+        Other operations completing in the meantime are still yielded by
+        iter_completed.
+        """
+        while not op.done:
+            self._poll()
+        try:
+            self._completed.remove(op)
+        except ValueError:
+            pass
+        if op.error is not None:
+            raise op.error
+        if op.kind == 'search':
+            return op.entries
+        return None
+
+    def abandon(self):
+        """
+        Abandon all outstanding operations.
+        """
+        for op in self._pending:
+            try:
+                self.client.conn.abandon(op.msgid)
+            except ldap.LDAPError, e:
+                self.client.log.warning("Error abandoning operation: %s", e)
+        del self._pending[:]
+
+
 class LDAPClient(object):
     """LDAP backend class
 
@@ -1163,13 +1838,7 @@ class LDAPClient(object):
         return self.conn.schema
 
     def get_syntax(self, attr, value):
-        if self.schema is None:
-            return None
-        obj = self.schema.get_obj(ldap.schema.AttributeType, attr)
-        if obj is not None:
-            return obj.syntax
-        else:
-            return None
+        return self.conn.get_schema_syntax(attr)
 
     def has_dn_syntax(self, attr):
         return self.conn.has_dn_syntax(attr)
@@ -1196,10 +1865,7 @@ class LDAPClient(object):
         If there is a problem loading the schema or the attribute is
         not in the schema return None
         """
-        if self.schema is None:
-            return None
-        obj = self.schema.get_obj(ldap.schema.AttributeType, attr)
-        return obj and obj.single_value
+        return self.conn.get_single_value(attr)
 
     def make_dn_from_attr(self, attr, value, parent_dn=None):
         """
@@ -1381,7 +2047,8 @@ class LDAPClient(object):
 
     def find_entries(self, filter=None, attrs_list=None, base_dn=None,
                      scope=ldap.SCOPE_SUBTREE, time_limit=None,
-                     size_limit=None, search_refs=False, paged_search=False):
+                     size_limit=None, search_refs=False, paged_search=False,
+                     serverctrls=None):
         """
         Return a list of entries and indication of whether the results were
         truncated ([(dn, entry_attrs)], truncated) matching specified search
@@ -1398,14 +2065,53 @@ class LDAPClient(object):
         search_refs -- allow search references to be returned
             (default skips these entries)
         paged_search -- search using paged results control
+        serverctrls -- list of additional controls to send with the search
+            (default None)
+
+        Use the iter_entries method to process large results without
+        keeping all entries in memory.
+        """
+        res = []
+        truncated = False
+
+        # Only errors raised while iterating mean the search was truncated
+        entries = self.iter_entries(
+            filter=filter, attrs_list=attrs_list, base_dn=base_dn,
+            scope=scope, time_limit=time_limit, size_limit=size_limit,
+            search_refs=search_refs, paged_search=paged_search,
+            serverctrls=serverctrls)
+        try:
+            for entry in entries:
+                res.append(entry)
+        except errors.LimitsExceeded:
+            truncated = True
+
+        if not res and not truncated:
+            raise errors.NotFound(reason='no such entry')
+
+        return (res, truncated)
+
+    def iter_entries(self, filter=None, attrs_list=None, base_dn=None,
+                     scope=ldap.SCOPE_SUBTREE, time_limit=None,
+                     size_limit=None, search_refs=False, paged_search=False,
+                     serverctrls=None):
+        """
+        Generator yielding entries matching specified search parameters as
+        they are received from the server.
+
+        The arguments are the same as for find_entries. Unlike find_entries,
+        no error is raised when nothing matches. When the search hits a
+        server limit, errors.LimitsExceeded is raised after all entries
+        received until then have been yielded.
+
+        If the caller stops iterating before the search is complete, the
+        search is abandoned and a paged search is cancelled on the server.
         """
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
-        truncated = False
 
         if time_limit is None or time_limit == 0:
             time_limit = -1.0
@@ -1419,18 +2125,30 @@ class LDAPClient(object):
         if attrs_list:
             attrs_list = [a.lower() for a in set(attrs_list)]
 
-        sctrls = None
+        sctrls = serverctrls or None
         cookie = ''
         page_size = (size_limit if size_limit > 0 else 2000) - 1
         if page_size == 0:
             paged_search = False
 
+        def cancel_paged_search():
+            sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+            try:
+                self.conn.search_ext_s(
+                    base_dn, scope, filter, attrs_list,
+                    serverctrls=sctrls, timeout=time_limit,
+                    sizelimit=size_limit)
+            except ldap.LDAPError, e:
+                self.log.warning("Error cancelling paged search: %s", e)
+
         # pass arguments to python-ldap
         with self.error_handler():
             while True:
                 if paged_search:
-                    sctrls = [SimplePagedResultsControl(0, page_size, cookie)]
+                    sctrls = list(serverctrls or []) + [
+                        SimplePagedResultsControl(0, page_size, cookie)]
 
+                id = None
                 try:
                     id = self.conn.search_ext(
                         base_dn, scope, filter, attrs_list,
@@ -1445,7 +2163,8 @@ class LDAPClient(object):
                         if (objtype == ldap.RES_SEARCH_ENTRY or
                                 (search_refs and
                                     objtype == ldap.RES_SEARCH_REFERENCE)):
-                            res.append(res_list[0])
+                            yield res_list[0]
+                    id = None
 
                     if paged_search:
                         # Get cookie for the next page
@@ -1455,35 +2174,32 @@ class LDAPClient(object):
                                 break
                         else:
                             cookie = ''
-                except ldap.LDAPError, e:
-                    # If paged search is in progress, try to cancel it
-                    if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+                except GeneratorExit:
+                    # The caller is not interested in the rest of the results
+                    if id is not None:
                         try:
-                            self.conn.search_ext_s(
-                                base_dn, scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
+                            self.conn.abandon(id)
                         except ldap.LDAPError, e:
                             self.log.warning(
-                                "Error cancelling paged search: %s", e)
+                                "Error abandoning search: %s", e)
+                    if paged_search and cookie:
+                        cancel_paged_search()
+                    raise
+                except ldap.LDAPError, e:
+                    # If paged search is in progress, try to cancel it
+                    if paged_search and cookie:
+                        cancel_paged_search()
                         cookie = ''
 
                     try:
                         raise e
                     except (ldap.ADMINLIMIT_EXCEEDED, ldap.TIMELIMIT_EXCEEDED,
                             ldap.SIZELIMIT_EXCEEDED):
-                        truncated = True
-                        break
+                        raise errors.LimitsExceeded()
 
                 if not paged_search or not cookie:
                     break
 
-        if not res and not truncated:
-            raise errors.NotFound(reason='no such entry')
-
-        return (res, truncated)
-
     def find_entry_by_attr(self, attr, value, object_class, attrs_list=None,
                            base_dn=None):
         """
@@ -1556,6 +2272,64 @@ class LDAPClient(object):
         with self.error_handler():
             self.conn.add_s(dn, attrs.items())
 
+    def iter_add_entries(self, entries, max_outstanding=32):
+        """
+        Generator creating entries asynchronously.
+
+        entries is an iterable of LDAPEntry objects. It is consumed lazily,
+        an entry is only taken from it when fewer than max_outstanding add
+        operations are waiting for their result. For every entry,
+        (entry, error) is yielded in the order the entries were taken from
+        entries. error is None if the entry was created, otherwise the
+        errors.ExecutionError the add failed with; other errors are raised.
+
+        If the caller stops iterating, the results of the outstanding add
+        operations are still collected, but not reported.
+        """
+        entries = iter(entries)
+        pending = collections.deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < max_outstanding:
+                    try:
+                        entry = entries.next()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    # remove all [] values (python-ldap hates 'em)
+                    attrs = dict((k, v) for k, v in entry.raw.iteritems() if v)
+                    with self.error_handler():
+                        msgid = self.conn.add_ext(entry.dn, attrs.items())
+                    pending.append((entry, msgid))
+
+                if not pending:
+                    break
+
+                (entry, msgid) = pending.popleft()
+                try:
+                    with self.error_handler():
+                        self.conn.result3(msgid)
+                except errors.ExecutionError, e:
+                    yield (entry, e)
+                else:
+                    yield (entry, None)
+        finally:
+            for (entry, msgid) in pending:
+                try:
+                    self.conn.result3(msgid)
+                except ldap.LDAPError:
+                    pass
+
+    def multiplexer(self, timeout=None):
+        """
+        Return an LDAPMultiplexer for running several asynchronous
+        operations at the same time on this connection.
+
+        timeout is the default timeout of every operation in seconds.
+        """
+        return LDAPMultiplexer(self, timeout)
+
     def update_entry_rdn(self, dn, new_rdn, del_old=True):
         """
         Update entry's relative distinguished name.
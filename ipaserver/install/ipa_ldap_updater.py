@@ -31,7 +31,8 @@ import krbV
 from ipalib import api
 from ipapython import ipautil, admintool
 from ipaserver.install import installutils, dsinstance, schemaupdate
-from ipaserver.install.ldapupdate import LDAPUpdate, UPDATES_DIR
+from ipaserver.install.ldapupdate import (
+    LDAPUpdate, UPDATES_DIR, DEFAULT_WORKERS)
 from ipaserver.install.upgradeinstance import IPAUpgrade
 
 
@@ -70,6 +71,10 @@ class LDAPUpdater(admintool.AdminTool):
         parser.add_option("-W", '--password', action="store_true",
             dest="ask_password",
             help="prompt for the Directory Manager password")
+        parser.add_option("-j", '--jobs', type="int", dest="jobs",
+            default=DEFAULT_WORKERS,
+            help="number of LDAP connections used to apply independent "
+                "updates concurrently")
 
     @classmethod
     def get_command_class(cls, options, args):
@@ -98,6 +103,9 @@ class LDAPUpdater(admintool.AdminTool):
             print "IPA is not configured on this system."
             sys.exit(1)
 
+        if options.jobs < 1:
+            raise admintool.ScriptError("--jobs must be at least 1")
+
         if options.password:
             pw = ipautil.template_file(options.password, [])
             self.dirman_password = pw.strip()
@@ -201,7 +209,8 @@ class LDAPUpdater_NonUpgrade(LDAPUpdater):
             sub_dict={},
             live_run=not options.test,
             ldapi=options.ldapi,
-            plugins=options.plugins or self.run_plugins)
+            plugins=options.plugins or self.run_plugins,
+            workers=options.jobs)
 
         if not self.files:
             self.files = ld.get_all_files(UPDATES_DIR)
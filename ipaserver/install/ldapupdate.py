@@ -24,6 +24,12 @@
 
 UPDATES_DIR="/usr/share/ipa/updates/"
 
+# Number of connections used to apply independent updates concurrently
+DEFAULT_WORKERS = 4
+
+# Parsed update files are cached here between runs of the updater
+UPDATES_CACHE_DIR = "/var/lib/ipa/updates-cache"
+
 import sys
 import uuid
 import platform
@@ -33,12 +39,19 @@ import pwd
 import fnmatch
 import csv
 import re
+import copy
+import threading
+import Queue
+import string
+import hashlib
+import tempfile
+import cPickle as pickle
 
 import krbV
 import ldap
 
 from ipaserver.install import installutils
-from ipapython import ipautil, ipaldap
+from ipapython import ipautil, ipaldap, version
 from ipalib import errors
 from ipalib import api
 from ipapython.dn import DN
@@ -108,11 +121,184 @@ def safe_output(attr, values):
     else:
         return values
 
+class UpdateCache(object):
+    """
+    Cache of parsed update files.
+
+    The updates parsed from a file are cached together with the
+    modification time and size of the file and a hash of the values of
+    the substitution variables used in the file. They are reused by every
+    LDAPUpdate in the process as long as these do not change.
+
+    If a cache directory is configured, the parsed updates are also
+    stored on disk so that later installer and upgrade steps don't have
+    to parse the files again.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.log = log_mgr.get_logger(self)
+        self.files = {}
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def get_variables(data):
+        """Return the sorted names of the substitution variables in data"""
+        names = set()
+        for match in string.Template.pattern.finditer(''.join(data)):
+            name = match.group('named') or match.group('braced')
+            if name:
+                names.add(name)
+        return sorted(names)
+
+    @staticmethod
+    def _hash_variables(names, sub_dict):
+        values = [(name, sub_dict.get(name)) for name in names]
+        return hashlib.sha1(repr(values)).hexdigest()
+
+    def get(self, filename, sub_dict):
+        """
+        Return the list of updates parsed from filename with sub_dict, None
+        if they are not cached or the file changed.
+        """
+        if filename == '-':
+            return None
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+
+        data = self.files.get(filename)
+        if data is None and self.cache_dir is not None:
+            data = self._load(filename)
+        if data is None:
+            return None
+        if (data['mtime'] != st.st_mtime or data['size'] != st.st_size or
+                data['hash'] != self._hash_variables(data['variables'],
+                                                     sub_dict)):
+            return None
+
+        self.files[filename] = data
+        return data['updates']
+
+    def store(self, filename, source_data, sub_dict, updates):
+        """
+        Cache the list of updates parsed from filename, source_data is the
+        content of the file.
+        """
+        if filename == '-':
+            return
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return
+
+        variables = self.get_variables(source_data)
+        data = {
+            'filename': filename,
+            'mtime': st.st_mtime,
+            'size': st.st_size,
+            'variables': variables,
+            'hash': self._hash_variables(variables, sub_dict),
+            'updates': updates,
+        }
+        self.files[filename] = data
+        if self.cache_dir is not None:
+            self._store(data)
+
+    def clear(self):
+        self.files.clear()
+
+    def _cache_path(self, filename):
+        return os.path.join(self.cache_dir, '%s.pickle' %
+                            hashlib.sha1(os.path.abspath(filename)).hexdigest())
+
+    def _load(self, filename):
+        path = self._cache_path(filename)
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except IOError:
+            return None
+        except Exception, e:
+            self.log.debug('unable to load cached updates %s: %s', path, e)
+            return None
+
+        if (data.get('filename') != filename or
+                data.get('ipa-version') != version.VERSION):
+            self.log.debug('cached updates %s are outdated', path)
+            return None
+
+        # DNs are stored as strings
+        for update in data['updates']:
+            update['dn'] = DN(update['dn'])
+        return data
+
+    def _store(self, data):
+        path = self._cache_path(data['filename'])
+        # DNs are stored as strings
+        data = dict(data, updates=[dict(update, dn=str(update['dn']))
+                                   for update in data['updates']])
+        data['ipa-version'] = version.VERSION
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_path, path)
+            except:
+                os.unlink(tmp_path)
+                raise
+        except Exception, e:
+            self.log.debug('unable to store updates to %s: %s', path, e)
+
+update_cache = UpdateCache(UPDATES_CACHE_DIR)
+
+
+def get_update_groups(all_updates):
+    """
+    Split the updates into groups which can be applied concurrently.
+
+    Return a list of phases which must be applied one after another. Each
+    phase is a list of groups of (dn, update) tuples. A group contains all
+    the updates of a subtree and is sorted from the shortest to the longest
+    DN, so that parents are always updated before their children. The
+    groups of a phase do not depend on each other.
+
+    The schema is updated first and the server configuration second, so
+    that the other updates can rely on them.
+    """
+    containers = (DN(('cn', 'schema')), DN(('cn', 'config')))
+    phases = [[] for i in range(len(containers) + 1)]
+    groups = {}
+
+    for dn, update in sorted(all_updates.iteritems(),
+                             key=lambda dn_update: len(dn_update[0])):
+        assert isinstance(dn, DN)
+        for i in range(1, len(dn)):
+            group = groups.get(DN(*dn[i:]))
+            if group is not None:
+                break
+        else:
+            group = []
+            for phase, container in zip(phases, containers):
+                if dn.endswith(container):
+                    break
+            else:
+                phase = phases[-1]
+            phase.append(group)
+        group.append((dn, update))
+        groups[dn] = group
+
+    return [phase for phase in phases if phase]
+
 class LDAPUpdate:
     action_keywords = ["default", "add", "remove", "only", "onlyifexist", "deleteentry", "replace", "addifnew", "addifexist"]
 
     def __init__(self, dm_password, sub_dict={}, live_run=True,
-                 online=True, ldapi=False, plugins=False):
+                 online=True, ldapi=False, plugins=False,
+                 workers=DEFAULT_WORKERS):
         '''
         :parameters:
             dm_password
@@ -127,6 +313,9 @@ class LDAPUpdate:
                 Bind using ldapi. This assumes autobind is enabled.
             plugins
                 execute the pre/post update plugins
+            workers
+                Maximum number of connections used to apply independent
+                updates concurrently
 
         Data Structure Example:
         -----------------------
@@ -166,6 +355,10 @@ class LDAPUpdate:
         self.online = online
         self.ldapi = ldapi
         self.plugins = plugins
+        self.workers = workers
+        self.timings = {}
+        self._update_sources = {}
+        self._timings_lock = threading.Lock()
         self.pw_name = pwd.getpwuid(os.geteuid()).pw_name
         self.realm = None
         suffix = None
@@ -330,6 +523,26 @@ class LDAPUpdate:
     def parse_update_file(self, data_source_name, source_data, all_updates):
         """Parse the update file into a dictonary of lists and apply the update
            for each DN in the file."""
+        updates = self._parse_update_file(data_source_name, source_data)
+        self._merge_parsed_updates(data_source_name, updates, all_updates)
+        return all_updates
+
+    def _merge_parsed_updates(self, data_source_name, updates, all_updates):
+        """Merge a list of updates parsed from a data source"""
+        for update in updates:
+            # The lists are extended when combining updates of the same DN
+            update = dict((key, list(value) if isinstance(value, list)
+                           else value)
+                          for key, value in update.iteritems())
+            self._combine_updates(all_updates, update)
+            sources = self._update_sources.setdefault(update['dn'], [])
+            if data_source_name not in sources:
+                sources.append(data_source_name)
+
+    def _parse_update_file(self, data_source_name, source_data):
+        """Parse the update file into a list of updates, one for each
+           DN in the file."""
+        updates = []
         update = {}
         logical_line = ""
         action = ""
@@ -385,11 +598,11 @@ class LDAPUpdate:
 
         def emit_update(update):
             '''
-            When processing a dn is completed emit the update by merging it into
-            the set of all updates.
+            When processing a dn is completed emit the update by adding it
+            to the list of updates.
             '''
 
-            self._combine_updates(all_updates, update)
+            updates.append(update)
 
         # Iterate over source input lines
         for source_line in source_data:
@@ -435,7 +648,7 @@ class LDAPUpdate:
             emit_update(update)
             update = {}
 
-        return all_updates
+        return updates
 
     def create_index_task(self, attribute):
         """Create a task to update an index for an attribute"""
@@ -798,24 +1011,95 @@ class LDAPUpdate:
         else:
             raise RuntimeError("Offline updates are not supported.")
 
+    def _get_timing(self, source):
+        return self.timings.setdefault(
+            source, {'entries': 0, 'parse': 0.0, 'apply': 0.0})
+
+    def _apply_group(self, group):
+        """Apply a group of updates in order, timing each update"""
+        for dn, update in group:
+            start = time.time()
+            self._update_record(update)
+            elapsed = time.time() - start
+
+            with self._timings_lock:
+                for source in self._update_sources.get(dn, ['<plugins>']):
+                    timing = self._get_timing(source)
+                    timing['entries'] += 1
+                    timing['apply'] += elapsed
+
+    def _run_worker(self, queue, failures):
+        """
+        Apply groups of updates from the queue on a new connection until
+        the queue is empty or another worker failed.
+        """
+        worker = copy.copy(self)
+        worker.modified = False
+        try:
+            worker.create_connection()
+            try:
+                while not failures:
+                    try:
+                        group = queue.get_nowait()
+                    except Queue.Empty:
+                        break
+                    worker._apply_group(group)
+            finally:
+                worker.conn.unbind()
+        except Exception:
+            failures.append(sys.exc_info())
+        if worker.modified:
+            self.modified = True
+
+    def _apply_groups(self, groups):
+        """
+        Apply independent groups of updates, concurrently on up to
+        self.workers connections.
+        """
+        workers = min(self.workers, len(groups))
+        if workers <= 1:
+            for group in groups:
+                self._apply_group(group)
+            return
+
+        # Start with the largest groups so that they don't finish last
+        queue = Queue.Queue()
+        for group in sorted(groups, key=len, reverse=True):
+            queue.put(group)
+
+        failures = []
+        threads = [threading.Thread(target=self._run_worker,
+                                    args=(queue, failures))
+                   for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if failures:
+            exc_type, exc_value, exc_traceback = failures[0]
+            raise exc_type, exc_value, exc_traceback
+
     def _run_updates(self, all_updates):
         # For adds and updates we want to apply updates from shortest
-        # to greatest length of the DN.
+        # to greatest length of the DN, unrelated subtrees are updated
+        # concurrently.
         # For deletes we want the reverse
         def update_sort_key(dn_update):
             dn, update = dn_update
             assert isinstance(dn, DN)
             return len(dn)
 
-        sorted_updates = sorted(all_updates.iteritems(), key=update_sort_key)
+        for groups in get_update_groups(all_updates):
+            self._apply_groups(groups)
 
-        for dn, update in sorted_updates:
-            self._update_record(update)
+        sorted_updates = sorted(all_updates.iteritems(), key=update_sort_key)
 
         # Now run the deletes in reversed order
         sorted_updates.reverse()
         for dn, update in sorted_updates:
             self._delete_record(update)
+            self._update_sources.pop(dn, None)
 
     def update(self, files, ordered=False):
         """Execute the update. files is a list of the update files to use.
@@ -857,14 +1141,23 @@ class LDAPUpdate:
                         all_updates = {}
                         r += 10
 
-                try:
-                    self.info("Parsing update file '%s'" % f)
-                    data = self.read_file(f)
-                except Exception, e:
-                    self.error("error reading update file '%s'", f)
-                    sys.exit(e)
+                start = time.time()
+                updates = update_cache.get(f, self.sub_dict)
+                if updates is None:
+                    try:
+                        self.info("Parsing update file '%s'" % f)
+                        data = self.read_file(f)
+                    except Exception, e:
+                        self.error("error reading update file '%s'", f)
+                        sys.exit(e)
+
+                    updates = self._parse_update_file(f, data)
+                    update_cache.store(f, data, self.sub_dict, updates)
+                else:
+                    self.info("Using cached update file '%s'" % f)
 
-                self.parse_update_file(f, data, all_updates)
+                self._merge_parsed_updates(f, updates, all_updates)
+                self._get_timing(f)['parse'] += time.time() - start
 
             self._run_updates(all_updates)
         finally:
@@ -877,8 +1170,22 @@ class LDAPUpdate:
             self.merge_updates(all_updates, updates)
             self._run_updates(all_updates)
 
+        self.log_timings()
+
         return self.modified
 
+    def log_timings(self):
+        """Log the time spent on each update file, slowest first"""
+        def total_time(source_timing):
+            source, timing = source_timing
+            return timing['parse'] + timing['apply']
+
+        self.info("Update timings:")
+        for source, timing in sorted(self.timings.iteritems(),
+                                     key=total_time, reverse=True):
+            self.info("%s: %d entries, parsed in %.3fs, applied in %.3fs",
+                      source, timing['entries'], timing['parse'],
+                      timing['apply'])
 
     def update_from_dict(self, updates):
         """
@@ -43,43 +43,51 @@ class update_service_principalalias(PostUpdate):
 
         while True:
             # run the search in loop to avoid issues when LDAP limits are hit
-            # during update
+            # during update. Only the changes are kept in memory, they are
+            # applied once the search is complete as no other operation may
+            # be sent on the connection while the search is outstanding.
+            entries = ldap.iter_entries(search_filter,
+                ['objectclass', 'krbprincipalname'], base_dn,
+                time_limit=0, size_limit=0)
+            updates = []
+            truncated = False
+            error = False
             try:
-                (entries, truncated) = ldap.find_entries(search_filter,
-                    ['objectclass', 'krbprincipalname'], base_dn,
-                    time_limit=0, size_limit=0)
+                for entry in entries:
+                    update = {}
+                    update['objectclass'] = (entry['objectclass'] +
+                                             ['ipakrbprincipal'])
+                    update['ipakrbprincipalalias'] = entry['krbprincipalname']
+                    updates.append((entry.dn, update))
+            except errors.LimitsExceeded:
+                truncated = True
             except errors.NotFound:
-                root_logger.debug("update_service_principalalias: no service "
-                                  "to update found")
-                return (False, False, [])
+                pass
             except errors.ExecutionError, e:
                 root_logger.error("update_service_principalalias: cannot "
                                   "retrieve list of affected services: %s", e)
                 return (False, False, [])
-            if not entries:
+
+            count = len(updates)
+            if not count:
                 # no entry was returned, rather break than continue cycling
                 root_logger.debug("update_service_principalalias: no service "
-                                  "was returned")
+                                  "to update found")
                 return (False, False, [])
-            root_logger.debug("update_service_principalalias: found %d "
-                              "services to update, truncated: %s",
-                              len(entries), truncated)
 
-            error = False
-            for dn, entry in entries:
-                update = {}
-                update['objectclass'] = (entry['objectclass'] +
-                                         ['ipakrbprincipal'])
-                update['ipakrbprincipalalias'] = entry['krbprincipalname']
+            for (dn, update) in updates:
                 try:
                     ldap.update_entry(dn, update)
                 except (errors.EmptyModlist, errors.NotFound):
                     pass
                 except errors.ExecutionError, e:
-                    root_logger.debug("update_service_principalalias: cannot "
-                                      "update service: %s", e)
+                    root_logger.debug("update_service_principalalias: "
+                                      "cannot update service: %s", e)
                     error = True
 
+            root_logger.debug("update_service_principalalias: updated %d "
+                              "services, truncated: %s", count, truncated)
+
             if error:
                 # exit loop to avoid infinite cycles
                 root_logger.error("update_service_principalalias: error(s)"
@@ -1199,6 +1199,36 @@ def parse_unrevoke_cert_xml(doc):
 
     return response
 
+def parse_cert_data_info(cert):
+    '''
+    :param cert: CertDataInfo element of a certificate search response
+    :return:     parsed result dict
+
+    +-----------------+---------------+---------------+
+    |result name      |result type    |comments       |
+    +=================+===============+===============+
+    |serial_number    |int|long       |               |
+    +-----------------+---------------+---------------+
+    |serial_number_hex|unicode        |               |
+    +-----------------+---------------+---------------+
+    |subject          |unicode        |               |
+    +-----------------+---------------+---------------+
+    |status           |unicode        |               |
+    +-----------------+---------------+---------------+
+    '''
+    response = {}
+    response['serial_number'] = int(cert.get('id'), 16) # parse as hex
+    response['serial_number_hex'] = u'0x%X' % response['serial_number']
+
+    dn = cert.xpath('SubjectDN')
+    if len(dn) == 1:
+        response['subject'] = unicode(dn[0].text)
+    status = cert.xpath('Status')
+    if len(status) == 1:
+        response['status'] = unicode(status[0].text)
+
+    return response
+
 #-------------------------------------------------------------------------------
 
 from ipalib import api, SkipPluginModule
@@ -1207,6 +1237,7 @@ if api.env.ra_plugin != 'dogtag':
     raise SkipPluginModule(reason='dogtag not selected as RA plugin')
 import os, random
 from ipaserver.plugins import rabase
+from ipalib import errors
 from ipalib.errors import CertificateOperationError
 from ipalib.constants import TYPE_ERROR
 from ipalib.util import cachedproperty
@@ -1228,6 +1259,7 @@ class ra(rabase.rabase):
         self.ipa_key_size = "2048"
         self.ipa_certificate_nickname = "ipaCert"
         self.ca_certificate_nickname = "caCert"
+        self.find_page_size = 1000
         try:
             f = open(self.pwd_file, "r")
             self.password = f.readline().strip()
@@ -1236,6 +1268,12 @@ class ra(rabase.rabase):
             self.password = ''
         super(ra, self).__init__()
 
+    def _on_finalize(self):
+        super(ra, self)._on_finalize()
+        dogtag.connection_pool.configure(
+            max_size=self.env.ca_pool_size,
+            idle_timeout=self.env.ca_pool_idle_timeout)
+
     def raise_certificate_operation_error(self, func_name, err_msg=None, detail=None):
         """
         :param func_name: function name where error occurred
@@ -1334,9 +1372,12 @@ class ra(rabase.rabase):
         :return:   (http_status, http_reason_phrase, http_headers, http_body)
                    as (integer, unicode, dict, str)
 
-        Perform an HTTP request.
+        Perform an HTTP request over a keep-alive connection.
         """
-        return dogtag.http_request(self.ca_host, port, url, **kw)
+        result = dogtag.pooled_http_request(self.ca_host, port, url, **kw)
+        self.debug('CA connection pool: %s',
+                   dogtag.connection_pool.statistics())
+        return result
 
     def _sslget(self, url, port, **kw):
         """
@@ -1345,9 +1386,14 @@ class ra(rabase.rabase):
         :return:   (http_status, http_reason_phrase, http_headers, http_body)
                    as (integer, unicode, dict, str)
 
-        Perform an HTTPS request
+        Perform an HTTPS request over a keep-alive connection.
         """
-        return dogtag.https_request(self.ca_host, port, url, self.sec_dir, self.password, self.ipa_certificate_nickname, **kw)
+        result = dogtag.pooled_https_request(
+            self.ca_host, port, url, self.sec_dir, self.password,
+            self.ipa_certificate_nickname, **kw)
+        self.debug('CA connection pool: %s',
+                   dogtag.connection_pool.statistics())
+        return result
 
     def get_parse_result_xml(self, xml_text, parse_func):
         '''
@@ -1728,11 +1774,9 @@ class ra(rabase.rabase):
 
         return cmd_result
 
-    def find(self, options):
+    def _find_payload(self, options):
         """
-        Search for certificates
-
-        :param options: dictionary of search options
+        Return the CertSearchRequest document for the search options
         """
 
         def convert_time(value):
@@ -1742,8 +1786,6 @@ class ra(rabase.rabase):
             ts = time.strptime(value, '%Y-%m-%d')
             return int(time.mktime(ts) * 1000)
 
-        self.debug('%s.find()', self.fullname)
-
         # Create the root element
         page = etree.Element('CertSearchRequest')
 
@@ -1813,14 +1855,20 @@ class ra(rabase.rabase):
             e = etree.SubElement(page, opt)
             e.text = str(booloptions[opt]).lower()
 
-        payload = etree.tostring(doc, pretty_print=False, xml_declaration=True, encoding='UTF-8')
-        self.debug('%s.find(): request: %s', self.fullname, payload)
+        return etree.tostring(doc, pretty_print=False, xml_declaration=True, encoding='UTF-8')
 
-        url = 'http://%s/ca/rest/certs/search?size=%d' % (ipautil.format_netloc(self.ca_host, ipapython.dogtag.configured_constants().UNSECURE_PORT), options.get('sizelimit', 100))
+    def _find_page(self, payload, start, size):
+        """
+        Send a search for size certificates starting with the start-th
+        matching one and yield the certificates while the response is
+        being parsed.
+        """
+        url = 'http://%s/ca/rest/certs/search?start=%d&size=%d' % (ipautil.format_netloc(self.ca_host, ipapython.dogtag.configured_constants().UNSECURE_PORT), start, size)
+        self.debug('%s.find(): request: %s', self.fullname, url)
 
+        # The response is parsed as it arrives, don't ask for compression
         opener = urllib2.build_opener()
-        opener.addheaders = [('Accept-Encoding', 'gzip, deflate'),
-                             ('User-Agent', 'IPA')]
+        opener.addheaders = [('User-Agent', 'IPA')]
 
         req = urllib2.Request(url=url, data=payload, headers={'Content-Type': 'application/xml'})
         try:
@@ -1836,33 +1884,64 @@ class ra(rabase.rabase):
             self.raise_certificate_operation_error('find',
                                                    detail=e.reason)
 
-        data = response.readlines()
-        self.debug('%s.find(): response: %s', self.fullname, data)
-        parser = etree.XMLParser()
         try:
-            doc = etree.fromstring(data[0], parser)
+            for event, cert in etree.iterparse(response, tag='CertDataInfo'):
+                yield parse_cert_data_info(cert)
+                # Free the certificates parsed so far
+                cert.clear()
+                while cert.getprevious() is not None:
+                    del cert.getparent()[0]
         except etree.XMLSyntaxError, e:
             self.raise_certificate_operation_error('find',
                                                    detail=e.msg)
+        finally:
+            response.close()
 
-        # Grab all the certificates
-        certs = doc.xpath('//CertDataInfo')
+    def iter_find(self, options):
+        """
+        Search for certificates, yielding them as they are received
 
-        results = []
+        The certificates are requested in pages of find_page_size
+        certificates, every page is parsed incrementally. Raise
+        errors.LimitsExceeded after the last certificate if more than
+        options['sizelimit'] certificates matched.
 
-        for cert in certs:
-            response_request = {}
-            response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
-            response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
+        :param options: dictionary of search options
+        """
+        self.debug('%s.iter_find()', self.fullname)
+
+        payload = self._find_payload(options)
+        self.debug('%s.find(): request: %s', self.fullname, payload)
 
-            dn = cert.xpath('SubjectDN')
-            if len(dn) == 1:
-                response_request['subject'] = unicode(dn[0].text)
-            status = cert.xpath('Status')
-            if len(status) == 1:
-                response_request['status'] = unicode(status[0].text)
-            results.append(response_request)
+        start = options.get('start', 0)
+        sizelimit = options.get('sizelimit', 100)
+        count = 0
+        while True:
+            # Ask for one more certificate to find out if there are more
+            size = min(self.find_page_size, sizelimit - count + 1)
+            received = 0
+            for cert in self._find_page(payload, start, size):
+                received += 1
+                if count == sizelimit:
+                    raise errors.LimitsExceeded()
+                count += 1
+                yield cert
+            if received < size:
+                return
+            start += received
 
+    def find(self, options):
+        """
+        Search for certificates
+
+        :param options: dictionary of search options
+        """
+        results = []
+        try:
+            for cert in self.iter_find(options):
+                results.append(cert)
+        except errors.LimitsExceeded:
+            pass
         return results
 
 api.register(ra)
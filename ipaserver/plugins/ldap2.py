@@ -30,12 +30,17 @@ Backend plugin for LDAP.
 import os
 import re
 import pwd
+import time
+import threading
+import contextlib
 
 import krbV
 import ldap as _ldap
+from ldap.controls.libldap import MatchedValuesControl
 
 from ipapython.dn import DN
-from ipapython.ipaldap import SASL_GSSAPI, IPASimpleLDAPObject, LDAPClient
+from ipapython.ipaldap import (SASL_GSSAPI, IPASimpleLDAPObject, LDAPClient,
+    connection_pool, schema_cache)
 
 
 try:
@@ -55,6 +60,68 @@ except ImportError:
 from ipalib import api, errors
 from ipalib.crud import CrudBackend
 from ipalib.request import context
+from ipalib.krb_utils import KRB5_CCache, krb5_format_tgt_principal_name
+
+
+class IPAConfigCache(object):
+    """
+    Per-process cache of the IPA configuration entry.
+
+    A cached entry is used without asking the server for ttl seconds after
+    it was fetched or last validated. Once it is older, only its entryUSN
+    is read from the server and the whole entry is fetched again only if
+    the entryUSN changed.
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = dict(hits=0, validations=0, fetches=0)
+
+    def get(self, key):
+        """
+        Return (raw, usn, fresh) for the cached entry, None if there is
+        none. fresh is False if the entry must be validated first.
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is None:
+            return None
+        (raw, usn, timestamp) = cached
+        return (raw, usn, time.time() - timestamp < self.ttl)
+
+    def store(self, key, raw, usn):
+        with self._lock:
+            self._entries[key] = (raw, usn, time.time())
+
+    def touch(self, key):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries[key] = (cached[0], cached[1], time.time())
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def statistics(self):
+        """
+        Return a dict with the numbers of entries returned from the cache
+        (hits), returned after validating the entryUSN (validations) and
+        fetched from the server (fetches). avoided is the number of
+        fetches saved by the cache.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avoided'] = stats['hits'] + stats['validations']
+        return stats
+
+config_cache = IPAConfigCache()
 
 
 class ldap2(LDAPClient, CrudBackend):
@@ -92,6 +159,48 @@ class ldap2(LDAPClient, CrudBackend):
     def __str__(self):
         return self.ldap_uri
 
+    def _on_finalize(self):
+        super(ldap2, self)._on_finalize()
+        connection_pool.configure(
+            max_size=self.env.ldap_pool_size,
+            idle_timeout=self.env.ldap_pool_idle_timeout,
+            check_interval=self.env.ldap_pool_check_interval)
+        if self.env.ldap_schema_cache and self.env.dot_ipa:
+            schema_cache.configure(
+                cache_dir=os.path.join(self.env.dot_ipa, 'schema'))
+        config_cache.ttl = self.env.config_cache_ttl
+
+    def _use_connection_pool(self):
+        """
+        Only the shared instance in the server binds with the same
+        credentials over and over again, pool its connections.
+        """
+        return (self.id == self.name and api.env.context == 'server' and
+                api.env.ldap_pool_size > 0)
+
+    def _get_bind_token(self, ccache):
+        """
+        Return the TGT times from ccache, they change whenever the
+        credentials are renewed. None if they can't be determined.
+        """
+        try:
+            cc = KRB5_CCache(ccache)
+            return cc.get_credential_times(
+                krb5_format_tgt_principal_name(api.env.realm))
+        except (KeyError, ValueError, krbV.Krb5Error):
+            return None
+
+    @contextlib.contextmanager
+    def error_handler(self, arg_desc=None):
+        try:
+            with super(ldap2, self).error_handler(arg_desc):
+                yield
+        except errors.NetworkError:
+            # never hand a dead connection out of the pool again
+            if self.isconnected():
+                connection_pool.discard(self.conn)
+            raise
+
     def create_connection(self, ccache=None, bind_dn=None, bind_pw='',
             tls_cacertfile=None, tls_certfile=None, tls_keyfile=None,
             debug_level=0, autobind=False):
@@ -109,6 +218,10 @@ class ldap2(LDAPClient, CrudBackend):
         tls_keyfile - TLS bind key filename
         autobind - autobind as the current user
 
+        When running in the server, connections bound with a Kerberos
+        ccache are taken from and returned to the per-process connection
+        pool, see `ipapython.ipaldap.LDAPConnectionPool`.
+
         Extends backend.Connectible.create_connection.
         """
         if bind_dn is None:
@@ -124,6 +237,30 @@ class ldap2(LDAPClient, CrudBackend):
         if debug_level:
             _ldap.set_option(_ldap.OPT_DEBUG_LEVEL, debug_level)
 
+        pool_key = bind_token = None
+        if ccache is not None:
+            if isinstance(ccache, krbV.CCache):
+                principal = ccache.principal().name
+                # Get a fully qualified CCACHE name (schema+name)
+                # As we do not use the krbV.CCache object later,
+                # we can safely overwrite it
+                ccache = "%(type)s:%(name)s" % dict(type=ccache.type,
+                                                    name=ccache.name)
+            else:
+                principal = krbV.CCache(name=ccache,
+                    context=krbV.default_context()).principal().name
+
+            os.environ['KRB5CCNAME'] = ccache
+
+            if self._use_connection_pool():
+                pool_key = (self.ldap_uri, principal)
+                bind_token = self._get_bind_token(ccache)
+                if bind_token is not None:
+                    conn = connection_pool.acquire(pool_key, bind_token)
+                    if conn is not None:
+                        setattr(context, 'principal', principal)
+                        return conn
+
         with self.error_handler():
             force_updates = api.env.context in ('installer', 'updates')
             conn = IPASimpleLDAPObject(
@@ -140,20 +277,10 @@ class ldap2(LDAPClient, CrudBackend):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
             if ccache is not None:
-                if isinstance(ccache, krbV.CCache):
-                    principal = ccache.principal().name
-                    # Get a fully qualified CCACHE name (schema+name)
-                    # As we do not use the krbV.CCache object later,
-                    # we can safely overwrite it
-                    ccache = "%(type)s:%(name)s" % dict(type=ccache.type,
-                                                        name=ccache.name)
-                else:
-                    principal = krbV.CCache(name=ccache,
-                        context=krbV.default_context()).principal().name
-
-                os.environ['KRB5CCNAME'] = ccache
                 conn.sasl_interactive_bind_s(None, SASL_GSSAPI)
                 setattr(context, 'principal', principal)
+                if pool_key is not None:
+                    connection_pool.track(conn, pool_key, bind_token)
             else:
                 # no kerberos ccache, use simple bind or external sasl
                 if autobind:
@@ -167,15 +294,29 @@ class ldap2(LDAPClient, CrudBackend):
 
     def destroy_connection(self):
         """Disconnect from LDAP server."""
+        if connection_pool.release(self.conn):
+            self.debug('LDAP connection returned to pool: %s',
+                       connection_pool.statistics())
+            return
         try:
             self.conn.unbind_s()
         except _ldap.LDAPError:
             # ignore when trying to unbind multiple times
             pass
 
-    def find_entries(self, filter=None, attrs_list=None, base_dn=None,
+    def iter_entries(self, filter=None, attrs_list=None, base_dn=None,
                      scope=_ldap.SCOPE_SUBTREE, time_limit=None,
-                     size_limit=None, search_refs=False, paged_search=False):
+                     size_limit=None, search_refs=False, paged_search=False,
+                     serverctrls=None):
+        """
+        Return an iterator of the entries matching the search parameters,
+        see LDAPClient.iter_entries.
+
+        If memberindirect or memberofindirect is requested, all entries are
+        read and their indirect membership is resolved before this method
+        returns. errors.LimitsExceeded raised while resolving it is raised
+        by this method, so it is not mistaken for a truncated search.
+        """
         if time_limit is None or size_limit is None:
             config = self.get_ipa_config()
             if time_limit is None:
@@ -193,21 +334,175 @@ class ldap2(LDAPClient, CrudBackend):
                 has_memberofindirect = True
                 attrs_list.remove('memberofindirect')
 
-        res, truncated = super(ldap2, self).find_entries(
+        entries = super(ldap2, self).iter_entries(
             filter=filter, attrs_list=attrs_list, base_dn=base_dn, scope=scope,
             time_limit=time_limit, size_limit=size_limit,
-            search_refs=search_refs, paged_search=paged_search)
+            search_refs=search_refs, paged_search=paged_search,
+            serverctrls=serverctrls)
+
+        if not has_memberindirect and not has_memberofindirect:
+            return entries
+
+        # Resolving indirect membership needs further searches, do not
+        # interleave them with the outstanding one
+        res = []
+        truncated = False
+        try:
+            for entry in entries:
+                res.append(entry)
+        except errors.LimitsExceeded:
+            truncated = True
+
+        batch_size = self.indirect_batch_size
+        for i in xrange(0, len(res), batch_size):
+            batch = res[i:i + batch_size]
+            if has_memberindirect:
+                self._process_memberindirect_batch(
+                    batch, time_limit=time_limit, size_limit=size_limit)
+            if has_memberofindirect:
+                self._process_memberofindirect_batch(
+                    batch, time_limit=time_limit, size_limit=size_limit)
+
+        return self._iter_resolved(res, truncated)
+
+    def _iter_resolved(self, entries, truncated):
+        for entry in entries:
+            yield entry
+        if truncated:
+            raise errors.LimitsExceeded()
+
+    # Number of entries whose indirect membership is resolved by a single
+    # search
+    indirect_batch_size = 100
+
+    def _find_indirect(self, filter, attrs_list, count, time_limit=None,
+                       size_limit=None, serverctrls=None):
+        """
+        Search the whole tree for entries needed to resolve indirect
+        membership of a batch of count entries.
+
+        The per-entry size limit is checked by the caller. If the search
+        returns more than count * size_limit entries, the limit is exceeded
+        for at least one entry of the batch, so the search is limited to
+        that.
+        """
+        if size_limit:
+            size_limit = int(size_limit) * count
+        try:
+            result, truncated = self.find_entries(
+                base_dn=self.api.env.basedn,
+                filter=filter,
+                attrs_list=attrs_list,
+                time_limit=time_limit,
+                size_limit=size_limit,
+                paged_search=True,
+                serverctrls=serverctrls)
+        except errors.NotFound:
+            return []
+        if truncated:
+            raise errors.LimitsExceeded()
+        return result
+
+    def _process_memberindirect_batch(self, group_entries, time_limit=None,
+                                      size_limit=None):
+        """
+        Set memberindirect of all group_entries using a single search.
+
+        The result is the same as if _process_memberindirect was called for
+        every entry.
+        """
+        if len(group_entries) == 1:
+            self._process_memberindirect(
+                group_entries[0], time_limit=time_limit, size_limit=size_limit)
+            return
+
+        indirect = dict((entry.dn, set()) for entry in group_entries)
+        count = dict.fromkeys(indirect, 0)
+        filter = self.make_filter_from_attr('memberof', indirect.keys())
+        result = self._find_indirect(
+            filter, ['member', 'memberof'], len(group_entries),
+            time_limit=time_limit, size_limit=size_limit)
 
-        if has_memberindirect or has_memberofindirect:
-            for entry in res:
-                if has_memberindirect:
+        for entry in result:
+            groups = [dn for dn in entry.get('memberof', []) if dn in indirect]
+            if not groups:
+                # memberof is not readable, map the result back per entry
+                for group_entry in group_entries:
                     self._process_memberindirect(
-                        entry, time_limit=time_limit, size_limit=size_limit)
-                if has_memberofindirect:
+                        group_entry, time_limit=time_limit,
+                        size_limit=size_limit)
+                return
+            members = entry.get('member', [])
+            for dn in groups:
+                count[dn] += 1
+                indirect[dn].update(members)
+
+        if size_limit and max(count.itervalues()) > size_limit:
+            raise errors.LimitsExceeded()
+
+        for group_entry in group_entries:
+            group_indirect = indirect[group_entry.dn]
+            group_indirect.difference_update(group_entry.get('member', []))
+            if group_indirect:
+                group_entry['memberindirect'] = list(group_indirect)
+
+    def _process_memberofindirect_batch(self, entries, time_limit=None,
+                                        size_limit=None):
+        """
+        Set memberofindirect of all entries using a single search.
+
+        The result is the same as if _process_memberofindirect was called for
+        every entry.
+        """
+        if len(entries) == 1:
+            self._process_memberofindirect(
+                entries[0], time_limit=time_limit, size_limit=size_limit)
+            return
+
+        member_attrs = ['member', 'memberuser', 'memberhost']
+        groups = dict((entry.dn, []) for entry in entries)
+        dns = groups.keys()
+        filter = self.make_filter(
+            dict((attr, dns) for attr in member_attrs))
+        # Only the member values which are entries of the batch are needed,
+        # not all members of every group
+        values_filter = '(%s)' % ''.join(
+            self.make_filter_from_attr(attr, dn)
+            for attr in member_attrs for dn in dns)
+        result = self._find_indirect(
+            filter, member_attrs, len(entries), time_limit=time_limit,
+            size_limit=size_limit,
+            serverctrls=[MatchedValuesControl(False, values_filter)])
+
+        for group_entry in result:
+            matched = set()
+            for attr in member_attrs:
+                matched.update(
+                    dn for dn in group_entry.get(attr, []) if dn in groups)
+            if not matched:
+                # member attributes are not readable, map the result back
+                # per entry
+                for entry in entries:
                     self._process_memberofindirect(
                         entry, time_limit=time_limit, size_limit=size_limit)
+                return
+            for dn in matched:
+                groups[dn].append(group_entry.dn)
+
+        if size_limit and max(len(g) for g in groups.itervalues()) > size_limit:
+            raise errors.LimitsExceeded()
 
-        return (res, truncated)
+        for entry in entries:
+            direct = set()
+            indirect = set(entry.get('memberof', []))
+            for dn in groups[entry.dn]:
+                if dn in indirect:
+                    indirect.remove(dn)
+                    direct.add(dn)
+
+            if indirect:
+                entry['memberof'] = list(direct)
+                entry['memberofindirect'] = list(indirect)
 
     def _process_memberindirect(self, group_entry, time_limit=None,
                                 size_limit=None):
@@ -264,7 +559,12 @@ class ldap2(LDAPClient, CrudBackend):
 
     config_defaults = {'ipasearchtimelimit': [2], 'ipasearchrecordslimit': [0]}
     def get_ipa_config(self, attrs_list=None):
-        """Returns the IPA configuration entry (dn, entry_attrs)."""
+        """Returns the IPA configuration entry (dn, entry_attrs).
+
+        The entry is fetched at most once per request. It is shared between
+        requests of the same principal in the process through
+        `IPAConfigCache`, see the config_cache_ttl option.
+        """
 
         dn = api.Object.config.get_dn()
         assert isinstance(dn, DN)
@@ -272,25 +572,89 @@ class ldap2(LDAPClient, CrudBackend):
         try:
             config_entry = getattr(context, 'config_entry')
             if config_entry.conn is self.conn:
+                config_cache.count('hits')
                 return config_entry.clone()
         except AttributeError:
             # Not in our context yet
             pass
+
+        # What the entry contains depends on the access rights of the
+        # principal
+        key = (self.ldap_uri, getattr(context, 'principal', None), dn)
+        raw = None
+        cached = config_cache.get(key)
+        if cached is not None:
+            (raw, usn, fresh) = cached
+            if fresh:
+                config_cache.count('hits')
+            elif usn is not None and self._get_ipa_config_usn(dn) == usn:
+                config_cache.touch(key)
+                config_cache.count('validations')
+            else:
+                raw = None
+        if raw is None:
+            (raw, usn) = self._fetch_ipa_config(dn, attrs_list)
+            config_cache.store(key, raw, usn)
+            config_cache.count('fetches')
+
+        config_entry = self.make_entry(dn)
+        for (attr, values) in raw.iteritems():
+            config_entry.raw[attr] = list(values)
+        for a in self.config_defaults:
+            if a not in config_entry:
+                config_entry[a] = self.config_defaults[a]
+        context.config_entry = config_entry.clone()
+        return config_entry
+
+    def _fetch_ipa_config(self, dn, attrs_list=None):
+        """
+        Return the raw attributes and the entryUSN of the configuration
+        entry.
+        """
+        fetch_attrs = ['*', 'entryusn']
+        if attrs_list:
+            fetch_attrs.extend(attrs_list)
         try:
             (entries, truncated) = self.find_entries(
-                None, attrs_list, base_dn=dn, scope=self.SCOPE_BASE,
+                None, fetch_attrs, base_dn=dn, scope=self.SCOPE_BASE,
                 time_limit=2, size_limit=10
             )
             if truncated:
                 raise errors.LimitsExceeded()
-            config_entry = entries[0]
         except errors.NotFound:
-            config_entry = self.make_entry(dn)
-        for a in self.config_defaults:
-            if a not in config_entry:
-                config_entry[a] = self.config_defaults[a]
-        context.config_entry = config_entry.clone()
-        return config_entry
+            return ({}, None)
+        raw = {}
+        usn = None
+        for (attr, values) in entries[0].raw.iteritems():
+            if attr.lower() == 'entryusn':
+                usn = values
+            else:
+                raw[attr] = values
+        return (raw, usn)
+
+    def _get_ipa_config_usn(self, dn):
+        """
+        Return the entryUSN of the configuration entry, None if unknown.
+        """
+        try:
+            (entries, truncated) = self.find_entries(
+                None, ['entryusn'], base_dn=dn, scope=self.SCOPE_BASE,
+                time_limit=2, size_limit=10
+            )
+        except errors.NotFound:
+            return None
+        return entries[0].raw.get('entryusn')
+
+    def invalidate_ipa_config(self):
+        """
+        Drop the cached IPA configuration entry, the next call to
+        get_ipa_config fetches it from the server.
+        """
+        config_cache.invalidate()
+        try:
+            del context.config_entry
+        except AttributeError:
+            pass
 
     def has_upg(self):
         """Returns True/False whether User-Private Groups are enabled.
@@ -312,6 +676,15 @@ class ldap2(LDAPClient, CrudBackend):
         except _ldap.NO_SUCH_OBJECT, e:
             return False
 
+    def get_effective_rights_control(self):
+        """Returns a control requesting the rights the currently bound user
+           has for the entries returned by a search.
+        """
+        principal = getattr(context, 'principal')
+        entry = self.find_entry_by_attr("krbprincipalname", principal,
+            "krbPrincipalAux", base_dn=api.env.basedn)
+        return GetEffectiveRightsControl(True, "dn: " + str(entry.dn))
+
     def get_effective_rights(self, dn, attrs_list):
         """Returns the rights the currently bound user has for the given DN.
 
@@ -321,10 +694,7 @@ class ldap2(LDAPClient, CrudBackend):
 
         assert isinstance(dn, DN)
 
-        principal = getattr(context, 'principal')
-        entry = self.find_entry_by_attr("krbprincipalname", principal,
-            "krbPrincipalAux", base_dn=api.env.basedn)
-        sctrl = [GetEffectiveRightsControl(True, "dn: " + str(entry.dn))]
+        sctrl = [self.get_effective_rights_control()]
         self.conn.set_option(_ldap.OPT_SERVER_CONTROLS, sctrl)
         entry = self.get_entry(dn, attrs_list)
         # remove the control so subsequent operations don't include GER
@@ -470,6 +840,128 @@ class ldap2(LDAPClient, CrudBackend):
         except errors.MidairCollision:
             raise errors.NotGroupMember()
 
+    # maximum number of values in a single existence check search
+    existence_check_batch_size = 100
+
+    def _find_existing_entries(self, dns):
+        """
+        Return a dict mapping DNs from dns which exist to their DN as
+        returned by the server.
+
+        Entries in the same container are looked up with a single one-level
+        search for their RDN values.
+        """
+        existing = {}
+        containers = {}
+        for dn in dns:
+            if len(dn) > 1 and len(dn[0]) == 1:
+                key = (DN(*dn[1:]), dn[0].attr.lower())
+                containers.setdefault(key, []).append(dn)
+            elif dn not in existing:
+                try:
+                    existing[dn] = self.get_entry(dn, ['']).dn
+                except errors.NotFound:
+                    pass
+
+        size = self.existence_check_batch_size
+        for ((parent_dn, attr), container_dns) in containers.iteritems():
+            wanted = set(container_dns)
+            for i in xrange(0, len(container_dns), size):
+                values = [dn[0].value for dn in container_dns[i:i + size]]
+                filter = self.make_filter_from_attr(attr, values)
+                try:
+                    entries = self.iter_entries(
+                        filter, [''], parent_dn, self.SCOPE_ONELEVEL,
+                        time_limit=-1, size_limit=-1)
+                    for entry in entries:
+                        if entry.dn in wanted:
+                            existing[entry.dn] = entry.dn
+                except errors.NotFound:
+                    # the container does not exist
+                    pass
+        return existing
+
+    def add_entries_to_group(self, dns, group_dn, member_attr='member',
+                             allow_same=False):
+        """
+        Add entries designated by dns to group group_dn in the member
+        attribute member_attr.
+
+        All entries are added with a single modify operation. If it fails,
+        they are added one by one to find out which ones can't be added.
+
+        Return a list of (dn, error) for entries which were not added,
+        error is the exception add_entry_to_group would raise for dn.
+        """
+        assert isinstance(group_dn, DN)
+
+        self.log.debug(
+            "add_entries_to_group: %d entries group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        failed = {}
+        existing = self._find_existing_entries(dns)
+        members = []
+        for (i, dn) in enumerate(dns):
+            assert isinstance(dn, DN)
+            if dn not in existing:
+                failed[i] = errors.NotFound(reason='no such entry')
+            elif existing[dn] == group_dn and not allow_same:
+                failed[i] = errors.SameGroupError()
+            else:
+                members.append((i, existing[dn]))
+
+        if members:
+            modlist = [(_ldap.MOD_ADD, member_attr, [m for (i, m) in members])]
+            try:
+                with self.error_handler():
+                    self.conn.modify_s(group_dn, modlist)
+            except errors.PublicError:
+                for (i, member) in members:
+                    modlist = [(_ldap.MOD_ADD, member_attr, [member])]
+                    try:
+                        try:
+                            with self.error_handler():
+                                self.conn.modify_s(group_dn, modlist)
+                        except errors.DatabaseError:
+                            raise errors.AlreadyGroupMember()
+                    except errors.PublicError, e:
+                        failed[i] = e
+
+        return [(dns[i], failed[i]) for i in sorted(failed)]
+
+    def remove_entries_from_group(self, dns, group_dn, member_attr='member'):
+        """
+        Remove entries designated by dns from group group_dn.
+
+        All entries are removed with a single modify operation. If it fails,
+        they are removed one by one to find out which ones can't be removed.
+
+        Return a list of (dn, error) for entries which were not removed,
+        error is the exception remove_entry_from_group would raise for dn.
+        """
+        assert isinstance(group_dn, DN)
+
+        self.log.debug(
+            "remove_entries_from_group: %d entries group_dn=%s "
+            "member_attr=%s", len(dns), group_dn, member_attr)
+
+        if not dns:
+            return []
+
+        failed = []
+        modlist = [(_ldap.MOD_DELETE, member_attr, list(dns))]
+        try:
+            with self.error_handler():
+                self.conn.modify_s(group_dn, modlist)
+        except errors.PublicError:
+            for dn in dns:
+                try:
+                    self.remove_entry_from_group(dn, group_dn, member_attr)
+                except errors.PublicError, e:
+                    failed.append((dn, e))
+        return failed
+
     def set_entry_active(self, dn, active):
         """Mark entry active/inactive."""
 
@@ -117,3 +117,14 @@ class rabase(Backend):
         :param options: dictionary of search options
         """
         raise errors.NotImplementedError(name='%s.find' % self.name)
+
+    def iter_find(self, options):
+        """
+        Search for certificates, yielding them one at a time
+
+        Raise errors.LimitsExceeded after the last certificate if more
+        certificates than options['sizelimit'] matched.
+
+        :param options: dictionary of search options
+        """
+        raise errors.NotImplementedError(name='%s.iter_find' % self.name)
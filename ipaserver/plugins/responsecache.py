@@ -0,0 +1,182 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Backend plugin caching responses of read-only commands.
+
+Commands which set `Command.cache_response` (the LDAP retrieve and search
+commands) are executed through the `response_cache` backend when the
+response_cache option is enabled. Responses are cached per process, keyed
+by the principal, the command name, its arguments and options and the API
+version.
+
+A cached response is only valid as long as the directory did not change.
+Every response is stored with the lastusn high-water mark read from the
+root DSE of the directory server (the entryUSN plugin is enabled on IPA
+servers), and is returned only if lastusn still has the same value. If
+lastusn cannot be read, nothing is cached. In addition, every other
+command executed by the process flushes the cached responses of commands
+of the same object.
+"""
+
+import threading
+import collections
+from copy import deepcopy
+
+import ldap as _ldap
+
+from ipalib import api
+from ipalib import Backend
+from ipalib.request import context
+from ipapython.dn import DN
+
+
+class response_cache(Backend):
+    """
+    Cache responses of read-only commands, see the module documentation.
+    """
+
+    def __init__(self):
+        super(response_cache, self).__init__()
+        self.__lock = threading.Lock()
+        self.__responses = collections.OrderedDict()
+        self.__statistics = {}
+
+    def _on_finalize(self):
+        super(response_cache, self)._on_finalize()
+        self.enabled = self.env.response_cache
+        self.max_size = self.env.response_cache_size
+
+    def execute(self, command, *args, **options):
+        """
+        Execute the command, return its response from the cache if
+        possible.
+        """
+        if not self.enabled:
+            return command.execute(*args, **options)
+
+        if not command.cache_response:
+            # The command may change the directory, read lastusn again in
+            # this request and drop what is known to be affected.
+            context.response_cache_usn = None
+            if command.obj is not None:
+                self.flush(command.obj.name)
+            return command.execute(*args, **options)
+
+        usn = self._get_usn()
+        if usn is None:
+            return command.execute(*args, **options)
+
+        key = self._get_key(command, args, options)
+        with self.__lock:
+            cached = self.__responses.pop(key, None)
+            if cached is not None and cached[1] == usn:
+                self.__responses[key] = cached
+            else:
+                cached = None
+
+        if cached is not None:
+            self._count(command.name, 'hits')
+            return deepcopy(cached[2])
+
+        self._count(command.name, 'misses')
+        result = command.execute(*args, **options)
+
+        obj_name = command.obj.name if command.obj is not None else None
+        with self.__lock:
+            self.__responses[key] = (obj_name, usn, deepcopy(result))
+            while len(self.__responses) > self.max_size:
+                self.__responses.popitem(last=False)
+        return result
+
+    def _get_key(self, command, args, options):
+        principal = getattr(context, 'principal', None)
+        return repr((principal, command.name, args,
+                     sorted(options.iteritems()),
+                     options.get('version')))
+
+    def _get_usn(self):
+        """
+        Return the lastusn high-water mark of the directory, None if it
+        is unknown. It is read once per request unless a command which
+        may change the directory is executed.
+        """
+        usn = getattr(context, 'response_cache_usn', None)
+        if usn is not None:
+            return usn
+
+        ldap = self.Backend.ldap2
+        if not ldap.isconnected():
+            return None
+        try:
+            entries = ldap.conn.search_s(
+                DN(), _ldap.SCOPE_BASE, attrlist=['lastusn'])
+        except _ldap.LDAPError, e:
+            self.debug('unable to read lastusn: %s', e)
+            return None
+        if not entries:
+            return None
+
+        usn = []
+        for attr, values in entries[0].raw.iteritems():
+            if attr.lower().startswith('lastusn'):
+                usn.append((attr.lower(), tuple(values)))
+        if not usn:
+            return None
+
+        usn = tuple(sorted(usn))
+        context.response_cache_usn = usn
+        return usn
+
+    def _count(self, name, counter):
+        with self.__lock:
+            stats = self.__statistics.setdefault(name,
+                                                 dict(hits=0, misses=0))
+            stats[counter] += 1
+            total = stats['hits'] + stats['misses']
+            self.debug('response cache %s: %s, hit ratio %d/%d',
+                       'hit' if counter == 'hits' else 'miss',
+                       name, stats['hits'], total)
+
+    def flush(self, obj_name=None):
+        """
+        Drop the cached responses of commands of the object, or all cached
+        responses if obj_name is None.
+        """
+        with self.__lock:
+            if obj_name is None:
+                self.__responses.clear()
+                return
+            for key, cached in self.__responses.items():
+                if cached[0] == obj_name:
+                    del self.__responses[key]
+
+    def statistics(self):
+        """
+        Return a dict mapping command names to dicts with the number of
+        cache hits, misses and the hit ratio.
+        """
+        with self.__lock:
+            result = {}
+            for name, stats in self.__statistics.iteritems():
+                total = stats['hits'] + stats['misses']
+                result[name] = dict(
+                    hits=stats['hits'],
+                    misses=stats['misses'],
+                    ratio=float(stats['hits']) / total if total else 0.0)
+            return result
+
+api.register(response_cache)
@@ -42,8 +42,8 @@ from ipalib.rpc import (xml_dumps, xml_loads,
 from ipalib.util import parse_time_duration, normalize_name
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
-from ipalib.session import (session_mgr, AuthManager, get_ipa_ccache_name,
-    load_ccache_data, bind_ipa_ccache, release_ipa_ccache, fmt_time,
+from ipalib.session import (session_mgr, session_ccaches, AuthManager,
+    LocalSessionTier, get_ipa_ccache_name, load_ccache_data, release_ipa_ccache, fmt_time,
     default_max_session_duration)
 from ipalib.backend import Backend
 from ipalib.krb_utils import (
@@ -537,6 +537,16 @@ class KerberosSession(object):
             self.error('unable to parse session_auth_duration, defaulting to %d: %s',
                        self.session_auth_duration, e)
 
+        session_ccaches.max_size = self.api.env.session_ccache_cache_size
+
+        local_tier = None
+        if self.api.env.session_local_cache_ttl > 0:
+            local_tier = LocalSessionTier(
+                ttl=self.api.env.session_local_cache_ttl)
+        session_mgr.configure(
+            write_interval=self.api.env.session_write_interval,
+            local_tier=local_tier)
+
     def update_session_expiration(self, session_data, krb_endtime):
         '''
         Each time a session is created or accessed we need to update
@@ -720,14 +730,15 @@ class jsonserver_session(jsonserver, KerberosSession):
             self.debug('no ccache, need login')
             return self.need_login(start_response)
 
-        ipa_ccache_name = bind_ipa_ccache(ccache_data)
+        ipa_ccache_name = session_ccaches.bind(session_id, ccache_data)
 
         # Redirect to login if Kerberos credentials are expired
         cc = KRB5_CCache(ipa_ccache_name)
         if not cc.valid(self.api.env.host, self.api.env.realm):
             self.debug('ccache expired, deleting session, need login')
             # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
+            session_ccaches.release(session_id, ipa_ccache_name)
+            session_ccaches.discard(session_id)
             return self.need_login(start_response)
 
         # Update the session expiration based on the Kerberos expiration
@@ -756,12 +767,20 @@ class jsonserver_session(jsonserver, KerberosSession):
             # during the execution of the command. For example the
             # logout command removes the ccache data from the session
             # data to invalidate the session credentials.
+            #
+            # The ccache is kept materialized for the next request of the
+            # session, the session data is only updated if the ccache
+            # was actually modified.
 
             if session_data.has_key('ccache_data'):
-                session_data['ccache_data'] = load_ccache_data(ipa_ccache_name)
-
-            # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
+                ccache_data = session_ccaches.load(session_id, ipa_ccache_name)
+                if ccache_data is not None:
+                    session_data['ccache_data'] = ccache_data
+
+            # The request is finished with the ccache.
+            session_ccaches.release(session_id, ipa_ccache_name)
+            if not session_data.has_key('ccache_data'):
+                session_ccaches.discard(session_id)
             # Store the session data.
             session_mgr.store_session_data(session_data)
             destroy_context()
@@ -1105,14 +1124,15 @@ class xmlserver_session(xmlserver, KerberosSession):
             self.debug('xmlserver_session.__call_: no ccache, need TGT')
             return self.need_login(start_response)
 
-        ipa_ccache_name = bind_ipa_ccache(ccache_data)
+        ipa_ccache_name = session_ccaches.bind(session_id, ccache_data)
 
         # Redirect to /ipa/xml if Kerberos credentials are expired
         cc = KRB5_CCache(ipa_ccache_name)
         if not cc.valid(self.api.env.host, self.api.env.realm):
             self.debug('xmlserver_session.__call_: ccache expired, deleting session, need login')
             # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
+            session_ccaches.release(session_id, ipa_ccache_name)
+            session_ccaches.discard(session_id)
             return self.need_login(start_response)
 
         # Update the session expiration based on the Kerberos expiration
@@ -1137,12 +1157,20 @@ class xmlserver_session(xmlserver, KerberosSession):
             # during the execution of the command. For example the
             # logout command removes the ccache data from the session
             # data to invalidate the session credentials.
+            #
+            # The ccache is kept materialized for the next request of the
+            # session, the session data is only updated if the ccache
+            # was actually modified.
 
             if session_data.has_key('ccache_data'):
-                session_data['ccache_data'] = load_ccache_data(ipa_ccache_name)
-
-            # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
+                ccache_data = session_ccaches.load(session_id, ipa_ccache_name)
+                if ccache_data is not None:
+                    session_data['ccache_data'] = ccache_data
+
+            # The request is finished with the ccache.
+            session_ccaches.release(session_id, ipa_ccache_name)
+            if not session_data.has_key('ccache_data'):
+                session_ccaches.discard(session_id)
             # Store the session data.
             session_mgr.store_session_data(session_data)
             destroy_context()
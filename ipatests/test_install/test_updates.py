@@ -22,12 +22,15 @@ Test the `ipaserver/install/ldapupdate.py` module.
 
 import unittest
 import os
+import shutil
+import tempfile
 
 import nose
 
 from ipalib import api
 from ipalib import errors
-from ipaserver.install.ldapupdate import LDAPUpdate, BadSyntax
+from ipaserver.install.ldapupdate import (
+    LDAPUpdate, BadSyntax, UpdateCache, get_update_groups)
 from ipaserver.install import installutils
 from ipapython import ipautil, ipaldap
 from ipapython.dn import DN
@@ -335,3 +338,95 @@ class test_update(unittest.TestCase):
         with self.assertRaises(errors.NotFound):
             entries = self.ld.get_entries(
                 self.user_dn, self.ld.SCOPE_BASE, 'objectclass=*', ['*'])
+
+
+class test_update_groups(unittest.TestCase):
+    """
+    Test the grouping of updates for concurrent application.
+    """
+
+    def test_groups(self):
+        suffix = DN(('dc', 'example'), ('dc', 'com'))
+        accounts = DN(('cn', 'accounts'), suffix)
+        users = DN(('cn', 'users'), accounts)
+        user = DN(('uid', 'tuser'), users)
+        etc = DN(('cn', 'etc'), suffix)
+        index = DN(('cn', 'uid'), ('cn', 'index'), ('cn', 'userRoot'),
+                   ('cn', 'ldbm database'), ('cn', 'plugins'),
+                   ('cn', 'config'))
+        plugin = DN(('cn', 'MemberOf Plugin'), ('cn', 'plugins'),
+                    ('cn', 'config'))
+        schema = DN(('cn', 'schema'))
+        all_updates = dict((dn, {'dn': dn}) for dn in
+                           (user, accounts, etc, index, plugin, schema))
+
+        (schema_phase, config_phase, data_phase) = get_update_groups(
+            all_updates)
+        self.assertEqual(schema_phase, [[(schema, {'dn': schema})]])
+        self.assertEqual(sorted(config_phase), sorted([
+            [(index, {'dn': index})],
+            [(plugin, {'dn': plugin})],
+        ]))
+        self.assertEqual(sorted(data_phase), sorted([
+            [(accounts, {'dn': accounts}), (user, {'dn': user})],
+            [(etc, {'dn': etc})],
+        ]))
+
+    def test_empty(self):
+        self.assertEqual(get_update_groups({}), [])
+
+
+class test_update_cache(unittest.TestCase):
+    """
+    Test the cache of parsed update files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.filename = os.path.join(self.tmpdir, 'test.update')
+        self.data = ['dn: cn=test,$SUFFIX\n', 'add: cn: ${CN}\n']
+        with open(self.filename, 'w') as f:
+            f.writelines(self.data)
+        self.sub_dict = {'SUFFIX': DN(('dc', 'example'), ('dc', 'com')),
+                         'CN': 'test', 'TIME': 1}
+        self.dn = DN(('cn', 'test'), self.sub_dict['SUFFIX'])
+        self.updates = [{'dn': self.dn, 'updates': ['add:cn:test']}]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_variables(self):
+        self.assertEqual(UpdateCache.get_variables(self.data),
+                         ['CN', 'SUFFIX'])
+        self.assertEqual(UpdateCache.get_variables(['$$ $ ${A}$B']),
+                         ['A', 'B'])
+
+    def test_cached(self):
+        cache = UpdateCache()
+        self.assertEqual(cache.get(self.filename, self.sub_dict), None)
+        cache.store(self.filename, self.data, self.sub_dict, self.updates)
+        self.assertEqual(cache.get(self.filename, self.sub_dict),
+                         self.updates)
+
+        # unused variables don't matter
+        sub_dict = dict(self.sub_dict, TIME=2)
+        self.assertEqual(cache.get(self.filename, sub_dict), self.updates)
+
+        sub_dict = dict(self.sub_dict, CN='other')
+        self.assertEqual(cache.get(self.filename, sub_dict), None)
+
+    def test_file_changed(self):
+        cache = UpdateCache()
+        cache.store(self.filename, self.data, self.sub_dict, self.updates)
+        with open(self.filename, 'a') as f:
+            f.write('add: description: changed\n')
+        self.assertEqual(cache.get(self.filename, self.sub_dict), None)
+
+    def test_persisted(self):
+        UpdateCache(self.cache_dir).store(
+            self.filename, self.data, self.sub_dict, self.updates)
+        updates = UpdateCache(self.cache_dir).get(
+            self.filename, self.sub_dict)
+        self.assertEqual(updates, self.updates)
+        self.assertTrue(isinstance(updates[0]['dn'], DN))
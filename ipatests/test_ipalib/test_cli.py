@@ -68,6 +68,22 @@ def test_from_cli():
     assert f('user-add') == 'user_add'
 
 
+def test_get_plugin_commands():
+    """
+    Test the `ipalib.cli.get_plugin_commands` function.
+    """
+    f = cli.get_plugin_commands
+    assert f([]) == ()
+    assert f(['help']) == ()
+    assert f(['help', '--help']) == ()
+    assert f(['user-show', 'admin']) == ('user_show',)
+    assert f(['help', 'user-show']) == ('user_show',)
+    assert f(['help', 'topics']) == ('topics',)
+    assert f(['console']) is None
+    assert f(['show-mappings', 'user-show']) is None
+    assert f(['plugins']) is None
+
+
 def get_cmd_name(i):
     return 'cmd_%d' % i
 
@@ -0,0 +1,151 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the cold start of the ``ipa`` command.
+
+Every run starts a new Python interpreter which bootstraps the API, loads
+and finalizes the plugins and runs the CLI up to the point where the server
+would be contacted. Run this module directly to print the startup times with
+and without the plugin manifest:
+
+    python ipatests/test_ipalib/test_cli_startup.py [ITERATIONS]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import ipalib
+
+# ``ipa help`` and ``ipa user-show --help`` need no server
+PATHS = (
+    ('help',),
+    ('user-show', '--help'),
+)
+
+STARTUP_SCRIPT = """
+import sys
+from ipalib import api, cli
+argv = sys.argv[2:]
+api.bootstrap(context='cli', in_server=False, lazy_plugins=sys.argv[1])
+for klass in cli.cli_plugins:
+    api.register(klass)
+api.load_plugins(cli.get_plugin_commands(argv))
+api.finalize()
+try:
+    api.Backend.cli.run(argv)
+except SystemExit:
+    pass
+sys.stderr.write('%d\\n' % len(
+    [name for (name, module) in sys.modules.items()
+     if name.startswith('ipalib.plugins.') and module is not None]))
+"""
+
+COMMANDS_SCRIPT = """
+import sys
+from ipalib import api
+api.bootstrap(context='cli', in_server=False, lazy_plugins=True)
+api.load_plugins(sys.argv[1:])
+api.finalize()
+sys.stdout.write('\\n'.join(sorted(api.Command)))
+"""
+
+
+def run_python(script, args):
+    """
+    Run ``script`` with ``args`` in a new interpreter, return its output.
+    """
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(ipalib.__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [src_dir] + filter(None, [env.get('PYTHONPATH')]))
+    p = subprocess.Popen(
+        [sys.executable, '-c', script] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    (stdout, stderr) = p.communicate()
+    assert p.returncode == 0, stderr
+    return (stdout, stderr)
+
+
+def loaded_commands(commands):
+    """
+    Return the names of the commands loaded to run ``commands``.
+    """
+    (stdout, stderr) = run_python(COMMANDS_SCRIPT, commands)
+    return stdout.splitlines()
+
+
+def run_startup(argv, lazy=True):
+    """
+    Run the CLI with ``argv`` in a new interpreter.
+
+    Return a (seconds, number of plugin modules imported) tuple.
+    """
+    start = time.time()
+    (stdout, stderr) = run_python(STARTUP_SCRIPT, [str(lazy)] + list(argv))
+    elapsed = time.time() - start
+    return (elapsed, int(stderr.splitlines()[-1]))
+
+
+def benchmark(iterations=5):
+    """
+    Return a dict mapping (path, lazy) to the best startup time and the
+    number of plugin modules imported.
+    """
+    result = {}
+    for argv in PATHS:
+        for lazy in (True, False):
+            runs = [run_startup(argv, lazy) for i in xrange(iterations)]
+            result[(' '.join(argv), lazy)] = min(runs)
+    return result
+
+
+class test_cli_startup(object):
+    """
+    Test the plugin modules imported by the cold start of the CLI.
+    """
+
+    def test_help(self):
+        (elapsed, lazy_modules) = run_startup(('help',))
+        (elapsed, all_modules) = run_startup(('help',), lazy=False)
+        assert lazy_modules < all_modules
+
+    def test_user_show(self):
+        (elapsed, lazy_modules) = run_startup(('user-show', '--help'))
+        (elapsed, all_modules) = run_startup(
+            ('user-show', '--help'), lazy=False)
+        assert 0 < lazy_modules < all_modules
+
+    def test_client_commands(self):
+        # The prompts of idrange-add and idrange-mod ask the server whether
+        # AD trusts are enabled
+        for command in ('idrange_add', 'idrange_mod'):
+            commands = loaded_commands((command,))
+            assert command in commands
+            assert 'adtrust_is_enabled' in commands
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+    else:
+        iterations = 5
+    for ((path, lazy), (elapsed, modules)) in sorted(
+            benchmark(iterations).iteritems()):
+        print 'ipa %-20s %-8s %8.3f s %4d plugin modules' % (
+            path, lazy and 'lazy' or 'all', elapsed, modules)
@@ -0,0 +1,150 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the `ipalib.session` module.
+"""
+
+import os
+import shutil
+import tempfile
+
+from ipalib import session
+
+
+class test_SessionCCacheCache(object):
+    """
+    Test the `ipalib.session.SessionCCacheCache` class.
+    """
+
+    def setup(self):
+        self.orig_krbccache_dir = session.krbccache_dir
+        session.krbccache_dir = tempfile.mkdtemp()
+        self.ccaches = session.SessionCCacheCache(max_size=1)
+
+    def teardown(self):
+        self.ccaches.flush()
+        shutil.rmtree(session.krbccache_dir)
+        session.krbccache_dir = self.orig_krbccache_dir
+
+    def test_reuse(self):
+        name = self.ccaches.bind('session1', 'data1')
+        assert os.environ['KRB5CCNAME'] == name
+        assert self.ccaches.load('session1', name) is None
+        self.ccaches.release('session1', name)
+        assert 'KRB5CCNAME' not in os.environ
+
+        assert self.ccaches.bind('session1', 'data1') == name
+        self.ccaches.release('session1', name)
+        stats = self.ccaches.statistics()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_modified(self):
+        name = self.ccaches.bind('session1', 'data1')
+        with open(session.krb5_parse_ccache(name)[1], 'w') as f:
+            f.write('data2')
+        assert self.ccaches.load('session1', name) == 'data2'
+        assert self.ccaches.load('session1', name) is None
+        self.ccaches.release('session1', name)
+
+    def test_session_data_changed(self):
+        name = self.ccaches.bind('session1', 'data1')
+        self.ccaches.release('session1', name)
+        name = self.ccaches.bind('session1', 'data2')
+        assert session.load_ccache_data(name) == 'data2'
+        self.ccaches.release('session1', name)
+        assert self.ccaches.statistics()['misses'] == 2
+
+    def test_eviction(self):
+        name1 = self.ccaches.bind('session1', 'data1')
+        self.ccaches.release('session1', name1)
+        name2 = self.ccaches.bind('session2', 'data2')
+        self.ccaches.release('session2', name2)
+        assert not os.path.exists(session.krb5_parse_ccache(name1)[1])
+        assert os.path.exists(session.krb5_parse_ccache(name2)[1])
+
+        self.ccaches.discard('session2')
+        assert not os.path.exists(session.krb5_parse_ccache(name2)[1])
+
+
+class FakeMemcache(object):
+    def __init__(self):
+        self.data = {}
+        self.gets = 0
+        self.sets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    def set(self, key, val, time=0):
+        self.sets += 1
+        self.data[key] = dict(val)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class test_MemcacheSessionManager(object):
+    """
+    Test write-behind of the `ipalib.session.MemcacheSessionManager` class.
+    """
+
+    def setup(self):
+        self.mgr = session.MemcacheSessionManager(write_interval=60)
+        self.mgr.mc = FakeMemcache()
+        self.session_id = self.mgr.new_session_id()
+        self.mgr.store_session_data(
+            self.mgr.new_session_data(self.session_id))
+
+    def test_timestamps_only(self):
+        session_data = self.mgr.get_session_data(self.session_id)
+        session_data['session_expiration_timestamp'] += 10
+        self.mgr.store_session_data(session_data)
+        assert self.mgr.mc.sets == 1
+        assert self.mgr.deferred_writes == 1
+
+    def test_dirty(self):
+        session_data = self.mgr.get_session_data(self.session_id)
+        session_data['ccache_data'] = 'data'
+        self.mgr.store_session_data(session_data)
+        assert self.mgr.mc.sets == 2
+
+        session_data = self.mgr.get_session_data(self.session_id)
+        del session_data['ccache_data']
+        self.mgr.store_session_data(session_data)
+        assert self.mgr.mc.sets == 3
+
+    def test_write_interval(self):
+        self.mgr.write_interval = 0
+        session_data = self.mgr.get_session_data(self.session_id)
+        self.mgr.store_session_data(session_data)
+        assert self.mgr.mc.sets == 2
+
+    def test_local_tier(self):
+        self.mgr.local_tier = session.LocalSessionTier(ttl=60)
+        session_data = self.mgr.get_session_data(self.session_id)
+        session_data['ccache_data'] = 'data'
+        self.mgr.store_session_data(session_data)
+        gets = self.mgr.mc.gets
+
+        session_data = self.mgr.get_session_data(self.session_id)
+        assert session_data['ccache_data'] == 'data'
+        assert self.mgr.mc.gets == gets
+
+        self.mgr.delete_session_data(self.session_id)
+        assert self.mgr.get_session_data(self.session_id) is None
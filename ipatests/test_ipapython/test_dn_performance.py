@@ -0,0 +1,138 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Microbenchmark of DN parsing, comparison and hashing.
+
+Run this module directly to print the throughput of each operation:
+
+    python ipatests/test_ipapython/test_dn_performance.py [ITERATIONS]
+
+The unit tests only run a few iterations to check the caches involved.
+"""
+
+import sys
+import time
+import unittest
+
+from ipapython import dn as dn_module
+from ipapython.dn import DN, EditableDN
+
+BASE_DN = 'dc=example,dc=com'
+
+
+def make_dn_strings(count):
+    return ['uid=user%d,cn=users,cn=accounts,%s' % (i, BASE_DN)
+            for i in range(count)]
+
+
+def benchmark(iterations=10000, count=1000):
+    """
+    Return a dict mapping operation names to the number of operations
+    per second.
+    """
+    dn_strings = make_dn_strings(count)
+    dns = [DN(s) for s in dn_strings]
+    others = [DN(s) for s in dn_strings]
+    container = DN(('cn', 'users'), ('cn', 'accounts'), BASE_DN)
+
+    def parse(i):
+        DN(dn_strings[i % count])
+
+    def parse_uncached(i):
+        dn_module._dn_parse_cache.clear()
+        DN(dn_strings[i % count])
+
+    def construct(i):
+        DN(('uid', 'user%d' % (i % count)), container)
+
+    def compare(i):
+        dns[i % count] == others[i % count]
+
+    def endswith(i):
+        dns[i % count].endswith(container)
+
+    def hash_(i):
+        hash(DN(dns[i % count]))
+
+    def to_str(i):
+        str(dns[i % count])
+
+    result = {}
+    for (name, func) in (('parse', parse),
+                         ('parse_uncached', parse_uncached),
+                         ('construct', construct),
+                         ('compare', compare),
+                         ('endswith', endswith),
+                         ('hash', hash_),
+                         ('str', to_str)):
+        start = time.time()
+        for i in xrange(iterations):
+            func(i)
+        elapsed = time.time() - start
+        result[name] = iterations / elapsed if elapsed else float('inf')
+    return result
+
+
+class TestDNCaches(unittest.TestCase):
+    def setUp(self):
+        dn_module._dn_parse_cache.clear()
+        dn_module._rdn_intern_cache.clear()
+
+    def test_parse_cache(self):
+        dn_str = make_dn_strings(1)[0]
+        dn1 = DN(dn_str)
+        dn2 = DN(dn_str)
+        self.assertEqual(dn_module._dn_parse_cache.hits, 1)
+        self.assertEqual(dn1, dn2)
+        self.assertEqual(hash(dn1), hash(dn2))
+        self.assertEqual(str(dn1), dn_str)
+
+    def test_interned_suffix(self):
+        dn1, dn2 = [DN(s) for s in make_dn_strings(2)]
+        self.assertNotEqual(dn1, dn2)
+        for (rdn1, rdn2) in zip(dn1.rdns[1:], dn2.rdns[1:]):
+            self.assertTrue(rdn1 is rdn2)
+        self.assertTrue(dn1.rdns[0] is not dn2.rdns[0])
+
+    def test_shared_rdns(self):
+        base_dn = DN(BASE_DN)
+        dn = DN(('cn', 'accounts'), base_dn)
+        self.assertTrue(dn[1] is base_dn[0])
+
+    def test_editable_not_shared(self):
+        dn_str = make_dn_strings(1)[0]
+        dn = DN(dn_str)
+        editable = EditableDN(dn_str)
+        editable[0] = ('uid', 'other')
+        self.assertEqual(DN(dn_str), dn)
+        self.assertEqual(editable[0].value, u'other')
+        self.assertTrue(EditableDN(dn)[1] is not dn[1])
+
+    def test_benchmark(self):
+        result = benchmark(iterations=100, count=10)
+        self.assertTrue(all(ops > 0 for ops in result.values()))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+    else:
+        iterations = 100000
+    for (name, ops) in sorted(benchmark(iterations).iteritems()):
+        print '%-16s %12.0f ops/s' % (name, ops)
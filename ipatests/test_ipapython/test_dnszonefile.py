@@ -0,0 +1,91 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test the `ipapython/dnszonefile.py` module.
+"""
+
+from StringIO import StringIO
+
+import nose
+
+from ipapython.dnszonefile import (read_zone_file, format_record,
+    canonical_record_data)
+
+ZONE = """\
+$ORIGIN example.com.
+$TTL 3600
+@   IN  SOA ns1 hostmaster (
+        2014010101 ; serial
+        3600 900 1209600 300 )
+    IN  NS  ns1
+    IN  MX  10 mail.example.com.
+ns1 IN A 192.0.2.1
+www 300 IN A 192.0.2.2
+    IN 600 AAAA 2001:db8::2
+txt IN TXT "hello world"
+$ORIGIN sub.example.com.
+host CNAME www.example.com.
+"""
+
+def test_read_zone_file():
+    records = list(read_zone_file(StringIO(ZONE), u'example.com'))
+    assert records == [
+        (u'@', 3600, u'SOA', u'ns1 hostmaster 2014010101 3600 900 1209600 300'),
+        (u'@', 3600, u'NS', u'ns1'),
+        (u'@', 3600, u'MX', u'10 mail'),
+        (u'ns1', 3600, u'A', u'192.0.2.1'),
+        (u'www', 300, u'A', u'192.0.2.2'),
+        (u'www', 600, u'AAAA', u'2001:db8::2'),
+        (u'txt', 3600, u'TXT', u'"hello world"'),
+        (u'host.sub', 3600, u'CNAME', u'www'),
+    ]
+
+def test_read_zone_file_without_ttl():
+    records = list(read_zone_file(StringIO('www A 192.0.2.2\n'),
+                                  u'example.com.'))
+    assert records == [(u'www', None, u'A', u'192.0.2.2')]
+
+def test_read_zone_file_errors():
+    for text in ('$INCLUDE other.zone\n',
+                 'www IN CH A 192.0.2.2\n',
+                 ' IN A 192.0.2.2\n',
+                 'www.example.org. IN A 192.0.2.2\n',
+                 'www IN A 192.0.2\n'):
+        nose.tools.assert_raises(
+            ValueError, list, read_zone_file(StringIO(text), u'example.com'))
+
+def test_format_record():
+    assert (format_record(u'www', 300, u'A', u'192.0.2.2') ==
+            u'www\t300\tIN\tA\t192.0.2.2')
+    assert format_record(u'@', None, u'NS', u'ns1') == u'@\tIN\tNS\tns1'
+
+def test_canonical_record_data():
+    assert (canonical_record_data(u'NS', u'ns1', u'example.com') ==
+            canonical_record_data(u'NS', u'ns1.example.com.', u'example.com.')
+            == u'ns1.example.com.')
+    assert (canonical_record_data(u'MX', u'10 mail', u'example.com') ==
+            u'10 mail.example.com.')
+    assert (canonical_record_data(u'A', u'192.0.2.1', u'example.com') ==
+            u'192.0.2.1')
+    # data which can't be parsed is compared as it is
+    assert canonical_record_data(u'A', u'invalid', u'example.com') == u'invalid'
+
+def test_round_trip():
+    lines = [format_record(*record)
+             for record in read_zone_file(StringIO(ZONE), u'example.com')]
+    text = u'$ORIGIN example.com.\n%s\n' % u'\n'.join(lines)
+    assert (list(read_zone_file(StringIO(text), u'example.com')) ==
+            list(read_zone_file(StringIO(ZONE), u'example.com')))
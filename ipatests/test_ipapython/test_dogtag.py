@@ -0,0 +1,277 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the `ipapython.dogtag` module, parts which do not need a CA.
+"""
+
+import httplib
+import socket
+import threading
+import time
+import unittest
+
+from ipalib import errors
+from ipapython import dogtag
+from ipapython.dogtag import HTTPConnectionPool
+
+
+class FakeMessage(object):
+    dict = {}
+
+
+class FakeResponse(object):
+    def __init__(self, will_close=False):
+        self.status = 200
+        self.reason = 'OK'
+        self.msg = FakeMessage()
+        self.will_close = will_close
+
+    def read(self):
+        return '<xml/>'
+
+
+class FakeConnection(object):
+    """
+    Emulates httplib.HTTPConnection, stale connections have been closed
+    by the server. Broken connections fail after the request was sent.
+    """
+    def __init__(self, stale=False, will_close=False, reset=False,
+                 broken=False):
+        self.stale = stale
+        self.will_close = will_close
+        self.reset = reset
+        self.broken = broken
+        self.closed = False
+        self.requests = 0
+
+    def request(self, method, url, body=None, headers={}):
+        if self.reset:
+            raise socket.error(32, 'Broken pipe')
+        self.requests += 1
+
+    def getresponse(self):
+        if self.stale:
+            raise httplib.BadStatusLine('')
+        if self.broken:
+            raise socket.error(104, 'Connection reset by peer')
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        self.closed = True
+
+
+class TestHTTPConnectionPool(unittest.TestCase):
+    key = ('https', 'ca.example.com', 443)
+
+    def setUp(self):
+        self.pool = HTTPConnectionPool(max_size=2, idle_timeout=300)
+
+    def test_miss_and_hit(self):
+        assert self.pool.acquire(self.key) is None
+        conn = FakeConnection()
+        self.pool.release(self.key, conn)
+        assert not conn.closed
+        assert self.pool.acquire(self.key) is conn
+        assert self.pool.acquire(('https', 'other.example.com', 443)) is None
+        stats = self.pool.statistics()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['idle'] == 0
+
+    def test_max_size(self):
+        conns = [FakeConnection() for i in range(3)]
+        for conn in conns:
+            self.pool.release(self.key, conn)
+        assert conns[0].closed
+        stats = self.pool.statistics()
+        assert stats['idle'] == 2
+        assert stats['evictions'] == 1
+
+    def test_disabled(self):
+        self.pool.configure(max_size=0)
+        conn = FakeConnection()
+        self.pool.release(self.key, conn)
+        assert conn.closed
+        assert self.pool.acquire(self.key) is None
+
+    def test_idle_timeout(self):
+        self.pool.idle_timeout = 0
+        conn = FakeConnection()
+        self.pool.release(self.key, conn)
+        assert self.pool.acquire(self.key) is None
+        assert conn.closed
+
+
+class TestPooledRequest(unittest.TestCase):
+    key = ('http', 'ca.example.com', 80)
+
+    def setUp(self):
+        self.saved_pool = dogtag.connection_pool
+        dogtag.connection_pool = HTTPConnectionPool()
+        self.created = []
+
+    def tearDown(self):
+        dogtag.connection_pool = self.saved_pool
+
+    def connection_factory(self, host, port):
+        conn = FakeConnection()
+        self.created.append(conn)
+        return conn
+
+    def request(self):
+        return dogtag._httplib_request(
+            'http', 'ca.example.com', 80, '/ca/ee/ca/checkRequest',
+            self.connection_factory, '', pool_key=self.key)
+
+    def test_reuse(self):
+        assert self.request()[0] == 200
+        assert self.request()[0] == 200
+        assert len(self.created) == 1
+        assert self.created[0].requests == 2
+
+    def test_reconnect(self):
+        stale = FakeConnection(stale=True)
+        dogtag.connection_pool.release(self.key, stale)
+        assert self.request()[0] == 200
+        assert stale.closed
+        assert len(self.created) == 1
+        assert dogtag.connection_pool.statistics()['reconnects'] == 1
+
+    def test_reconnect_unsent(self):
+        reset = FakeConnection(reset=True)
+        dogtag.connection_pool.release(self.key, reset)
+        assert self.request()[0] == 200
+        assert reset.closed
+        assert len(self.created) == 1
+
+    def test_no_resend(self):
+        broken = FakeConnection(broken=True)
+        dogtag.connection_pool.release(self.key, broken)
+        self.assertRaises(errors.NetworkError, self.request)
+        assert broken.requests == 1
+        assert broken.closed
+        assert len(self.created) == 0
+        assert dogtag.connection_pool.statistics()['reconnects'] == 0
+
+    def test_nothing_received(self):
+        assert dogtag._nothing_received(httplib.BadStatusLine(''))
+        assert dogtag._nothing_received(httplib.BadStatusLine(
+            'No status line received - the server has closed the '
+            'connection'))
+        assert not dogtag._nothing_received(httplib.BadStatusLine('HTTP/1'))
+
+    def test_new_connection_fails(self):
+        def connection_factory(host, port):
+            return FakeConnection(stale=True)
+        self.assertRaises(
+            errors.NetworkError, dogtag._httplib_request,
+            'http', 'ca.example.com', 80, '/ca/ee/ca/checkRequest',
+            connection_factory, '', pool_key=self.key)
+
+    def test_will_close(self):
+        conn = FakeConnection(will_close=True)
+        dogtag._httplib_request(
+            'http', 'ca.example.com', 80, '/ca/ee/ca/checkRequest',
+            lambda host, port: conn, '', pool_key=self.key)
+        assert conn.closed
+        assert dogtag.connection_pool.statistics()['idle'] == 0
+
+
+class FakeNSSConnection(FakeConnection):
+    """
+    Emulates nsslib.NSSConnection, checks that NSS is not initialized by
+    two connections at the same time nor while another connection is open.
+    """
+    initialized = False
+    initializing = 0
+    open = 0
+    inits = 0
+    errors = []
+    lock = threading.Lock()
+
+    def __init__(self, host, port, dbdir=None, no_init=False):
+        super(FakeNSSConnection, self).__init__()
+        cls = FakeNSSConnection
+        if not no_init:
+            with cls.lock:
+                cls.initializing += 1
+                cls.inits += 1
+                if cls.initializing > 1 or cls.open:
+                    cls.errors.append('SEC_ERROR_BUSY')
+            time.sleep(0.01)
+            with cls.lock:
+                cls.initializing -= 1
+            cls.initialized = True
+        with cls.lock:
+            cls.open += 1
+        self.sock = self
+
+    def set_debuglevel(self, level):
+        pass
+
+    def connect(self):
+        pass
+
+    def set_client_auth_data_callback(self, *args):
+        pass
+
+    def getresponse(self):
+        time.sleep(0.01)
+        return super(FakeNSSConnection, self).getresponse()
+
+    def close(self):
+        if not self.closed:
+            with FakeNSSConnection.lock:
+                FakeNSSConnection.open -= 1
+        super(FakeNSSConnection, self).close()
+
+
+class TestConcurrentRequests(unittest.TestCase):
+    def setUp(self):
+        self.saved = (dogtag.connection_pool, dogtag._nss_dbdir,
+                      dogtag.nsslib.NSSConnection,
+                      dogtag.nss.nss_is_initialized,
+                      dogtag.nss.get_default_certdb)
+        dogtag.connection_pool = HTTPConnectionPool(max_size=0)
+        # NSS was initialized by something else, e.g. x509.load_certificate
+        dogtag._nss_dbdir = None
+        FakeNSSConnection.initialized = True
+        FakeNSSConnection.inits = 0
+        FakeNSSConnection.errors = []
+        dogtag.nsslib.NSSConnection = FakeNSSConnection
+        dogtag.nss.nss_is_initialized = lambda: FakeNSSConnection.initialized
+        dogtag.nss.get_default_certdb = lambda: None
+
+    def tearDown(self):
+        (dogtag.connection_pool, dogtag._nss_dbdir,
+         dogtag.nsslib.NSSConnection, dogtag.nss.nss_is_initialized,
+         dogtag.nss.get_default_certdb) = self.saved
+
+    def test_concurrent_requests(self):
+        results = []
+        def request():
+            results.append(dogtag.pooled_https_request(
+                'ca.example.com', 443, '/ca/ee/ca/profileSubmitSSLClient',
+                '/etc/httpd/alias', 'password', 'ipaCert')[0])
+        threads = [threading.Thread(target=request) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [200] * 8
+        assert FakeNSSConnection.errors == []
+        assert FakeNSSConnection.inits == 1
@@ -0,0 +1,448 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the `ipapython.ipaldap` module, parts which do not need a server.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import ldap
+
+from ipalib import errors
+from ipapython.dn import DN
+from ipapython.ipaldap import (
+    LDAPConnectionPool, LDAPClient, IPASimpleLDAPObject, LDAPEntry,
+    SchemaCache, DN_SYNTAX_OID)
+
+
+class FakeConnection(object):
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.unbound = False
+        self.options = {}
+
+    def search_s(self, base, scope, filterstr='(objectClass=*)',
+                 attrlist=None, attrsonly=0):
+        if not self.healthy:
+            raise ldap.SERVER_DOWN({'desc': "Can't contact LDAP server"})
+        return []
+
+    def set_option(self, option, value):
+        self.options[option] = value
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+class TestLDAPConnectionPool(unittest.TestCase):
+    key = ('ldap://example.com', 'admin@EXAMPLE.COM')
+
+    def setUp(self):
+        self.pool = LDAPConnectionPool(max_size=2, idle_timeout=300,
+                                       check_interval=0)
+
+    def test_miss_and_hit(self):
+        assert self.pool.acquire(self.key, 1) is None
+        conn = FakeConnection()
+        self.pool.track(conn, self.key, 1)
+        assert self.pool.release(conn)
+        assert not conn.unbound
+        assert self.pool.acquire(self.key, 1) is conn
+        stats = self.pool.statistics()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['busy'] == 1
+
+    def test_other_identity(self):
+        conn = FakeConnection()
+        self.pool.track(conn, self.key, 1)
+        self.pool.release(conn)
+        assert self.pool.acquire(('ldap://example.com', 'other'), 1) is None
+
+    def test_rebind(self):
+        conn = FakeConnection()
+        self.pool.track(conn, self.key, 1)
+        self.pool.release(conn)
+        assert self.pool.acquire(self.key, 2) is None
+        assert conn.unbound
+        assert self.pool.statistics()['rebinds'] == 1
+
+    def test_failed_check(self):
+        conn = FakeConnection(healthy=False)
+        self.pool.track(conn, self.key, 1)
+        self.pool.release(conn)
+        assert self.pool.acquire(self.key, 1) is None
+        assert conn.unbound
+        assert self.pool.statistics()['failed_checks'] == 1
+
+    def test_untracked(self):
+        conn = FakeConnection()
+        assert not self.pool.release(conn)
+        self.pool.track(conn, self.key, 1)
+        self.pool.discard(conn)
+        assert not self.pool.release(conn)
+
+    def test_max_size(self):
+        conns = [FakeConnection() for i in range(3)]
+        for conn in conns:
+            self.pool.track(conn, self.key, 1)
+        for conn in conns:
+            self.pool.release(conn)
+        assert conns[0].unbound
+        stats = self.pool.statistics()
+        assert stats['idle'] == 2
+        assert stats['evictions'] == 1
+
+    def test_idle_timeout(self):
+        self.pool.idle_timeout = 0
+        conn = FakeConnection()
+        self.pool.track(conn, self.key, 1)
+        self.pool.release(conn)
+        assert self.pool.acquire(self.key, 1) is None
+        assert conn.unbound
+
+
+class FakeSearchConnection(object):
+    """
+    Emulates the asynchronous search API of IPASimpleLDAPObject, every
+    entry is received in a separate message.
+    """
+    def __init__(self, entries, error=None):
+        self.entries = entries
+        self.error = error
+        self.abandoned = []
+        self.pending = {}
+
+    def search_ext(self, base, scope, filterstr, attrlist, attrsonly=0,
+                   serverctrls=None, clientctrls=None, timeout=-1,
+                   sizelimit=0):
+        msgid = len(self.pending) + 1
+        self.pending[msgid] = list(self.entries)
+        return msgid
+
+    def result3(self, msgid, all=1, timeout=None):
+        if self.pending[msgid]:
+            entry = self.pending[msgid].pop(0)
+            return (ldap.RES_SEARCH_ENTRY, [entry], msgid, [])
+        if self.error is not None:
+            raise self.error
+        return (ldap.RES_SEARCH_RESULT, [], msgid, [])
+
+    def abandon(self, msgid):
+        self.abandoned.append(msgid)
+
+
+class TestIterEntries(unittest.TestCase):
+    def setUp(self):
+        self.client = LDAPClient('ldap://example.com')
+
+    def test_iter_entries(self):
+        self.client.conn = FakeSearchConnection(['a', 'b', 'c'])
+        assert list(self.client.iter_entries()) == ['a', 'b', 'c']
+        assert self.client.find_entries() == (['a', 'b', 'c'], False)
+
+    def test_empty(self):
+        self.client.conn = FakeSearchConnection([])
+        assert list(self.client.iter_entries()) == []
+        self.assertRaises(errors.NotFound, self.client.find_entries)
+
+    def test_truncated(self):
+        self.client.conn = FakeSearchConnection(
+            ['a', 'b'], ldap.SIZELIMIT_EXCEEDED({'desc': 'Size limit'}))
+        received = []
+        try:
+            for entry in self.client.iter_entries():
+                received.append(entry)
+        except errors.LimitsExceeded:
+            pass
+        else:
+            self.fail('LimitsExceeded not raised')
+        assert received == ['a', 'b']
+        assert self.client.find_entries() == (['a', 'b'], True)
+
+    def test_early_termination(self):
+        conn = self.client.conn = FakeSearchConnection(['a', 'b', 'c'])
+        entries = self.client.iter_entries()
+        assert entries.next() == 'a'
+        entries.close()
+        assert conn.abandoned == [1]
+
+
+class FakeAddConnection(object):
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+        self.pending = {}
+        self.added = []
+        self.max_pending = 0
+
+    def add_ext(self, dn, modlist, serverctrls=None, clientctrls=None):
+        msgid = len(self.added) + 1
+        self.added.append(dn)
+        self.pending[msgid] = dn
+        self.max_pending = max(self.max_pending, len(self.pending))
+        return msgid
+
+    def result3(self, msgid, all=1, timeout=None):
+        dn = self.pending.pop(msgid)
+        if dn in self.existing:
+            raise ldap.ALREADY_EXISTS({'desc': 'Already exists'})
+        return (ldap.RES_ADD, [], msgid, [])
+
+
+class TestIterAddEntries(unittest.TestCase):
+    def setUp(self):
+        self.client = LDAPClient('ldap://example.com')
+        entry_conn = IPASimpleLDAPObject(
+            'ldap://example.com', False, no_schema=True)
+        self.entries = [
+            LDAPEntry(entry_conn, DN(('cn', name), 'dc=example,dc=com'),
+                      cn=[name], objectClass=['top'])
+            for name in ('a', 'b', 'c')]
+
+    def test_add(self):
+        conn = self.client.conn = FakeAddConnection(
+            existing=[self.entries[1].dn])
+        result = list(self.client.iter_add_entries(
+            self.entries, max_outstanding=2))
+        assert [entry for (entry, error) in result] == self.entries
+        assert result[0][1] is None
+        assert isinstance(result[1][1], errors.DuplicateEntry)
+        assert result[2][1] is None
+        assert conn.max_pending == 2
+        assert not conn.pending
+
+    def test_lazy(self):
+        conn = self.client.conn = FakeAddConnection()
+        results = self.client.iter_add_entries(
+            iter(self.entries), max_outstanding=1)
+        results.next()
+        assert conn.added == [self.entries[0].dn]
+        results.close()
+        assert not conn.pending
+
+
+class FakeMultiplexConnection(object):
+    """
+    Emulates the asynchronous API of IPASimpleLDAPObject. The operation on
+    a DN completes after the number of blocking result3 calls given in
+    responses, with the given entries and error.
+    """
+    result_types = dict(modify=ldap.RES_MODIFY, delete=ldap.RES_DELETE,
+                        search=ldap.RES_SEARCH_RESULT)
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.clock = 0
+        self.ops = {}
+        self.abandoned = []
+
+    def _submit(self, kind, dn):
+        (delay, entries, error) = self.responses[str(dn)]
+        msgid = len(self.ops) + 1
+        self.ops[msgid] = (kind, delay, list(entries), error)
+        return msgid
+
+    def search_ext(self, base, scope, filterstr, attrlist, attrsonly=0,
+                   serverctrls=None, clientctrls=None, timeout=-1,
+                   sizelimit=0):
+        return self._submit('search', base)
+
+    def modify_ext(self, dn, modlist, serverctrls=None, clientctrls=None):
+        return self._submit('modify', dn)
+
+    def delete_ext(self, dn, serverctrls=None, clientctrls=None):
+        return self._submit('delete', dn)
+
+    def result3(self, msgid, all=1, timeout=None):
+        (kind, delay, entries, error) = self.ops[msgid]
+        if self.clock < delay and timeout != 0:
+            self.clock += 1
+        if self.clock < delay:
+            if timeout == 0:
+                return (None, None, None, None)
+            raise ldap.TIMEOUT({'desc': 'Timed out'})
+        if entries:
+            return (ldap.RES_SEARCH_ENTRY, [entries.pop(0)], msgid, [])
+        if error is not None:
+            raise error
+        return (self.result_types[kind], [], msgid, [])
+
+    def abandon(self, msgid):
+        self.abandoned.append(msgid)
+
+
+class TestLDAPMultiplexer(unittest.TestCase):
+    def setUp(self):
+        self.client = LDAPClient('ldap://example.com')
+        self.dns = [DN(('cn', name), 'dc=example,dc=com')
+                    for name in ('a', 'b', 'c')]
+
+    def make_conn(self, *responses):
+        self.client.conn = FakeMultiplexConnection(
+            dict((str(dn), response)
+                 for (dn, response) in zip(self.dns, responses)))
+        return self.client.conn
+
+    def test_completion_order(self):
+        self.make_conn((3, ['a1', 'a2'], None), (1, [], None), (2, [], None))
+        mux = self.client.multiplexer()
+        search = mux.search(base_dn=self.dns[0], tag='a')
+        modify = mux.modify(self.dns[1], [])
+        delete = mux.delete(self.dns[2])
+        assert list(mux.iter_completed()) == [modify, delete, search]
+        assert search.entries == ['a1', 'a2']
+        assert search.tag == 'a'
+        assert [op.error for op in (search, modify, delete)] == [None] * 3
+
+    def test_errors(self):
+        self.make_conn(
+            (1, ['a1'], ldap.SIZELIMIT_EXCEEDED({'desc': 'Size limit'})),
+            (0, [], ldap.NO_SUCH_OBJECT({'desc': 'No such object'})))
+        mux = self.client.multiplexer()
+        search = mux.search(base_dn=self.dns[0])
+        delete = mux.delete(self.dns[1])
+        list(mux.iter_completed())
+        assert isinstance(search.error, errors.LimitsExceeded)
+        assert search.entries == ['a1']
+        assert isinstance(delete.error, errors.NotFound)
+
+    def test_timeout(self):
+        conn = self.make_conn((1000, [], None), (1, [], None))
+        mux = self.client.multiplexer(timeout=0)
+        slow = mux.search(base_dn=self.dns[0])
+        fast = mux.modify(self.dns[1], [], timeout=None)
+        assert list(mux.iter_completed()) == [slow, fast]
+        assert isinstance(slow.error, errors.DatabaseTimeout)
+        assert fast.error is None
+        assert conn.abandoned == [slow.msgid]
+
+    def test_wait(self):
+        self.make_conn((2, ['a1'], None), (1, [], None), (3, [], None))
+        mux = self.client.multiplexer()
+        search = mux.search(base_dn=self.dns[0])
+        modify = mux.modify(self.dns[1], [])
+        delete = mux.delete(self.dns[2])
+        assert mux.wait(search) == ['a1']
+        assert modify.done
+        assert list(mux.iter_completed()) == [modify, delete]
+
+    def test_abandon(self):
+        conn = self.make_conn((5, [], None))
+        with self.client.multiplexer() as mux:
+            search = mux.search(base_dn=self.dns[0])
+        assert conn.abandoned == [search.msgid]
+        assert list(mux.iter_completed()) == []
+
+
+class FakeSchemaConnection(object):
+    schema_entry = {
+        'attributeTypes': [
+            "( 2.5.4.3 NAME ( 'cn' 'commonName' ) "
+            "SYNTAX 1.3.6.1.4.1.1466.115.121.1.15 )",
+            "( 2.5.4.31 NAME 'member' "
+            "SYNTAX 1.3.6.1.4.1.1466.115.121.1.12 )",
+            "( 1.3.6.1.1.1.1.0 NAME 'uidNumber' "
+            "SYNTAX 1.3.6.1.4.1.1466.115.121.1.27 SINGLE-VALUE )",
+        ],
+        'objectClasses': [],
+    }
+
+    def __init__(self, version):
+        self.version = version
+        self.schema_searches = 0
+
+    def search_s(self, base, scope, filterstr='(objectClass=*)',
+                 attrlist=None, attrsonly=0):
+        if 'attributetypes' in attrlist:
+            self.schema_searches += 1
+            return [(base, self.schema_entry)]
+        return [(base, {'modifyTimestamp': [self.version]})]
+
+
+class TestSchemaCache(unittest.TestCase):
+    url = 'ldap://example.com'
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_index(self):
+        cache = SchemaCache()
+        server_schema = cache.get_server_schema(
+            self.url, FakeSchemaConnection('1'))
+        assert server_schema.get_attribute('CommonName') == (
+            '1.3.6.1.4.1.1466.115.121.1.15', False)
+        assert server_schema.get_attribute('2.5.4.31') == (
+            DN_SYNTAX_OID, False)
+        assert server_schema.get_attribute('uidnumber')[1]
+        assert server_schema.get_attribute('unknown') is None
+
+    def test_persisted(self):
+        conn = FakeSchemaConnection('1')
+        SchemaCache(self.cache_dir).get_server_schema(self.url, conn)
+        server_schema = SchemaCache(self.cache_dir).get_server_schema(
+            self.url, conn)
+        assert conn.schema_searches == 1
+        assert server_schema.get_attribute('member') == (
+            DN_SYNTAX_OID, False)
+
+    def test_schema_changed(self):
+        SchemaCache(self.cache_dir).get_server_schema(
+            self.url, FakeSchemaConnection('1'))
+        conn = FakeSchemaConnection('2')
+        SchemaCache(self.cache_dir).get_server_schema(self.url, conn)
+        assert conn.schema_searches == 1
+
+    def test_force_update(self):
+        conn = FakeSchemaConnection('1')
+        SchemaCache(self.cache_dir).get_server_schema(self.url, conn)
+        SchemaCache(self.cache_dir).get_server_schema(
+            self.url, conn, force_update=True)
+        assert conn.schema_searches == 2
+
+
+class TestSearchResultEntries(unittest.TestCase):
+    def setUp(self):
+        self.conn = IPASimpleLDAPObject(
+            'ldap://example.com', False, no_schema=True)
+        self.entries = self.conn.convert_result([
+            ('cn=a,dc=example,dc=com', {'cn': ['a'], 'description': ['x']}),
+            ('cn=b,dc=example,dc=com', {'cn': ['b'], 'description': ['y']}),
+            (None, ['ldap://referral.example.com']),
+        ])
+
+    def test_convert_result(self):
+        assert len(self.entries) == 2
+        entry_a, entry_b = self.entries
+        assert entry_a.dn == DN('cn=a,dc=example,dc=com')
+        assert entry_a['cn'] == [u'a']
+        assert entry_b.raw['Description'] == ['y']
+        assert entry_a._names is entry_b._names
+
+    def test_modify(self):
+        entry_a, entry_b = self.entries
+        entry_a['objectClass'] = ['top']
+        del entry_a['description']
+        assert 'objectclass' in entry_a
+        assert 'description' not in entry_a
+        assert 'objectclass' not in entry_b
+        assert 'description' in entry_b
+        assert sorted(entry_b.keys()) == [u'cn', u'description']
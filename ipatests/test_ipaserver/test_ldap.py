@@ -27,16 +27,21 @@
 
 import os
 
+import ldap
 import nose
 from nose.tools import assert_raises  # pylint: disable=E0611
 import nss.nss as nss
 
-from ipaserver.plugins.ldap2 import ldap2
+from ipaserver.plugins import ldap2 as ldap2_module
+from ipaserver.plugins.ldap2 import ldap2, IPAConfigCache
 from ipalib.plugins.service import service, service_show
 from ipalib.plugins.host import host
+from ipalib.plugins.config import config_mod
 from ipalib import api, x509, create_api, errors
+from ipalib.request import context, destroy_context
 from ipapython import ipautil
 from ipapython.dn import DN
+from ipapython.ipaldap import IPASimpleLDAPObject, DN_SYNTAX_OID
 
 class test_ldap(object):
     """
@@ -305,3 +310,460 @@ class test_LDAPEntry(object):
 
         e.raw['test'].append('second')
         assert e['test'] == ['not list', u'second']
+
+
+class fake_config_api(object):
+    """
+    Provides the DN of the configuration entry to ldap2.get_ipa_config.
+    """
+    class Object(object):
+        class config(object):
+            @staticmethod
+            def get_dn():
+                return DN(('cn', 'ipaconfig'), ('cn', 'etc'),
+                          ('dc', 'example'), ('dc', 'com'))
+
+
+class config_ldap2(ldap2):
+    """
+    ldap2 which reads the configuration entry from self.config and counts
+    the requests it would have sent to the server.
+    """
+    conn = None
+
+    def __init__(self):
+        super(config_ldap2, self).__init__(
+            shared_instance=False, ldap_uri='ldap://config.example.com')
+        self.conn = IPASimpleLDAPObject(
+            'ldap://config.example.com', False, no_schema=True)
+        self.config = {'ipaSearchRecordsLimit': ['100']}
+        self.usn = ['1']
+        self.fetches = 0
+        self.validations = 0
+
+    def _fetch_ipa_config(self, dn, attrs_list=None):
+        self.fetches += 1
+        return (dict(self.config), self.usn)
+
+    def _get_ipa_config_usn(self, dn):
+        self.validations += 1
+        return self.usn
+
+
+class test_ipa_config_cache(object):
+    """
+    Test sharing the IPA configuration entry between requests.
+    """
+
+    def setUp(self):
+        self.saved = (ldap2_module.api, ldap2_module.config_cache)
+        ldap2_module.api = fake_config_api
+        self.cache = ldap2_module.config_cache = IPAConfigCache(ttl=300)
+        self.conn = config_ldap2()
+        self.new_request(u'admin@EXAMPLE.COM')
+
+    def tearDown(self):
+        destroy_context()
+        (ldap2_module.api, ldap2_module.config_cache) = self.saved
+
+    def new_request(self, principal):
+        destroy_context()
+        context.principal = principal
+
+    def test_once_per_request(self):
+        assert self.conn.get_ipa_config()['ipasearchrecordslimit'] == [u'100']
+        assert self.conn.get_ipa_config()['ipasearchrecordslimit'] == [u'100']
+        assert self.conn.fetches == 1
+        stats = self.cache.statistics()
+        assert stats == dict(hits=1, validations=0, fetches=1, avoided=1)
+
+    def test_shared(self):
+        self.conn.get_ipa_config()
+        self.new_request(u'admin@EXAMPLE.COM')
+        config = self.conn.get_ipa_config()
+        assert config['ipasearchrecordslimit'] == [u'100']
+        assert config['ipasearchtimelimit'] == [2]
+        assert self.conn.fetches == 1
+        assert self.conn.validations == 0
+        assert self.cache.statistics()['hits'] == 1
+
+    def test_per_principal(self):
+        self.conn.get_ipa_config()
+        self.new_request(u'user@EXAMPLE.COM')
+        self.conn.get_ipa_config()
+        assert self.conn.fetches == 2
+
+    def test_usn_validation(self):
+        self.cache.ttl = 0
+        self.conn.get_ipa_config()
+        self.new_request(u'admin@EXAMPLE.COM')
+        self.conn.get_ipa_config()
+        assert self.conn.fetches == 1
+        assert self.conn.validations == 1
+
+        self.conn.config = {'ipaSearchRecordsLimit': ['50']}
+        self.conn.usn = ['2']
+        self.new_request(u'admin@EXAMPLE.COM')
+        config = self.conn.get_ipa_config()
+        assert config['ipasearchrecordslimit'] == [u'50']
+        assert self.conn.fetches == 2
+        assert self.conn.validations == 2
+        stats = self.cache.statistics()
+        assert stats == dict(hits=0, validations=1, fetches=2, avoided=1)
+
+    def test_config_mod(self):
+        self.conn.get_ipa_config()
+        self.conn.config = {'ipaSearchRecordsLimit': ['50']}
+        dn = fake_config_api.Object.config.get_dn()
+        assert config_mod().post_callback(self.conn, dn, {}) == dn
+        config = self.conn.get_ipa_config()
+        assert config['ipasearchrecordslimit'] == [u'50']
+        assert self.conn.fetches == 2
+
+
+def parse_filter(filterstr, start=0):
+    """
+    Parse the simple LDAP filters used to resolve indirect membership,
+    return (filter, end).
+    """
+    assert filterstr[start] == '('
+    if filterstr[start + 1] in '|&(':
+        op = filterstr[start + 1]
+        if op == '(':
+            # values return filter, a list of simple items
+            op = '|'
+            i = start + 1
+        else:
+            i = start + 2
+        children = []
+        while filterstr[i] != ')':
+            (child, i) = parse_filter(filterstr, i)
+            children.append(child)
+        return ((op, children), i + 1)
+    end = filterstr.index(')', start)
+    (attr, value) = filterstr[start + 1:end].split('=', 1)
+    return (('=', attr.lower(), value.lower()), end + 1)
+
+
+def match_filter(f, attr, value):
+    """
+    Return True if the value of attr matches one of the items of f.
+    """
+    if f[0] == '=':
+        return f[1] == attr and f[2] in ('*', value.lower())
+    return any(match_filter(child, attr, value) for child in f[1])
+
+
+def match_entry(f, attrs):
+    if f[0] == '&':
+        return all(match_entry(child, attrs) for child in f[1])
+    if f[0] == '|':
+        return any(match_entry(child, attrs) for child in f[1])
+    return any(match_filter(f, f[1], value) for value in attrs.get(f[1], []))
+
+
+class FakeDirectory(object):
+    """
+    Emulates a python-ldap connection to a directory with a few users and
+    nested groups, counts the searches and the attribute values returned.
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.searches = 0
+        self.values = 0
+        self.modifications = 0
+        self._results = {}
+
+    def search_ext(self, base, scope, filterstr, attrlist=None, attrsonly=0,
+                   serverctrls=None, clientctrls=None, timeout=-1,
+                   sizelimit=0):
+        self.searches += 1
+        f = parse_filter(filterstr)[0]
+        values_filter = None
+        for ctrl in serverctrls or []:
+            if hasattr(ctrl, 'filterstr'):
+                values_filter = parse_filter(ctrl.filterstr)[0]
+        result = []
+        for (dn, attrs) in sorted(self.entries.iteritems()):
+            if not dn.endswith(base) or not match_entry(f, attrs):
+                continue
+            returned = {}
+            for (attr, values) in attrs.iteritems():
+                if attrlist is not None and attr not in attrlist:
+                    continue
+                if values_filter is not None:
+                    values = [v for v in values
+                              if match_filter(values_filter, attr, v)]
+                if values:
+                    returned[attr] = values
+                    self.values += len(values)
+            result.append((dn, returned))
+        truncated = sizelimit > 0 and len(result) > sizelimit
+        if truncated:
+            result = result[:sizelimit]
+        msgid = len(self._results) + 1
+        self._results[msgid] = (result, truncated)
+        return msgid
+
+    def result3(self, msgid, all=1, timeout=None):
+        (result, truncated) = self._results[msgid]
+        if result:
+            return (ldap.RES_SEARCH_ENTRY, [result.pop(0)], msgid, [])
+        if truncated:
+            raise ldap.SIZELIMIT_EXCEEDED()
+        return (ldap.RES_SEARCH_RESULT, [], msgid, [])
+
+    def abandon(self, msgid):
+        pass
+
+    def modify_s(self, dn, modlist):
+        self.modifications += 1
+        if dn not in self.entries:
+            raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        attrs = dict((attr, list(values))
+                     for (attr, values) in self.entries[dn].iteritems())
+        for (op, attr, values) in modlist:
+            current = attrs.setdefault(attr.lower(), [])
+            for value in values:
+                if op == ldap.MOD_ADD:
+                    if value in current:
+                        raise ldap.TYPE_OR_VALUE_EXISTS(
+                            {'desc': 'Type or value exists'})
+                    current.append(value)
+                elif op == ldap.MOD_DELETE:
+                    if value not in current:
+                        raise ldap.NO_SUCH_ATTRIBUTE(
+                            {'desc': 'No such attribute'})
+                    current.remove(value)
+        self.entries[dn] = attrs
+
+
+class member_ldap_object(IPASimpleLDAPObject):
+    """
+    Decodes the member attributes as DNs without a schema.
+    """
+    _SCHEMA_OVERRIDE = dict(
+        member=DN_SYNTAX_OID, memberof=DN_SYNTAX_OID,
+        memberuser=DN_SYNTAX_OID, memberhost=DN_SYNTAX_OID)
+
+
+class fake_indirect_api(object):
+    class env(object):
+        basedn = DN(('dc', 'example'), ('dc', 'com'))
+
+
+class directory_ldap2(ldap2):
+    """
+    ldap2 connected to a FakeDirectory.
+    """
+    conn = None
+
+    def __init__(self, entries):
+        super(directory_ldap2, self).__init__(
+            shared_instance=False, ldap_uri='ldap://directory.example.com')
+        self.conn = member_ldap_object(
+            'ldap://directory.example.com', False, no_schema=True)
+        self.conn.conn = self.directory = FakeDirectory(entries)
+        self.set_api(fake_indirect_api)
+
+    def get_ipa_config(self, attrs_list=None):
+        return dict(self.config_defaults)
+
+
+def group_dn(name):
+    return 'cn=%s,cn=groups,cn=accounts,dc=example,dc=com' % name
+
+
+def user_dn(name):
+    return 'uid=%s,cn=users,cn=accounts,dc=example,dc=com' % name
+
+
+class test_indirect_membership(object):
+    """
+    Test that resolving indirect membership in batches gives the same
+    result as resolving it per entry.
+    """
+    users = ['user%d' % i for i in range(6)]
+
+    def setUp(self):
+        rule_dn = 'ipauniqueid=1,cn=hbac,dc=example,dc=com'
+        host_dn = 'fqdn=host.example.com,cn=computers,cn=accounts,dc=example,dc=com'
+        self.entries = {
+            # all users are members of ipausers, top contains ipausers
+            group_dn('ipausers'): dict(
+                objectclass=['groupofnames'],
+                member=[user_dn(u) for u in self.users] + [group_dn('admins')],
+                memberof=[group_dn('top')]),
+            group_dn('admins'): dict(
+                objectclass=['groupofnames'],
+                member=[user_dn('user0'), user_dn('user1')],
+                memberof=[group_dn('ipausers'), group_dn('top'), rule_dn]),
+            group_dn('top'): dict(
+                objectclass=['groupofnames'],
+                member=[group_dn('ipausers')]),
+            rule_dn: dict(
+                objectclass=['ipahbacrule'],
+                memberuser=[group_dn('admins')],
+                memberhost=[host_dn]),
+            host_dn: dict(
+                objectclass=['ipahost'],
+                memberof=[rule_dn]),
+        }
+        for user in self.users:
+            memberof = [group_dn('ipausers'), group_dn('top')]
+            if user in ('user0', 'user1'):
+                memberof += [group_dn('admins'), rule_dn]
+            self.entries[user_dn(user)] = dict(
+                objectclass=['posixaccount'], memberof=memberof)
+
+    def search(self, objectclass, attr, batch_size, size_limit=0):
+        conn = directory_ldap2(self.entries)
+        conn.indirect_batch_size = batch_size
+        (entries, truncated) = conn.find_entries(
+            '(objectclass=%s)' % objectclass, ['member', 'memberof', attr],
+            base_dn=DN(('dc', 'example'), ('dc', 'com')), time_limit=0,
+            size_limit=size_limit)
+        membership = dict(
+            (str(entry.dn), dict(
+                (a, sorted(str(dn) for dn in entry.get(a, [])))
+                for a in ('memberof', 'memberofindirect', 'memberindirect')))
+            for entry in entries)
+        return (membership, truncated, conn.directory)
+
+    def test_memberofindirect(self):
+        for objectclass in ('posixaccount', 'ipahost', 'groupofnames'):
+            (batched, truncated, directory) = self.search(
+                objectclass, 'memberofindirect', 100)
+            (single, truncated, single_directory) = self.search(
+                objectclass, 'memberofindirect', 1)
+            assert batched == single
+        (batched, truncated, directory) = self.search(
+            'posixaccount', 'memberofindirect', 100)
+        assert batched[user_dn('user0')]['memberofindirect'] == [
+            group_dn('top'), 'ipauniqueid=1,cn=hbac,dc=example,dc=com']
+        assert batched[user_dn('user5')]['memberofindirect'] == [
+            group_dn('top')]
+        assert directory.searches == 2
+        # only the member values of the users are returned, once each
+        assert directory.values == (
+            2 * len(self.users) + 4 + len(self.users) + 2)
+
+    def test_memberindirect(self):
+        (batched, truncated, directory) = self.search(
+            'groupofnames', 'memberindirect', 100)
+        (single, truncated, single_directory) = self.search(
+            'groupofnames', 'memberindirect', 1)
+        assert batched == single
+        assert batched[group_dn('top')]['memberindirect'] == sorted(
+            [user_dn(u) for u in self.users] + [group_dn('admins')])
+        assert directory.searches == 2
+        assert single_directory.searches == 4
+
+    def test_size_limit(self):
+        # top has 8 direct and indirect members, the limit is hit when they
+        # are resolved and not by the search of the 3 groups
+        for batch_size in (100, 1):
+            assert_raises(errors.LimitsExceeded, self.search,
+                          'groupofnames', 'memberindirect', batch_size,
+                          size_limit=3)
+            (result, truncated, directory) = self.search(
+                'groupofnames', 'memberindirect', batch_size, size_limit=8)
+            assert not truncated
+            assert len(result) == 3
+
+    def test_truncated(self):
+        # the search itself is truncated, all entries received until then
+        # are returned with their indirect membership
+        for batch_size in (100, 1):
+            (result, truncated, directory) = self.search(
+                'posixaccount', 'memberofindirect', batch_size, size_limit=4)
+            assert truncated
+            assert len(result) == 4
+            for membership in result.itervalues():
+                assert group_dn('top') in membership['memberofindirect']
+
+
+class test_group_members(object):
+    """
+    Test that adding and removing members in bulk fails for the same
+    members with the same errors as adding and removing them one by one.
+    """
+
+    def setUp(self):
+        self.entries = {
+            group_dn('editors'): dict(
+                objectclass=['groupofnames'], cn=['editors'],
+                member=[user_dn('user0')]),
+        }
+        for i in range(4):
+            self.entries[user_dn('user%d' % i)] = dict(
+                objectclass=['posixaccount'], uid=['user%d' % i])
+
+    def update(self, bulk, add, names, allow_same=False):
+        """
+        Update the members of editors, return the failed members, the
+        members of editors and the number of modify operations.
+        """
+        entries = dict((dn, dict(attrs))
+                       for (dn, attrs) in self.entries.iteritems())
+        conn = directory_ldap2(entries)
+        group = DN(group_dn('editors'))
+        dns = [DN(group_dn(name)) if name == 'editors' else DN(user_dn(name))
+               for name in names]
+        if bulk:
+            if add:
+                failed = conn.add_entries_to_group(
+                    dns, group, allow_same=allow_same)
+            else:
+                failed = conn.remove_entries_from_group(dns, group)
+        else:
+            failed = []
+            for dn in dns:
+                try:
+                    if add:
+                        conn.add_entry_to_group(
+                            dn, group, allow_same=allow_same)
+                    else:
+                        conn.remove_entry_from_group(dn, group)
+                except errors.PublicError, e:
+                    failed.append((dn, e))
+        failed = [(str(dn), type(e), unicode(e)) for (dn, e) in failed]
+        members = sorted(entries[group_dn('editors')].get('member', []))
+        return (failed, members, conn.directory.modifications)
+
+    def check(self, add, names, failed, allow_same=False):
+        (bulk_failed, bulk_members, modifications) = self.update(
+            True, add, names, allow_same)
+        (single_failed, single_members, single_modifications) = self.update(
+            False, add, names, allow_same)
+        assert bulk_failed == single_failed
+        assert bulk_members == single_members
+        assert [dn for (dn, error_type, error) in bulk_failed] == failed
+        return modifications
+
+    def test_add(self):
+        assert self.check(True, ['user1', 'user2'], []) == 1
+
+    def test_add_missing(self):
+        failed = [user_dn('nobody')]
+        assert self.check(True, ['user1', 'nobody', 'user2'], failed) == 1
+
+    def test_add_same_group(self):
+        self.check(True, ['editors', 'user1'], [group_dn('editors')])
+        self.check(True, ['editors'], [], allow_same=True)
+
+    def test_add_already_member(self):
+        self.check(True, ['user1', 'user0', 'user2'], [user_dn('user0')])
+
+    def test_add_duplicates(self):
+        self.check(True, ['user1', 'user2', 'user1'], [user_dn('user1')])
+
+    def test_remove(self):
+        assert self.check(False, ['user0'], []) == 1
+
+    def test_remove_non_member(self):
+        self.check(False, ['user1', 'user0', 'nobody'],
+                   [user_dn('user1'), user_dn('nobody')])
+
+    def test_remove_duplicates(self):
+        self.check(False, ['user0', 'user0'], [user_dn('user0')])
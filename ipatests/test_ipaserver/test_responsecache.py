@@ -0,0 +1,83 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the `ipaserver.plugins.responsecache` module.
+"""
+
+from ipatests.util import create_test_api
+from ipalib.frontend import Command
+from ipalib.request import destroy_context
+from ipaserver.plugins import responsecache
+
+
+class test_response_cache(object):
+    """
+    Test the `ipaserver.plugins.responsecache.response_cache` class.
+    """
+
+    def setup(self):
+        (self.api, self.home) = create_test_api(
+            in_server=True, response_cache=True, response_cache_size=2)
+        executed = self.executed = []
+
+        class response_cache(responsecache.response_cache):
+            usn = (('lastusn', ('1',)),)
+
+            def _get_usn(self):
+                return self.usn
+
+        class reader(Command):
+            takes_args = ('name',)
+            cache_response = True
+
+            def execute(self, name, **options):
+                executed.append(name)
+                return dict(result=[name])
+
+        self.api.register(response_cache)
+        self.api.register(reader)
+        self.api.finalize()
+
+    def teardown(self):
+        destroy_context()
+        self.home.rmtree()
+
+    def test_hit(self):
+        reader = self.api.Command.reader
+        assert reader(u'a')['result'] == [u'a']
+        assert reader(u'a')['result'] == [u'a']
+        assert self.executed == [u'a']
+        stats = self.api.Backend.response_cache.statistics()
+        assert stats['reader'] == dict(hits=1, misses=1, ratio=0.5)
+
+    def test_response_copied(self):
+        reader = self.api.Command.reader
+        reader(u'a')['result'].append(u'b')
+        assert reader(u'a')['result'] == [u'a']
+
+    def test_usn_changed(self):
+        reader = self.api.Command.reader
+        reader(u'a')
+        type(self.api.Backend.response_cache).usn = (('lastusn', ('2',)),)
+        reader(u'a')
+        assert self.executed == [u'a', u'a']
+
+    def test_max_size(self):
+        reader = self.api.Command.reader
+        for name in (u'a', u'b', u'c', u'a'):
+            reader(name)
+        assert self.executed == [u'a', u'b', u'c', u'a']
@@ -21,8 +21,10 @@
 Test the `ipalib.plugins.baseldap` module.
 """
 
-from ipalib import errors
+from ipalib import api, errors, Str
 from ipalib.plugins import baseldap
+from ipapython.dn import DN
+from ipatests.util import create_test_api
 
 
 def test_exc_wrapper():
@@ -157,3 +159,93 @@ def test_exc_callback_registration():
     messages = []
     subclass_instance.test_fail()
     assert messages == ['Base exc_callback', 'Subclass registered callback']
+
+
+def convert_attribute_members_by_suffix(ldap_obj, entry_attrs):
+    """
+    Convert member DNs by comparing them with the container DN of every
+    member object, like convert_attribute_members did before the
+    container index.
+    """
+    for attr in ldap_obj.attribute_members:
+        for member in entry_attrs.setdefault(attr, []):
+            for ldap_obj_name in ldap_obj.attribute_members[attr]:
+                member_obj = ldap_obj.api.Object[ldap_obj_name]
+                container_dn = DN(member_obj.container_dn, api.env.basedn)
+                if member.endswith(container_dn):
+                    new_attr = '%s_%s' % (attr, member_obj.name)
+                    entry_attrs.setdefault(new_attr, []).append(
+                        member_obj.get_primary_key_from_dn(member))
+        del entry_attrs[attr]
+
+
+def test_convert_attribute_members():
+    (test_api, home) = create_test_api()
+
+    class user(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'users'), ('cn', 'accounts'))
+        takes_params = (Str('uid', primary_key=True),)
+
+    class group(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'groups'), ('cn', 'accounts'))
+        takes_params = (Str('cn', primary_key=True),)
+
+    class subgroup(baseldap.LDAPObject):
+        # nested in the container of group
+        container_dn = DN(('cn', 'nested'), ('cn', 'groups'), ('cn', 'accounts'))
+        takes_params = (Str('cn', primary_key=True),)
+
+    class map(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'maps'))
+        takes_params = (Str('automountmapname', primary_key=True),)
+
+    class mapkey(baseldap.LDAPObject):
+        parent_object = 'map'
+        container_dn = DN(('cn', 'maps'))
+        takes_params = (Str('description', primary_key=True),)
+
+    class team(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'teams'))
+        attribute_members = {
+            'member': ['user', 'group', 'subgroup', 'mapkey'],
+            'memberof': ['group', 'subgroup'],
+        }
+        takes_params = (Str('cn', primary_key=True),)
+
+    for plugin in (user, group, subgroup, map, mapkey, team):
+        test_api.register(plugin)
+    test_api.finalize()
+
+    members = [
+        DN(dn, api.env.basedn) for dn in (
+            'uid=a,cn=users,cn=accounts',
+            # the container matches, the primary key attribute doesn't
+            'UID=B,CN=Users,cn=ACCOUNTS',
+            'cn=g1,cn=groups,cn=accounts',
+            'cn=s1,cn=nested,cn=groups,cn=accounts',
+            'uid=c,cn=users,cn=accounts',
+            'description=k1,automountmapname=m1,cn=maps',
+            'cn=deep,cn=sub,cn=users,cn=accounts',
+            'cn=x,cn=other',
+            'cn=accounts',
+        )] + [DN('cn=elsewhere,dc=example,dc=org')]
+    results = []
+    for attrs in (dict(member=members, memberof=members[2:4]),
+                  dict(member=[], memberof=members[6:])):
+        entry_attrs = dict((k, list(v)) for (k, v) in attrs.iteritems())
+        expected = dict((k, list(v)) for (k, v) in attrs.iteritems())
+        test_api.Object.team.convert_attribute_members(entry_attrs)
+        convert_attribute_members_by_suffix(test_api.Object.team, expected)
+        assert entry_attrs == expected
+        results.append(entry_attrs)
+
+    assert results[0] == dict(
+        member_user=[u'a', unicode(members[1]), u'c', unicode(members[6])],
+        member_group=[u'g1', u's1'],
+        member_subgroup=[u's1'],
+        member_mapkey=[u'k1'],
+        memberof_group=[u'g1', u's1'],
+        memberof_subgroup=[u's1'],
+    )
+    assert results[1] == {}
+    home.rmtree()
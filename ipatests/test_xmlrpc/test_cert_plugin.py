@@ -189,6 +189,37 @@ class test_cert(XMLRPC_test):
         # And it should match the new one
         assert base64.b64encode(res['usercertificate'][0]) == newcert
 
+    def test_0006a_cert_request_bulk(self):
+        """
+        Renew the certificate with cert_request_bulk, together with a
+        request for a service which doesn't exist and a duplicate request
+        """
+        global newcert
+
+        csr = unicode(self.generateCSR(str(self.subject)))
+        res = api.Command['cert_request_bulk']([
+            dict(principal=self.service_princ, csr=csr),
+            dict(principal=u'missing/%s' % self.host_fqdn, csr=csr),
+            dict(principal=self.service_princ, csr=csr),
+        ])
+        assert res['count'] == 3
+        (renewed, missing, duplicate) = res['results']
+        assert renewed['error'] is None
+        assert DN(renewed['result']['subject']) == self.subject
+        assert renewed['result']['certificate'] != newcert
+        assert missing['result'] is None
+        assert missing['error_name'] == u'NotFound'
+        assert duplicate['result'] is None
+        assert duplicate['error_name'] == u'ValidationError'
+
+        res = api.Command['service_show'](self.service_princ)['result']
+        assert (base64.b64encode(res['usercertificate'][0]) ==
+                renewed['result']['certificate'])
+        # The previous certificate is revoked
+        res = api.Command['cert_show'](
+            unicode(x509.get_serial_number(newcert)))['result']
+        assert res['revocation_reason'] == 4
+
     def test_0007_cleanup(self):
         """
         Clean up cert test data
@@ -452,3 +483,20 @@ class test_cert_find(XMLRPC_test):
         Search using invalid date format
         """
         res = api.Command['cert_find'](issuedon_from=u'xyz')
+
+    def test_0032_search_truncated(self):
+        """
+        Search with a sizelimit lower than the number of certificates
+        """
+        res = api.Command['cert_find'](sizelimit=2)
+        assert res['count'] == 2
+        assert res['truncated'] is True
+
+    def test_0033_search_pages(self):
+        """
+        Search certificates page by page
+        """
+        res = api.Command['cert_find'](sizelimit=4)
+        first = api.Command['cert_find'](sizelimit=2)
+        second = api.Command['cert_find'](start=2, sizelimit=2)
+        assert first['result'] + second['result'] == res['result']
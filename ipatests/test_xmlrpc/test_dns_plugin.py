@@ -20,11 +20,17 @@
 Test the `ipalib/plugins/dns.py` module.
 """
 
+import os
+import tempfile
+from StringIO import StringIO
+
 import nose
 from ipalib import api, errors
 from ipapython.dn import DN
+from ipapython.dnszonefile import read_zone_file
 from ipatests.test_xmlrpc import objectclasses
-from xmlrpc_test import Declarative, fuzzy_digits, fuzzy_uuid
+from ipatests.util import assert_deepequal
+from xmlrpc_test import XMLRPC_test, Declarative, fuzzy_digits, fuzzy_uuid
 
 dnszone1 = u'dnszone.test'
 dnszone1_dn = DN(('idnsname',dnszone1), api.env.container_dns, api.env.basedn)
@@ -56,6 +62,20 @@ dnsrescname = u'testcnamerec'
 dnsrescname_dn = DN(('idnsname',dnsrescname), dnszone1_dn)
 dnsresdname = u'testdns-dname'
 dnsresdname_dn = DN(('idnsname',dnsresdname), dnszone1_dn)
+dnszone3 = u'dnszoneimport.test'
+dnszone3_mname = u'ns1.%s.' % dnszone3
+dnszone3_rname = u'root.%s.' % dnszone3
+dnszone3_file = u"""\
+$ORIGIN dnszoneimport.test.
+$TTL 3600
+@       IN  SOA     ns1 root 1 3600 900 1209600 300
+        IN  MX      10 mail
+www     IN  A       192.0.2.1
+        IN  A       192.0.2.2
+mail    IN  A       192.0.2.3
+www     IN  AAAA    2001:db8::1
+txt 300 IN  TXT     "hello world"
+"""
 
 class test_dns(Declarative):
 
@@ -1523,3 +1543,177 @@ class test_dns(Declarative):
         ),
 
     ]
+
+
+class test_dnszone_import(XMLRPC_test):
+    """
+    Test the dnszone_import and dnszone_export commands.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(test_dnszone_import, cls).setUpClass()
+
+        if not api.Backend.rpcclient.isconnected():
+            api.Backend.rpcclient.connect(fallback=False)
+        try:
+            api.Command['dnszone_del'](dnszone3)
+        except errors.NotFound:
+            pass
+        try:
+            cls.add_zone()
+        except errors.NotFound:
+            raise nose.SkipTest('DNS is not configured')
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            api.Command['dnszone_del'](dnszone3)
+        except errors.NotFound:
+            pass
+
+    @classmethod
+    def add_zone(cls):
+        api.Command['dnszone_add'](dnszone3,
+            idnssoamname=dnszone3_mname,
+            idnssoarname=dnszone3_rname,
+            force=True,
+        )
+
+    def import_file(self, text, **options):
+        (fd, filename) = tempfile.mkstemp()
+        try:
+            os.write(fd, text.encode('utf-8'))
+            os.close(fd)
+            return api.Command['dnszone_import'](
+                dnszone3, file=unicode(filename), **options)
+        finally:
+            os.unlink(filename)
+
+    def records(self, text):
+        """
+        Return the records of the zone file text other than SOA, sorted.
+        """
+        return sorted(record
+                      for record in read_zone_file(StringIO(text), dnszone3)
+                      if record[2] != u'SOA')
+
+    def test_1_dnszone_import(self):
+        """
+        Test importing a zone file in batches into existing names.
+        """
+        command = type(api.Command['dnszone_import'])
+        saved = command.batch_size
+        # www is split across two batches, the zone apex exists already
+        command.batch_size = 2
+        try:
+            result = self.import_file(dnszone3_file)
+        finally:
+            command.batch_size = saved
+        assert_deepequal(dict(
+            count=6,
+            failed=[],
+            value=dnszone3,
+            summary=u'Imported 6 DNS resource records to zone "%s"' % dnszone3,
+        ), result)
+
+        entry = api.Command['dnsrecord_show'](dnszone3, u'www',
+                                              all=True)['result']
+        assert sorted(entry['arecord']) == [u'192.0.2.1', u'192.0.2.2']
+        assert entry['aaaarecord'] == [u'2001:db8::1']
+        assert [int(ttl) for ttl in entry['dnsttl']] == [3600]
+
+        entry = api.Command['dnsrecord_show'](dnszone3, u'@')['result']
+        assert entry['mxrecord'] == [u'10 mail']
+        assert entry['nsrecord'] == [dnszone3_mname]
+        entry = api.Command['dnsrecord_show'](dnszone3, u'txt',
+                                              all=True)['result']
+        assert [int(ttl) for ttl in entry['dnsttl']] == [300]
+
+    def test_2_dnszone_import(self):
+        """
+        Test that the records which can't be imported are reported.
+        """
+        result = api.Command['dnszone_import'](dnszone3, records=[
+            dict(name=u'@', type=u'SOA',
+                 data=u'ns1 root 2 3600 900 1209600 300'),
+            dict(name=u'bad', type=u'A', data=u'192.0.2'),
+            dict(name=u'sub', type=u'NS', data=u'ns.sub'),
+            dict(name=u'www', ttl=300, type=u'A', data=u'192.0.2.4'),
+            dict(name=u'ok', type=u'A', data=u'192.0.2.5'),
+        ])
+        assert_deepequal(dict(
+            count=1,
+            failed=[
+                dict(name=u'bad', record=u'A 192.0.2',
+                     error=u"invalid 'ip_address': invalid IP address "
+                           u"format"),
+                dict(name=u'sub', record=u'NS ns.sub',
+                     error=u"Nameserver 'ns.sub.%s.' does not have a "
+                           u"corresponding A/AAAA record" % dnszone3),
+                dict(name=u'www', record=u'A 192.0.2.4',
+                     error=u"invalid 'ttl': TTL 300 differs from TTL 3600 "
+                           u"of the other records of the name"),
+            ],
+            value=dnszone3,
+            summary=u'Imported 1 DNS resource records to zone "%s"' % dnszone3,
+        ), result)
+
+        entry = api.Command['dnsrecord_show'](dnszone3, u'ok')['result']
+        assert entry['arecord'] == [u'192.0.2.5']
+        entry = api.Command['dnsrecord_show'](dnszone3, u'www')['result']
+        assert u'192.0.2.4' not in entry['arecord']
+        for name in (u'bad', u'sub'):
+            nose.tools.assert_raises(errors.NotFound,
+                api.Command['dnsrecord_show'], dnszone3, name)
+
+        result = api.Command['dnszone_import'](dnszone3, records=[
+            dict(name=u'sub', type=u'NS', data=u'ns.sub'),
+        ], force=True)
+        assert result['count'] == 1
+        assert result['failed'] == []
+
+    def test_3_dnszone_export(self):
+        """
+        Test that an exported zone imports to the same records.
+        """
+        text = api.Command['dnszone_export'](dnszone3)['result']
+        records = self.records(text)
+        assert (u'www', 3600, u'A', u'192.0.2.1') in records
+        assert (u'sub', None, u'NS', u'ns.sub') in records
+        assert len([r for r in read_zone_file(StringIO(text), dnszone3)
+                    if r[2] == u'SOA']) == 1
+
+        api.Command['dnszone_del'](dnszone3)
+        self.add_zone()
+        result = self.import_file(text, force=True)
+        assert result['failed'] == []
+        assert result['count'] == len(records)
+
+        new_text = api.Command['dnszone_export'](dnszone3)['result']
+        assert self.records(new_text) == records
+
+    def test_4_dnszone_export_pages(self):
+        """
+        Test exporting a zone to a file in pages of two record names.
+        """
+        text = api.Command['dnszone_export'](dnszone3)['result']
+
+        command = type(api.Command['dnszone_export'])
+        saved = command.page_size
+        command.page_size = 2
+        (fd, filename) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            result = api.Command['dnszone_export'](dnszone3,
+                                                   out=unicode(filename))
+            with open(filename) as f:
+                paged_text = f.read().decode('utf-8')
+        finally:
+            command.page_size = saved
+            os.unlink(filename)
+
+        assert result['count'] > 2
+        assert self.records(paged_text) == self.records(text)
+        assert len([r for r in read_zone_file(StringIO(paged_text), dnszone3)
+                    if r[2] == u'SOA']) == 1
@@ -0,0 +1,164 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the DNS zone index and cache of the `ipalib.plugins.dns` module.
+"""
+
+from ipalib import api
+from ipalib.plugins import dns
+from ipapython.dn import DN
+
+
+def test_find():
+    index = dns.DNSZoneIndex([u'example.com', u'sub.example.com.',
+                              u'15.142.80.in-addr.arpa.',
+                              u'142.80.in-addr.arpa'])
+
+    # the longest zone name wins, regardless of case and trailing dot
+    assert index.find(u'www.sub.example.com.') == (u'sub.example.com.',
+                                                   u'www')
+    assert index.find(u'www.Example.COM') == (u'example.com', u'www')
+    assert index.find(u'81.15.142.80.in-addr.arpa.') == (
+        u'15.142.80.in-addr.arpa.', u'81')
+    assert index.find(u'1.12.142.80.in-addr.arpa.') == (
+        u'142.80.in-addr.arpa', u'1.12')
+
+    # a zone is its own longest match, with an empty relative name
+    assert index.find(u'sub.example.com') == (u'sub.example.com.', u'')
+
+    # labels match as a whole, not as a part of a label
+    assert index.find(u'www.myexample.com.') is None
+    assert index.find(u'1.5.142.80.in-addr.arpa.') == (
+        u'142.80.in-addr.arpa', u'1.5')
+
+    # no zone at all
+    assert index.find(u'1.1.1.10.in-addr.arpa.') is None
+    assert index.find(u'com.') is None
+    assert dns.DNSZoneIndex([]).find(u'www.example.com.') is None
+
+
+class FakeEntry(dict):
+    def __init__(self, name, usn):
+        super(FakeEntry, self).__init__(idnsname=[name],
+                                        entryusn=[unicode(usn)])
+        self.dn = DN(('idnsname', name), api.env.container_dns,
+                     api.env.basedn)
+        self.raw = dict(entryusn=[str(usn)])
+
+
+class FakeCommand(object):
+    """
+    Emulates the dnszone_add and dnszone_del command objects for their
+    post callbacks.
+    """
+    class obj(object):
+        @staticmethod
+        def permission_name(zone):
+            return u'Manage DNS zone %s' % zone
+
+
+def run_post_callback(command, *args):
+    """
+    Run the post callback of command, the commands it calls do nothing.
+    """
+    class fake_api(object):
+        env = api.env
+        Command = dict(realmdomains_mod=lambda *a, **kw: None,
+                       permission_del=lambda *a, **kw: None)
+
+    saved = dns.api
+    dns.api = fake_api
+    try:
+        command.post_callback.im_func(FakeCommand(), None, DN(), *args)
+    finally:
+        dns.api = saved
+
+
+class test_zone_cache(object):
+    """
+    Test that get_zone_index builds the index again when the zones change.
+    """
+
+    def setUp(self):
+        self.zones = [FakeEntry(u'example.com.', 1)]
+        self.searches = []
+
+        def find_zones(attrs_list):
+            self.searches.append(attrs_list)
+            return (list(self.zones), False)
+
+        self.saved = (dns._find_zones, dns.zone_cache)
+        dns._find_zones = find_zones
+        dns.zone_cache = dns.DNSZoneCache(ttl=3600)
+
+    def tearDown(self):
+        (dns._find_zones, dns.zone_cache) = self.saved
+
+    def add_zone(self, name, usn):
+        self.zones.append(FakeEntry(name, usn))
+
+    def test_cached(self):
+        index = dns.get_zone_index()
+        assert index.find(u'www.example.com.') == (u'example.com.', u'www')
+        self.add_zone(u'sub.example.com.', 2)
+        assert dns.get_zone_index() is index
+        assert len(self.searches) == 1
+
+    def test_zone_add(self):
+        dns.get_zone_index()
+        self.add_zone(u'sub.example.com.', 2)
+        run_post_callback(dns.dnszone_add, {}, u'sub.example.com.')
+        assert dns.get_zone_index().find(u'www.sub.example.com.') == (
+            u'sub.example.com.', u'www')
+        assert len(self.searches) == 2
+
+    def test_zone_del(self):
+        self.add_zone(u'sub.example.com.', 2)
+        dns.get_zone_index()
+        del self.zones[1]
+        run_post_callback(dns.dnszone_del, u'sub.example.com.')
+        assert dns.get_zone_index().find(u'www.sub.example.com.') == (
+            u'example.com.', u'www.sub')
+        assert len(self.searches) == 2
+
+    def test_usn(self):
+        dns.zone_cache.ttl = 0
+        index = dns.get_zone_index()
+
+        # unchanged entryUSNs keep the index
+        assert dns.get_zone_index() is index
+        assert self.searches == [['idnsname', 'entryusn'], ['entryusn']]
+
+        # a zone added by another server or process changes the entryUSNs
+        self.add_zone(u'sub.example.com.', 2)
+        index = dns.get_zone_index()
+        assert index.find(u'www.sub.example.com.') == (
+            u'sub.example.com.', u'www')
+        assert self.searches[2:] == [['entryusn'], ['idnsname', 'entryusn']]
+
+        # so does a zone deleted and added again
+        self.zones[1] = FakeEntry(u'sub.example.com.', 3)
+        assert dns.get_zone_index() is not index
+
+    def test_usn_unknown(self):
+        # without entryUSNs the index is built again every time
+        dns.zone_cache.ttl = 0
+        del self.zones[0].raw['entryusn']
+        del self.zones[0]['entryusn']
+        index = dns.get_zone_index()
+        assert dns.get_zone_index() is not index
+        assert self.searches == [['idnsname', 'entryusn']] * 2
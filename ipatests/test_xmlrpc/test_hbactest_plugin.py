@@ -198,6 +198,52 @@ class test_hbactest(XMLRPC_test):
             nodetail=True
         )
 
+    def test_f_hbactest_check_rule_change(self):
+        """
+        Test 'ipa hbactest --enabled' sees a rule disabled after a previous run
+        """
+        ret = api.Command['hbactest'](
+            user=self.test_user,
+            targethost=self.test_host,
+            service=self.test_service,
+        )
+        assert self.rule_names[0] in ret['matched']
+
+        api.Command['hbacrule_disable'](self.rule_names[0])
+        try:
+            ret = api.Command['hbactest'](
+                user=self.test_user,
+                targethost=self.test_host,
+                service=self.test_service,
+            )
+            assert self.rule_names[0] not in (ret['matched'] or [])
+            assert self.rule_names[0] not in (ret['notmatched'] or [])
+        finally:
+            api.Command['hbacrule_enable'](self.rule_names[0])
+
+    def test_f_hbactest_matrix(self):
+        """
+        Test 'ipa hbactest-matrix --rules' (explicit IPA rules, detailed output)
+        """
+        ret = api.Command['hbactest_matrix'](
+            user=[self.test_user, u'hbacrule_test_nouser'],
+            targethost=[self.test_host],
+            service=[self.test_service],
+            rules=self.rule_names
+        )
+        assert ret['value'] == 1
+        assert ret['error'] == None
+        (granted, denied) = ret['result']
+        assert granted['user'] == self.test_user
+        assert granted['value'] == True
+        for i in [0,1,2,3]:
+            assert self.rule_names[i] in granted['matched']
+        assert denied['user'] == u'hbacrule_test_nouser'
+        assert denied['value'] == False
+        assert denied['matched'] == []
+        for i in [0,1,2,3]:
+            assert self.rule_names[i] in denied['notmatched']
+
     def test_g_hbactest_clear_testing_data(self):
         """
         Clear data for HBAC test plugin testing.
@@ -0,0 +1,168 @@
+# Copyright (C) 2014  Red Hat
+# see file 'COPYING' for use and warranty information
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Test the `ipalib.plugins.migration` module.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+
+import ldap as _ldap
+
+from ipalib import api, errors
+from ipalib.plugins import migration
+from ipapython.dn import DN
+
+
+class FakeEntry(object):
+    def __init__(self, dn):
+        self.dn = dn
+
+
+class FakeLDAP(object):
+    """
+    Emulates ldap2 for the default group updates of the migration, the
+    users and the members of the default group are kept in lists.
+    """
+    SCOPE_SUBTREE = _ldap.SCOPE_SUBTREE
+
+    def __init__(self, users, members):
+        self.users = users
+        self.members = members
+        self.conn = self
+        self.modifications = 0
+
+    @contextlib.contextmanager
+    def error_handler(self):
+        try:
+            yield
+        except _ldap.TYPE_OR_VALUE_EXISTS:
+            raise errors.DatabaseError(desc='Type or value exists', info='')
+
+    def modify_s(self, dn, modlist):
+        self.modifications += 1
+        [(op, attr, values)] = modlist
+        assert op == _ldap.MOD_ADD and attr == 'member'
+        if [v for v in values if v in self.members]:
+            raise _ldap.TYPE_OR_VALUE_EXISTS({'desc': 'Type or value exists'})
+        self.members.extend(values)
+
+    def iter_entries(self, filter, attrs_list, base_dn, scope=None,
+                     time_limit=None, size_limit=None, paged_search=False):
+        assert '(!(memberof=%s))' % group_dn in filter
+        for user in self.users:
+            if user not in self.members:
+                yield FakeEntry(user)
+
+
+group_dn = DN(('cn', 'ipausers'), ('cn', 'groups'), ('cn', 'accounts'),
+              ('dc', 'example'), ('dc', 'com'))
+
+
+def user_dn(name):
+    return DN(('uid', name), ('cn', 'users'), ('cn', 'accounts'),
+              ('dc', 'example'), ('dc', 'com'))
+
+
+def test_add_default_group_members():
+    ldap = FakeLDAP([], [user_dn('user1')])
+    members = [user_dn('user0'), user_dn('user1'), user_dn('user2')]
+    assert migration._add_default_group_members(ldap, group_dn, members) == 2
+    assert sorted(ldap.members) == sorted(members)
+    assert ldap.modifications == 4
+
+    assert migration._add_default_group_members(
+        ldap, group_dn, [user_dn('user3')]) == 1
+    assert ldap.modifications == 5
+
+
+def test_default_group():
+    """
+    Users migrated now and users migrated by previous runs end up in the
+    default group, like with the member list rewrite done before.
+    """
+    users = [user_dn('user%d' % i) for i in range(10)]
+    # user0 and user1 were migrated and added to the group by a previous
+    # run, user2 and user3 were migrated but not added to the group
+    ldap = FakeLDAP(users[:4], users[:2])
+    ctx = dict(def_group_dn=group_dn)
+
+    saved = migration._def_group_batch_size
+    migration._def_group_batch_size = 4
+    try:
+        for user in users[4:]:
+            ldap.users.append(user)
+            migration._post_migrate_user(
+                ldap, user.rdns[0].value, user, {}, [], None, ctx)
+        # the first 4 users were added at once
+        assert ldap.members == users[:2] + users[4:8]
+        assert ldap.modifications == 1
+
+        migration._update_default_group(ldap, ctx)
+    finally:
+        migration._def_group_batch_size = saved
+
+    assert sorted(ldap.members) == sorted(users)
+    assert len(ldap.members) == len(users)
+    assert ctx['def_group_new_members'] == []
+
+
+def test_checkpoint():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'migration', 'checkpoint')
+        checkpoint = migration.MigrationCheckpoint(path)
+        checkpoint.open()
+        checkpoint.record('user', u'user0')
+        checkpoint.complete('group')
+        checkpoint.close()
+
+        checkpoint = migration.MigrationCheckpoint(path)
+        checkpoint.open()
+        assert checkpoint.migrated == {'user': set([u'user0'])}
+        assert checkpoint.completed == set(['group'])
+        checkpoint.close()
+        checkpoint.remove()
+        assert not os.path.exists(path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+class FailingFile(object):
+    def write(self, data):
+        raise IOError(28, 'No space left on device')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_checkpoint_write_error():
+    """
+    A checkpoint which can't be written doesn't stop the migration.
+    """
+    checkpoint = migration.MigrationCheckpoint('/nonexistent/checkpoint')
+    checkpoint._file = FailingFile()
+    checkpoint.record('user', u'user0')
+    checkpoint.record('user', u'user1')
+    checkpoint.complete('user')
+    checkpoint.close()
+    assert checkpoint.completed == set(['user'])